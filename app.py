@@ -40,6 +40,18 @@ def create_app():
     app.register_blueprint(payment_bp, url_prefix='/payment')
     app.register_blueprint(reports_bp, url_prefix='/reports')
     
+    # Server-Timing header and a timing log line for every request
+    from application.request_timing import init_app as init_request_timing
+    init_request_timing(app)
+    
+    # ETag/304 for the busiest pages and Cache-Control per blueprint
+    from application.http_cache import init_app as init_http_cache
+    init_http_cache(app)
+    
+    # Register CLI commands (flask rollups rebuild, ...)
+    from application.commands import register_commands
+    register_commands(app)
+    
     return app
 
 # Create the Flask application instance
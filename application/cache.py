@@ -0,0 +1,54 @@
+import threading
+import time
+
+from application.data_version import get_version
+
+
+class VersionedCache:
+    """Small in-process cache whose entries die with a TTL or a table write.
+
+    Each entry remembers the data version of the tables it was built from;
+    a write through any route decorated with @invalidates for one of those
+    tables changes the version and the next lookup reloads. The TTL bounds
+    staleness for writes made outside the app.
+    """
+
+    def __init__(self, tables, ttl):
+        self.tables = tables
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() to (re)build it"""
+        version = get_version(*self.tables)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Load outside the lock so a slow query doesn't block other keys
+        value = loader()
+        with self._lock:
+            self._entries[key] = (version, now, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0,
+                'entries': len(self._entries),
+                'ttl': self.ttl
+            }
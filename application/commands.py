@@ -0,0 +1,70 @@
+import click
+from flask.cli import AppGroup
+
+from application.database import get_db
+from application import rollups, ledger, replica, report_buckets
+
+rollups_cli = AppGroup('rollups', help='Maintain the report rollup tables.')
+
+
+@rollups_cli.command('rebuild')
+def rebuild_rollups():
+    """Recompute all rollup tables from sale and payment (backfill / repair)."""
+    rollups.rebuild(get_db())
+    click.echo('Rollup tables rebuilt.')
+
+
+ledger_cli = AppGroup('ledger', help='Maintain the customer balance ledger.')
+
+
+@ledger_cli.command('reconcile')
+@click.option('--customer', default=None, help='Customer name (default: every customer).')
+@click.option('--phone', default=None, help='Customer phone, required with --customer.')
+def reconcile_ledger(customer, phone):
+    """Recompute customer balances from sale, payment and transaction."""
+    if bool(customer) != bool(phone):
+        raise click.UsageError('--customer and --phone must be given together.')
+    ledger.reconcile(get_db(), customer, phone)
+    click.echo(f'Balance ledger reconciled for {customer} ({phone}).' if customer else 'Balance ledger reconciled.')
+    if ledger.LEDGER_ENABLED and not ledger.is_current():
+        click.echo('An update failed since the last full reconcile; balances are summed from history until '
+                   'a reconcile without --customer.')
+
+
+replica_cli = AppGroup('replica', help='Maintain the local SQLite read replica.')
+
+
+@replica_cli.command('sync')
+def sync_replica():
+    """Pull new rows (the whole table on first run) into the replica."""
+    failed = replica.sync(get_db(), force=True)
+    if failed:
+        raise click.ClickException(f"Replica sync failed for: {', '.join(failed)}")
+    click.echo(f'Replica synced ({replica.REPLICA_PATH}).')
+
+
+@replica_cli.command('verify')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(list(replica.TABLES)),
+              help='Table to verify (repeatable, default: all).')
+def verify_replica(tables):
+    """Compare every replicated row with Supabase and repair differences."""
+    for table in tables or replica.TABLES:
+        fixed = replica.verify_table(get_db(), table)
+        click.echo(f'{table}: {fixed} row(s) repaired.')
+
+
+reports_cli = AppGroup('reports', help='Maintain the stored monthly report buckets.')
+
+
+@reports_cli.command('forget-buckets')
+def forget_report_buckets():
+    """Drop every stored month, e.g. after editing old sales outside the app."""
+    count = report_buckets.forget_all()
+    click.echo(f'Dropped {count} stored month(s); they are rebuilt on the next report that needs them.')
+
+
+def register_commands(app):
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(replica_cli)
+    app.cli.add_command(reports_cli)
@@ -0,0 +1,127 @@
+import bisect
+import re
+import time
+
+from application import reference_data
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+_TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+def _normalise(text):
+    return (text or '').strip().lower()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CustomerIndex:
+    """In-memory search index over customer name, phone and company.
+
+    Queries of three or more characters intersect trigram postings and then
+    confirm the substring, so "ade" finds "Ifeoluwa Adeyemi" the way the old
+    ilike '%ade%' did without scanning every row. The typeahead also matches
+    word and phone-digit prefixes from a sorted token list, which is all it
+    uses below three characters. Built once per customer data version (see
+    reference_data) and shared by all requests in the worker.
+    """
+
+    def __init__(self, customers):
+        self.customers = customers
+        self._fields = []
+        self._postings = {}
+        tokens = []
+        for customer_id, customer in enumerate(customers):
+            fields = [_normalise(customer.get(column)) for column in ('name', 'phone', 'company')]
+            self._fields.append(fields)
+            for field in fields:
+                for gram in _trigrams(field):
+                    self._postings.setdefault(gram, set()).add(customer_id)
+                for token in _TOKEN_SPLIT.split(field):
+                    if token:
+                        tokens.append((token, customer_id))
+            # Phone numbers are typed without their separators
+            digits = re.sub(r'\D', '', fields[1])
+            if digits:
+                tokens.append((digits, customer_id))
+        tokens.sort()
+        self._tokens = tokens
+        self._token_keys = [token for token, _ in tokens]
+
+    def _prefix_candidates(self, query):
+        candidates = set()
+        start = bisect.bisect_left(self._token_keys, query)
+        for token, customer_id in self._tokens[start:]:
+            if not token.startswith(query):
+                break
+            candidates.add(customer_id)
+        return candidates
+
+    def _substring_candidates(self, query):
+        postings = sorted((self._postings.get(gram, set()) for gram in _trigrams(query)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        # Trigrams can match out of order; confirm the real substring
+        return {customer_id for customer_id in candidates
+                if any(query in field for field in self._fields[customer_id])}
+
+    def _rank(self, customer_id, query):
+        name, phone, company = self._fields[customer_id]
+        if name == query or phone == query:
+            score = 0
+        elif name.startswith(query):
+            score = 1
+        elif phone.startswith(query) or any(token.startswith(query) for token in _TOKEN_SPLIT.split(name)):
+            score = 2
+        elif company.startswith(query):
+            score = 3
+        else:
+            score = 4
+        return (score, name, phone)
+
+    def matching(self, query):
+        """Every customer containing query in name, phone or company (ilike '%query%' semantics)"""
+        query = _normalise(query)
+        if not query:
+            return list(self.customers)
+        if len(query) >= 3:
+            matches = self._substring_candidates(query)
+        else:
+            # Too short for trigrams; a scan of the in-memory fields is still cheap
+            matches = {customer_id for customer_id, fields in enumerate(self._fields)
+                       if any(query in field for field in fields)}
+        return [self.customers[customer_id] for customer_id in sorted(matches)]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Typeahead matches, best first: word prefixes, plus substrings from 3 characters"""
+        query = _normalise(query)
+        if not query:
+            return []
+        candidates = self._prefix_candidates(query)
+        if len(query) >= 3:
+            # Substrings anywhere in the fields, on top of word and phone-digit prefixes
+            candidates |= self._substring_candidates(query)
+        ranked = sorted(candidates, key=lambda customer_id: self._rank(customer_id, query))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.customers[customer_id] for customer_id in ranked]
+
+
+def get_index():
+    """Index over the cached customer list, rebuilt when customers change"""
+    return reference_data.customer_cache.get('search_index', lambda: CustomerIndex(reference_data.customers()))
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """Ranked matches plus how long the lookup took, for the typeahead endpoint"""
+    started = time.perf_counter()
+    matches = get_index().search(query, limit)
+    return matches, (time.perf_counter() - started) * 1000
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from functools import wraps
+
+from flask import request
+
+# One small file per table holding a token that changes on every write.
+# Files (rather than module globals) keep all gunicorn workers on the box in step.
+DATA_VERSION_DIR = os.getenv('DATA_VERSION_DIR', os.path.join(tempfile.gettempdir(), 'factory-data-versions'))
+
+TABLES = ('customer', 'stock', 'sale', 'payment', 'transaction')
+
+
+def _version_path(table):
+    return os.path.join(DATA_VERSION_DIR, table)
+
+
+def bump(*tables):
+    """Record that the given tables changed"""
+    os.makedirs(DATA_VERSION_DIR, exist_ok=True)
+    for table in tables:
+        token = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        tmp_path = f'{_version_path(table)}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(token)
+        os.replace(tmp_path, _version_path(table))
+
+
+def table_version(table):
+    """Current change token for one table ('0' until its first recorded write)"""
+    try:
+        with open(_version_path(table)) as f:
+            return f.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+
+
+def get_version(*tables):
+    """Combined version of several tables; changes whenever any of them is written"""
+    tables = tables or TABLES
+    digest = hashlib.sha256()
+    for table in sorted(tables):
+        digest.update(f'{table}={table_version(table)};'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def invalidates(*tables):
+    """Decorator for write routes: bump the tables' versions after every POST.
+
+    The bump happens whether or not the view succeeded, since a write path
+    that failed halfway may still have changed some rows.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            finally:
+                if request.method == 'POST':
+                    bump(*tables)
+        return decorated_function
+    return decorator
+
+
+
+# Derived data (rollup tables, balance ledger) that missed an update is marked
+# stale with a file beside the versions, until its repair command clears it
+
+def _stale_path(name):
+    return os.path.join(DATA_VERSION_DIR, f'{name}.stale')
+
+
+def mark_stale(name):
+    """Record that the derived data `name` missed an update"""
+    os.makedirs(DATA_VERSION_DIR, exist_ok=True)
+    with open(_stale_path(name), 'w') as f:
+        f.write(f'{time.time_ns()}-{uuid.uuid4().hex[:8]}')
+
+
+def stale_token(name):
+    """Token of the latest missed update to `name`, or None while it is current"""
+    try:
+        with open(_stale_path(name)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def clear_stale(name, token):
+    """Mark `name` current again after a repair that started when its stale token was `token`.
+
+    An update that fails while the repair runs leaves a new token, so the
+    data stays stale rather than hiding a miss the repair may not cover.
+    """
+    if token is not None and stale_token(name) == token:
+        try:
+            os.remove(_stale_path(name))
+        except FileNotFoundError:
+            pass
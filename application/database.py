@@ -1,6 +1,7 @@
 from supabase import create_client, Client
 import os
 from dotenv import load_dotenv
+from application.request_timing import instrument_client
 
 load_dotenv()
 
@@ -10,7 +11,7 @@ class Database:
         key = os.getenv("SUPABASE_KEY")
         if not url or not key:
             raise ValueError("Supabase URL and KEY must be set in environment variables")
-        self.supabase: Client = create_client(url, key)
+        self.supabase: Client = instrument_client(create_client(url, key))
     
     def get_client(self):
         return self.supabase
@@ -20,3 +21,7 @@ db = Database()
 
 def get_db():
     return db.get_client()
+
+def set_client(client):
+    """Make get_db() return another client, e.g. the in-memory stand-in used by bench/"""
+    db.supabase = client
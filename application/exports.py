@@ -0,0 +1,51 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+
+from flask import Response
+
+# Rows fetched per request while streaming an export (see application.paging)
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+
+# Rows written per chunk handed to the WSGI server
+CSV_CHUNK_ROWS = 500
+
+
+def csv_chunks(rows, fieldnames):
+    """CSV text for the rows, in chunks of CSV_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    # BOM so Excel opens the file as UTF-8 (notes contain ₦)
+    buffer.write('\ufeff')
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(rows, fieldnames, name, compress=False):
+    """Streamed CSV download (optionally .csv.gz) whose memory use doesn't grow with the row count"""
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d')}.csv"
+    chunks = csv_chunks(rows, fieldnames)
+    if compress:
+        return Response(gzip_chunks(chunks), mimetype='application/gzip',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.gz'})
+    return Response(chunks, mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
@@ -0,0 +1,68 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Threads per worker process for running independent queries side by side
+QUERY_FANOUT_WORKERS = int(os.getenv('QUERY_FANOUT_WORKERS', 8))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Set inside pool threads so a nested gather() runs inline instead of
+# waiting on a pool its own caller may have exhausted
+_in_pool = contextvars.ContextVar('fanout_in_pool', default=False)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A pool inherited across fork has no threads; start a fresh one
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=QUERY_FANOUT_WORKERS, thread_name_prefix='query-fanout')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _run(call):
+    _in_pool.set(True)
+    return call()
+
+
+def gather(*calls):
+    """Run independent zero-argument callables concurrently and return their results in order.
+
+    Each call runs in a copy of the caller's context, so Flask's request and
+    app context (and any other contextvars) are visible inside it. If a call
+    raises, the first failure in argument order is re-raised and calls that
+    haven't started yet are cancelled.
+    """
+    if len(calls) <= 1 or QUERY_FANOUT_WORKERS <= 1 or _in_pool.get():
+        return [call() for call in calls]
+
+    executor = _get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, _run, call) for call in calls]
+    try:
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def submit(call):
+    """Start one zero-argument callable in the pool and return its Future.
+
+    Like gather, it runs in a copy of the caller's context. From inside a
+    pool thread (or with QUERY_FANOUT_WORKERS <= 1) it runs inline and the
+    returned Future is already done.
+    """
+    if QUERY_FANOUT_WORKERS <= 1 or _in_pool.get():
+        future = Future()
+        try:
+            future.set_result(call())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    return _get_executor().submit(contextvars.copy_context().run, _run, call)
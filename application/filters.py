@@ -0,0 +1,25 @@
+from datetime import datetime
+
+
+def listing_filters(args):
+    """search_customer, start_date and end_date from the request args, as the listings use them"""
+    return (args.get('search_customer', '').strip(),
+            args.get('start_date', '').strip(),
+            args.get('end_date', '').strip())
+
+
+def apply_listing_filters(query, search_customer, start_date, end_date):
+    """Customer name search and date range shared by the sale/payment listings and exports"""
+    if search_customer:
+        query = query.ilike('customer_name', f'%{search_customer}%')
+
+    if start_date:
+        query = query.gte('date', start_date)
+
+    if end_date:
+        # Add one day to end_date to include the full day
+        end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d')
+        end_date_plus_one = end_date_plus_one.replace(hour=23, minute=59, second=59)
+        query = query.lte('date', end_date_plus_one.isoformat())
+
+    return query
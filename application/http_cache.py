@@ -0,0 +1,92 @@
+import hashlib
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, message_flashed, request, session
+
+from application.data_version import get_version
+
+# Conditional GET for pages that are built only from a few tables: the ETag
+# comes from the tables' data versions, and a browser that already has the
+# current version gets a 304 before the view queries or renders anything.
+
+# ETags also roll over this often (seconds), so writes made outside the app
+# (which don't bump the data versions) show up after at most this long; 0 = never
+CONDITIONAL_GET_WINDOW = int(os.getenv('CONDITIONAL_GET_WINDOW', 60))
+
+# Cache-Control sent on GET responses of each blueprint, set with
+# CACHE_CONTROL_<BLUEPRINT> (e.g. CACHE_CONTROL_REPORTS=private, no-cache; empty
+# sends none). The conditional pages' blueprints default to revalidating on
+# every use; responses that set their own Cache-Control keep it.
+DEFAULT_CACHE_CONTROL = {
+    'reports': 'private, no-cache',
+    'sale': 'private, no-cache'
+}
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _code_version():
+    """Latest modification time of the app's code and templates, so a deploy changes every ETag"""
+    latest = 0
+    for root, _, names in os.walk(_APP_DIR):
+        for name in names:
+            if name.endswith(('.py', '.html')):
+                latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    return str(latest)
+
+
+CODE_VERSION = _code_version()
+
+
+def page_etag(tables):
+    """ETag of the current GET request's page, as built from `tables`"""
+    window = int(time.time() // CONDITIONAL_GET_WINDOW) if CONDITIONAL_GET_WINDOW > 0 else 0
+    key = f'{get_version(*tables)};{window};{CODE_VERSION};{request.full_path}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def conditional(*tables):
+    """Decorator for GET pages built only from `tables`: ETag them, and answer 304 when unchanged.
+
+    The version is read before the view runs, so a write that lands while
+    it renders gives the next request a new ETag rather than a stale 304.
+    Pages that show a flashed message get no ETag: they are one-offs.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            etag = page_etag(tables)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not g.get('flashed'):
+                response.set_etag(etag)
+            return response
+        return decorated_function
+    return decorator
+
+
+def _on_flashed(sender, **extra):
+    g.flashed = True
+
+
+def init_app(app):
+    """Send each blueprint's Cache-Control policy and track flashes for conditional()"""
+    message_flashed.connect(_on_flashed, app)
+    policies = {name: os.getenv(f'CACHE_CONTROL_{name.upper()}', DEFAULT_CACHE_CONTROL.get(name, ''))
+                for name in app.blueprints}
+
+    @app.after_request
+    def add_cache_control(response):
+        policy = policies.get(request.blueprint)
+        if policy and request.method in ('GET', 'HEAD') and 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = policy
+        return response
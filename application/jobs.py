@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from application.pdf import html_to_pdf
+from application.pdf_cache import get_cache
+
+# Job queue configuration (per gunicorn worker, state shared on disk)
+PDF_JOB_DIR = os.getenv('PDF_JOB_DIR', os.path.join(tempfile.gettempdir(), 'factory-pdf-jobs'))
+PDF_JOB_WORKERS = int(os.getenv('PDF_JOB_WORKERS', 2))
+PDF_JOB_MAX_PENDING = int(os.getenv('PDF_JOB_MAX_PENDING', 20))
+PDF_JOB_TTL = int(os.getenv('PDF_JOB_TTL', 3600))
+PDF_JOB_STALE_AFTER = int(os.getenv('PDF_JOB_STALE_AFTER', 600))
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    """Background PDF renders with job state kept on disk.
+
+    Each job is a small JSON file next to its PDF artifact, so a status poll
+    or download that lands on a different gunicorn worker than the one that
+    rendered still finds it. Submitting a job whose key matches one that is
+    still pending or running returns that job instead of starting another,
+    and finished jobs are swept once they are older than the TTL.
+    """
+
+    def __init__(self, job_dir=PDF_JOB_DIR, max_workers=PDF_JOB_WORKERS,
+                 max_pending=PDF_JOB_MAX_PENDING, ttl=PDF_JOB_TTL):
+        self.job_dir = job_dir
+        self.max_pending = max_pending
+        self.ttl = ttl
+        os.makedirs(job_dir, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def submit(self, key, build_html, filename, cache_key=None):
+        """Queue build_html() -> PDF under the given dedup key and return the job.
+
+        When cache_key is given the finished PDF is also stored in the PDF cache.
+        """
+        self.sweep()
+        key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            existing = self._find_active(key_hash)
+            if existing:
+                return existing
+
+            if self._in_flight >= self.max_pending:
+                raise QueueFullError('Too many PDF exports are waiting, please try again shortly.')
+
+            now = time.time()
+            job = {
+                'id': uuid.uuid4().hex,
+                'key': key_hash,
+                'status': PENDING,
+                'filename': filename,
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            self._save(job)
+            self._write_atomic(self._key_path(key_hash), job['id'].encode('utf-8'))
+            self._in_flight += 1
+
+        app = current_app._get_current_object()
+        self._executor.submit(self._run, app, job, build_html, cache_key)
+        return dict(job)
+
+    def get(self, job_id):
+        job = self._load(job_id)
+        if job is None:
+            return None
+
+        now = time.time()
+        if job['status'] in (DONE, FAILED) and now - job['updated_at'] > self.ttl:
+            self._remove(job)
+            return None
+        if job['status'] in (PENDING, RUNNING) and now - job['updated_at'] > PDF_JOB_STALE_AFTER:
+            # The worker that owned this job went away without finishing it
+            job['status'] = FAILED
+            job['error'] = 'Export was interrupted, please try again.'
+        return job
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.job_dir, f'{job_id}.pdf')
+
+    def sweep(self):
+        """Delete finished jobs and artifacts older than the TTL"""
+        now = time.time()
+        for name in os.listdir(self.job_dir):
+            if name.endswith('.json'):
+                job = self._load(name[:-5])
+                if job and job['status'] in (DONE, FAILED) and now - job['updated_at'] > self.ttl:
+                    self._remove(job)
+            elif name.startswith('key-'):
+                path = os.path.join(self.job_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _run(self, app, job, build_html, cache_key):
+        try:
+            job['status'] = RUNNING
+            job['updated_at'] = time.time()
+            self._save(job)
+
+            with app.app_context():
+                html_content = build_html()
+            pdf_bytes = html_to_pdf(html_content, job['filename'])
+
+            self._write_atomic(self.artifact_path(job['id']), pdf_bytes)
+            if cache_key:
+                get_cache().put(cache_key, pdf_bytes)
+            job['status'] = DONE
+        except Exception as e:
+            job['status'] = FAILED
+            job['error'] = str(e)
+        finally:
+            job['updated_at'] = time.time()
+            self._save(job)
+            with self._lock:
+                self._in_flight -= 1
+
+    def _find_active(self, key_hash):
+        try:
+            with open(self._key_path(key_hash), 'rb') as f:
+                job_id = f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+        job = self.get(job_id)
+        if job and job['status'] in (PENDING, RUNNING):
+            return job
+        return None
+
+    def _job_path(self, job_id):
+        return os.path.join(self.job_dir, f'{job_id}.json')
+
+    def _key_path(self, key_hash):
+        return os.path.join(self.job_dir, f'key-{key_hash}')
+
+    def _load(self, job_id):
+        # Job ids are uuid hex strings; refuse anything that could escape job_dir
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._job_path(job_id), 'rb') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, job):
+        self._write_atomic(self._job_path(job['id']), json.dumps(job).encode('utf-8'))
+
+    def _remove(self, job):
+        for path in (self._job_path(job['id']), self.artifact_path(job['id'])):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _write_atomic(self, path, data):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+_queue = None
+_queue_pid = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Return this worker's job queue, creating it on first use"""
+    global _queue, _queue_pid
+    with _queue_lock:
+        if _queue is None or _queue_pid != os.getpid():
+            _queue = JobQueue()
+            _queue_pid = os.getpid()
+        return _queue
@@ -0,0 +1,81 @@
+import logging
+import os
+
+from application.data_version import clear_stale, mark_stale, stale_token
+
+# Keep the customer_balance ledger from migrations/003_customer_balance.sql up to date
+LEDGER_ENABLED = os.getenv('LEDGER_ENABLED', 'false').lower() == 'true'
+
+BALANCE_COLUMNS = 'total_sales,total_refunds,total_payments,total_advances,balance'
+
+logger = logging.getLogger('factory.ledger')
+
+
+def _apply(supabase, customer_name, customer_phone, **deltas):
+    if not LEDGER_ENABLED:
+        return
+    params = {'p_customer_name': customer_name, 'p_customer_phone': customer_phone}
+    params.update({f'p_{name}': amount for name, amount in deltas.items()})
+    try:
+        supabase.rpc('apply_customer_balance', params).execute()
+    except Exception:
+        # The write itself is already saved; balances are summed from history
+        # until `flask ledger reconcile` repairs the drift
+        logger.exception(f"Failed to update balance ledger for {customer_name} ({customer_phone})")
+        mark_stale('ledger')
+
+
+def record_sale(supabase, sale, sign=1):
+    """Apply a sale or refund row to its customer's balance; sign=-1 when it is deleted"""
+    amount = sign * sale['total']
+    if sale['is_refund']:
+        _apply(supabase, sale['customer_name'], sale['customer_phone'], refunds=amount)
+    else:
+        _apply(supabase, sale['customer_name'], sale['customer_phone'], sales=amount)
+
+
+def record_sales(supabase, sales, sign=1):
+    """Apply a batch of sale/refund rows with one ledger call per customer"""
+    deltas = {}
+    for sale in sales:
+        customer = deltas.setdefault((sale['customer_name'], sale['customer_phone']), {'sales': 0, 'refunds': 0})
+        customer['refunds' if sale['is_refund'] else 'sales'] += sign * sale['total']
+    for (customer_name, customer_phone), amounts in deltas.items():
+        _apply(supabase, customer_name, customer_phone, **amounts)
+
+
+def record_payment(supabase, payment, sign=1):
+    """Apply a payment row to its customer's balance; sign=-1 when it is deleted"""
+    _apply(supabase, payment['customer_name'], payment['customer_phone'], payments=sign * payment['amount'])
+
+
+def get_balance(supabase, customer_name, customer_phone):
+    """Ledger row for one customer, or None when the ledger is off or out of date.
+
+    A customer with no sales or payments yet has no row; that is a zero balance.
+    """
+    if not is_current():
+        return None
+    rows = supabase.table('customer_balance').select(BALANCE_COLUMNS).eq('customer_name', customer_name).eq('customer_phone', customer_phone).execute().data
+    if rows:
+        return rows[0]
+    return {'total_sales': 0, 'total_refunds': 0, 'total_payments': 0, 'total_advances': 0, 'balance': 0}
+
+
+def reconcile(supabase, customer_name=None, customer_phone=None):
+    """Recompute the ledger from sale, payment and transaction (all customers by default).
+
+    Only a full reconcile marks the ledger current again after a failed update.
+    """
+    token = stale_token('ledger')
+    supabase.rpc('reconcile_customer_balances', {
+        'p_customer_name': customer_name,
+        'p_customer_phone': customer_phone
+    }).execute()
+    if customer_name is None:
+        clear_stale('ledger', token)
+
+
+def is_current():
+    """True while the ledger is on and no update has failed since the last full reconcile"""
+    return LEDGER_ENABLED and stale_token('ledger') is None
@@ -0,0 +1,210 @@
+import base64
+import json
+import os
+
+from flask import request
+
+DEFAULT_PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Cursor values, or None for a missing or mangled cursor (start from the top)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _quote(value):
+    """Quote a value for a PostgREST logic tree (dates contain ':' and '.')"""
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _equal(column, value):
+    return f'{column}.is.null' if value is None else f'{column}.eq.{_quote(value)}'
+
+
+def _past(column, value, op, nullable):
+    """Conditions (any of) for a column value strictly past `value` in `op` direction.
+
+    As in Postgres ordering, NULL sorts after every value: last ascending,
+    first descending. So 'gt' also takes the NULLs and 'lt' of a NULL is
+    every non-NULL value.
+    """
+    if value is None:
+        return [] if op == 'gt' else [f'{column}.not.is.null']
+    branches = [f'{column}.{op}.{_quote(value)}']
+    if op == 'gt' and nullable:
+        branches.append(f'{column}.is.null')
+    return branches
+
+
+def keyset_condition(columns, values, op):
+    """Logic-tree condition selecting rows strictly past `values` in (columns) order.
+
+    For (date, sale_id) descending that is
+    or(date.lt.D, and(date.eq.D, sale_id.lt.ID)). Every column but the last
+    (a unique, non-NULL key) may be NULL, so NULL cursor values compare with
+    is.null and 'gt' steps include the NULL rows sorted after D.
+    """
+    branches = []
+    for i, column in enumerate(columns):
+        equal = [_equal(columns[j], values[j]) for j in range(i)]
+        for past in _past(column, values[i], op, nullable=i < len(columns) - 1):
+            branch = equal + [past]
+            branches.append(branch[0] if len(branch) == 1 else f"and({','.join(branch)})")
+    return branches[0] if len(branches) == 1 else f"or({','.join(branches)})"
+
+
+def apply_conditions(query, conditions):
+    """AND several logic-tree conditions into a single or= parameter.
+
+    PostgREST only honours one `or` parameter per request, so a search
+    filter and a cursor are nested as or=(and(cond1,cond2)).
+    """
+    if not conditions:
+        return query
+    if len(conditions) == 1:
+        condition = conditions[0]
+        if condition.startswith('or(') and condition.endswith(')'):
+            return query.or_(condition[3:-1])
+        return query.or_(condition)
+    return query.or_(f"and({','.join(conditions)})")
+
+
+class Page:
+    def __init__(self, items, next_cursor, prev_cursor, page_size, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def is_partial(self):
+        """True when the listing has rows on other pages, so page sums aren't listing totals"""
+        return self.has_prev or self.has_next
+
+    def url_args(self, direction):
+        """Current query args with the cursor for the given direction ('after' or 'before')"""
+        args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+        args[direction] = self.next_cursor if direction == 'after' else self.prev_cursor
+        return args
+
+
+def page_size_arg():
+    try:
+        size = int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(build_query, order, conditions=(), page_size=None, with_total=False, select='*'):
+    """Fetch one page of build_query() ordered by `order` using keyset cursors.
+
+    build_query(columns, **select_kwargs) returns the filtered query;
+    order is a list of (column, descending) pairs, all in the same direction
+    and ending in a unique, non-NULL column, and `select` must include them.
+    The cursor comes from the request's `after` / `before` args, so a page
+    costs one indexed range scan no matter how deep into the listing it is.
+    """
+    page_size = page_size or page_size_arg()
+    columns = [column for column, _ in order]
+    descending = order[0][1]
+
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
+    cursor_conditions = list(conditions)
+    backwards = False
+    if before and len(before) == len(columns):
+        backwards = True
+        cursor_conditions.append(keyset_condition(columns, before, 'gt' if descending else 'lt'))
+    elif after and len(after) == len(columns):
+        cursor_conditions.append(keyset_condition(columns, after, 'lt' if descending else 'gt'))
+
+    query = apply_conditions(build_query(select), cursor_conditions)
+    for column, desc in order:
+        # Walking backwards reads the previous page in reverse order
+        query = query.order(column, desc=desc != backwards)
+    rows = query.limit(page_size + 1).execute().data
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([row[column] for column in columns])
+
+    if backwards:
+        next_cursor = cursor_for(rows[-1]) if rows else None
+        prev_cursor = cursor_for(rows[0]) if rows and more else None
+    else:
+        next_cursor = cursor_for(rows[-1]) if rows and more else None
+        prev_cursor = cursor_for(rows[0]) if rows and after else None
+
+    total = None
+    if with_total:
+        count_query = apply_conditions(build_query(columns[-1], count='exact', head=True), list(conditions))
+        total = count_query.execute().count
+
+    return Page(rows, next_cursor, prev_cursor, page_size, total)
+
+
+def list_page(rows, order, page_size=None):
+    """keyset_page over rows already in memory (e.g. an in-process search result).
+
+    Takes the same `after` / `before` cursors, so the pagination include
+    works unchanged; the rows are sorted here by `order`.
+    """
+    page_size = page_size or page_size_arg()
+    columns = [column for column, _ in order]
+    descending = order[0][1]
+
+    def key(row):
+        return [row[column] for column in columns]
+
+    rows = sorted(rows, key=key, reverse=descending)
+    total = len(rows)
+
+    # Strictly before / after a cursor in listing order
+    def earlier(row, cursor):
+        return key(row) > cursor if descending else key(row) < cursor
+
+    def later(row, cursor):
+        return key(row) < cursor if descending else key(row) > cursor
+
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
+    if before and len(before) == len(columns):
+        rows = [row for row in rows if earlier(row, before)]
+        items = rows[-page_size:]
+        next_cursor = encode_cursor(key(items[-1])) if items else None
+        prev_cursor = encode_cursor(key(items[0])) if len(rows) > page_size else None
+    else:
+        if after and len(after) == len(columns):
+            rows = [row for row in rows if later(row, after)]
+        items = rows[:page_size]
+        next_cursor = encode_cursor(key(items[-1])) if len(rows) > page_size else None
+        prev_cursor = encode_cursor(key(items[0])) if items and after else None
+
+    return Page(items, next_cursor, prev_cursor, page_size, total)
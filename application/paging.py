@@ -0,0 +1,82 @@
+import os
+
+from application.fanout import submit
+from application.pagination import keyset_condition, apply_conditions
+
+# Rows requested per page when walking a whole table or view. PostgREST
+# silently caps a response at its max-rows setting (1000 on Supabase), so
+# a walk only ends on an empty page, never on a short one; a page size
+# above the cap costs round trips but never rows.
+PAGING_PAGE_SIZE = int(os.getenv('PAGING_PAGE_SIZE', 1000))
+
+
+def _pages(fetch_page, advance, state, prefetch):
+    """Yield pages until one comes back empty.
+
+    fetch_page(state) returns a page of rows and advance(state, rows) the
+    state for the next page. With prefetch the next page is requested in
+    the background while the caller works through the current one.
+    """
+    future = None
+    try:
+        while True:
+            rows = future.result() if future is not None else fetch_page(state)
+            future = None
+            if not rows:
+                return
+            state = advance(state, rows)
+            if prefetch:
+                future = submit(lambda state=state: fetch_page(state))
+            yield rows
+    finally:
+        if future is not None:
+            future.cancel()
+
+
+def iter_rows(build_query, order, select='*', page_size=None, prefetch=False):
+    """Yield every row of build_query(select) in `order`, one keyset page at a time.
+
+    order is a list of (column, descending) pairs, all in the same direction
+    and ending in a unique, non-NULL column, as for keyset_page; `select` must include
+    them. Each page is an indexed range scan after the previous page's last
+    row, and only one page (two with prefetch) is held in memory at a time.
+    """
+    page_size = page_size or PAGING_PAGE_SIZE
+    columns = [column for column, _ in order]
+    op = 'lt' if order[0][1] else 'gt'
+
+    def fetch_page(cursor):
+        conditions = [keyset_condition(columns, cursor, op)] if cursor else []
+        query = apply_conditions(build_query(select), conditions)
+        for column, desc in order:
+            query = query.order(column, desc=desc)
+        return query.limit(page_size).execute().data
+
+    def advance(cursor, rows):
+        return [rows[-1][column] for column in columns]
+
+    for rows in _pages(fetch_page, advance, None, prefetch):
+        yield from rows
+
+
+def iter_range(build_query, order, select='*', page_size=None, prefetch=False):
+    """Yield every row of build_query(select) page by page with offset ranges.
+
+    For relations with nothing to seek on (e.g. the grouped report views,
+    which are recomputed per request either way). `order` must still make
+    the row order stable between requests.
+    """
+    page_size = page_size or PAGING_PAGE_SIZE
+
+    def fetch_page(offset):
+        query = build_query(select)
+        for column, desc in order:
+            query = query.order(column, desc=desc)
+        return query.range(offset, offset + page_size - 1).execute().data
+
+    def advance(offset, rows):
+        # A capped page still moves on by the rows it actually returned
+        return offset + len(rows)
+
+    for rows in _pages(fetch_page, advance, 0, prefetch):
+        yield from rows
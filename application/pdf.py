@@ -0,0 +1,167 @@
+import asyncio
+import os
+import threading
+
+from playwright.async_api import async_playwright
+
+from application.request_timing import phase
+
+# Pool configuration (per gunicorn worker)
+PDF_MAX_CONCURRENT = int(os.getenv('PDF_MAX_CONCURRENT', 2))
+PDF_RECYCLE_AFTER = int(os.getenv('PDF_RECYCLE_AFTER', 200))
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', 30))
+
+PDF_OPTIONS = {
+    'format': 'A4',
+    'margin': {
+        'top': '1cm',
+        'right': '1cm',
+        'bottom': '1cm',
+        'left': '1cm'
+    },
+    'print_background': True,
+    'prefer_css_page_size': True
+}
+
+
+class BrowserPool:
+    """Long-lived headless Chromium shared by every PDF export in this process.
+
+    Playwright objects are bound to the event loop that created them, so the
+    pool runs its own loop on a daemon thread and request threads hand work to
+    it with run_coroutine_threadsafe. Pages are kept and reused between
+    renders, at most max_concurrent renders run at once, and the browser is
+    relaunched after recycle_after renders or as soon as it crashes.
+    """
+
+    def __init__(self, max_concurrent=PDF_MAX_CONCURRENT, recycle_after=PDF_RECYCLE_AFTER,
+                 render_timeout=PDF_RENDER_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.recycle_after = recycle_after
+        self.render_timeout = render_timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='pdf-browser-pool', daemon=True)
+        self._thread.start()
+
+        # Everything below is only touched from the pool's own loop
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages = []
+        self._renders = 0
+        self._active = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._launch_lock = asyncio.Lock()
+
+    def render(self, html_content):
+        """Render HTML to PDF bytes, blocking the calling thread until done"""
+        future = asyncio.run_coroutine_threadsafe(self._render(html_content), self._loop)
+        try:
+            return future.result(timeout=self.render_timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        future.result(timeout=self.render_timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _render(self, html_content):
+        async with self._semaphore:
+            self._active += 1
+            try:
+                await self._ensure_browser()
+                page = self._idle_pages.pop() if self._idle_pages else await self._context.new_page()
+            except Exception:
+                self._active -= 1
+                raise
+
+            try:
+                # Wait for the stylesheets and fonts instead of a fixed sleep
+                await page.set_content(html_content, wait_until='networkidle',
+                                       timeout=self.render_timeout * 1000)
+                await page.evaluate('() => document.fonts.ready.then(() => true)')
+                pdf_bytes = await page.pdf(**PDF_OPTIONS)
+            except BaseException:
+                # Never reuse a page that failed or was cancelled mid-render
+                await self._discard_page(page)
+                raise
+            else:
+                self._idle_pages.append(page)
+            finally:
+                self._active -= 1
+
+            self._renders += 1
+            if self._renders >= self.recycle_after and self._active == 0:
+                await self._close_browser()
+            return pdf_bytes
+
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            await self._close_browser()
+
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch()
+            self._browser.on('disconnected', self._on_disconnected)
+            self._context = await self._browser.new_context()
+            self._renders = 0
+
+    def _on_disconnected(self, browser):
+        # Chromium crashed or was killed; drop it so the next render relaunches
+        if browser is self._browser:
+            self._browser = None
+            self._context = None
+            self._idle_pages = []
+
+    async def _discard_page(self, page):
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+    async def _close_browser(self):
+        browser = self._browser
+        self._browser = None
+        self._context = None
+        self._idle_pages = []
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _shutdown(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this worker's browser pool, creating it on first use.
+
+    The pool is keyed on the process id so a gunicorn worker forked from a
+    master that already rendered never inherits the parent's browser.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def html_to_pdf(html_content, filename=None):
+    """Convert HTML to PDF using the shared Chromium pool"""
+    with phase('pdf'):
+        return get_pool().render(html_content)
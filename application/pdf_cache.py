@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from application.data_version import get_version
+
+# Generated PDFs, keyed on report + parameters + data version
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'factory-pdf-cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+PDF_CACHE_MAX_ENTRIES = int(os.getenv('PDF_CACHE_MAX_ENTRIES', 500))
+# Keys also roll over this often (seconds), so writes made outside the app
+# (which don't bump the data versions) show up after at most this long; 0 = never
+PDF_CACHE_WINDOW = int(os.getenv('PDF_CACHE_WINDOW', 300))
+
+# Every report reads from these, so a write to any of them changes every key
+REPORT_TABLES = ('sale', 'payment', 'transaction', 'stock')
+
+
+def cache_key(report, params):
+    """Content address for a report PDF: same inputs, same data and same time window -> same key"""
+    payload = json.dumps({
+        'report': report,
+        'params': params,
+        'data_version': get_version(*REPORT_TABLES),
+        'window': int(time.time() // PDF_CACHE_WINDOW) if PDF_CACHE_WINDOW > 0 else 0
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """Size-bounded on-disk LRU of rendered PDFs.
+
+    Recency is the file's mtime, bumped on every hit, so the cache is shared
+    by all workers on the box without any extra bookkeeping. Stale entries
+    are never looked up again once the data version or time window moves
+    on, and simply age out of the LRU.
+    """
+
+    def __init__(self, cache_dir=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES,
+                 max_entries=PDF_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached PDF's path, or None on a miss"""
+        path = self.path(key)
+        try:
+            # Touch on hit so the entry counts as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key, pdf_bytes):
+        tmp_path = f'{self.path(key)}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is within bounds"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pdf'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            _, size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        entries = [name for name in os.listdir(self.cache_dir) if name.endswith('.pdf')]
+        total_bytes = 0
+        for name in entries:
+            try:
+                total_bytes += os.path.getsize(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PDFCache()
+        return _cache
@@ -0,0 +1,221 @@
+import os
+
+from application import rollups, ledger, reference_data
+from application.fanout import gather
+from application.projections import columns
+
+# Post sales, refunds and deletions through the single-transaction RPCs in
+# migrations/004_sale_posting.sql instead of separate requests per table
+ATOMIC_SALES = os.getenv('ATOMIC_SALES', 'false').lower() == 'true'
+
+
+def _flags():
+    # The RPCs update the rollups and ledger themselves when those are on
+    return {'p_apply_rollups': rollups.ROLLUPS_ENABLED, 'p_apply_ledger': ledger.LEDGER_ENABLED}
+
+
+def post_sale(supabase, customer_name, customer_phone, stock_size, stock_color, quantity, rate, note, date):
+    """Insert the sale and its transaction and take the units out of stock.
+
+    Returns the RPC's result: {'status': 'ok', 'sale_id', 'previous_quantity',
+    'new_quantity'} or {'status': 'customer_not_found' | 'stock_not_found'}.
+    """
+    return supabase.rpc('post_sale', dict({
+        'p_customer_name': customer_name,
+        'p_customer_phone': customer_phone,
+        'p_stock_size': stock_size,
+        'p_stock_color': stock_color,
+        'p_quantity': quantity,
+        'p_rate': rate,
+        'p_note': note,
+        'p_date': date
+    }, **_flags())).execute().data
+
+
+def post_refund(supabase, sale_id, note, date):
+    """Refund a sale in full: {'status': 'ok', 'sale_id': <refund id>} or 'sale_not_found'"""
+    return supabase.rpc('post_refund', dict({
+        'p_sale_id': sale_id,
+        'p_note': note,
+        'p_date': date
+    }, **_flags())).execute().data
+
+
+def delete_sale(supabase, sale_id):
+    """Delete a sale or refund with its transactions, restoring stock for a sale.
+
+    Returns {'status': 'ok', 'sale_id', 'date'} (the deleted row's date) or 'sale_not_found'.
+    """
+    return supabase.rpc('delete_sale', dict({'p_sale_id': sale_id}, **_flags())).execute().data
+
+
+def post_invoice(supabase, customer_name, customer_phone, lines, date):
+    """Post every line of an invoice in one RPC (migrations/005_invoice_posting.sql).
+
+    lines are dicts with stock_size, stock_color, quantity, rate and note.
+    Returns {'status': 'ok', 'sale_ids', 'total', 'negative_stock'} or
+    {'status': 'customer_not_found'} / {'status': 'stock_not_found', 'line': n}.
+    """
+    return supabase.rpc('post_invoice', dict({
+        'p_customer_name': customer_name,
+        'p_customer_phone': customer_phone,
+        'p_lines': lines,
+        'p_date': date
+    }, **_flags())).execute().data
+
+
+# Tries at one stock update in post_invoice_batched while other writes keep changing the row
+STOCK_UPDATE_ATTEMPTS = 5
+
+
+class InvoicePostingError(Exception):
+    """post_invoice_batched failed partway and couldn't undo everything it had written"""
+
+
+def _take_stock(supabase, item, quantity, cost):
+    """Take `quantity` units costing `cost` off one stock row, as a delta.
+
+    PostgREST has no `quantity = quantity - n`, so the update only applies
+    while the row still holds the quantity and total_cost it was read with;
+    when another sale or invoice got there first, the row is re-read and
+    the delta applied to the new values. Returns the row before and after.
+    """
+    for _ in range(STOCK_UPDATE_ATTEMPTS):
+        updated = (supabase.table('stock')
+                   .update({'quantity': item['quantity'] - quantity, 'total_cost': item['total_cost'] - cost})
+                   .eq('size', item['size']).eq('color', item['color'])
+                   .eq('quantity', item['quantity']).eq('total_cost', item['total_cost'])
+                   .execute().data)
+        if updated:
+            return item, updated[0]
+        rows = (supabase.table('stock').select(columns('stock', 'snapshot'))
+                .eq('size', item['size']).eq('color', item['color']).execute().data)
+        if not rows:
+            raise ValueError(f"Stock item {item['size']} - {item['color']} was deleted while posting.")
+        item = rows[0]
+    raise RuntimeError(f"Stock item {item['size']} - {item['color']} kept changing; please try again.")
+
+
+def _try(call):
+    # For gather: every call runs to the end, so we know which ones need undoing
+    def run():
+        try:
+            return call()
+        except Exception as e:
+            return e
+    return run
+
+
+def post_invoice_batched(supabase, customer_name, customer_phone, lines, date):
+    """Same result as post_invoice through the REST API, for databases without the RPC.
+
+    Not a constant number of requests: besides the fixed ones (customer
+    check, usually answered from the reference cache, one stock snapshot,
+    one bulk insert each for sales and transactions, two rollup calls and
+    one ledger call when those are on) it sends one stock update per distinct
+    size/color, concurrently, and re-reads and retries any of them that
+    another write got to first.
+
+    Stock is decremented by delta (see _take_stock), so concurrent sales of
+    the same item are not lost. Without a transaction the steps can still
+    fail halfway: stock is taken first, and if a later step fails what was
+    written is undone before the error is re-raised. If undoing fails too,
+    InvoicePostingError says what is left to fix by hand.
+    """
+    if not reference_data.customer_exists(supabase, customer_name, customer_phone):
+        return {'status': 'customer_not_found'}
+
+    sizes = sorted({line['stock_size'] for line in lines})
+    snapshot = supabase.table('stock').select(columns('stock', 'snapshot')).in_('size', sizes).execute().data
+    stock = {(item['size'], item['color']): item for item in snapshot}
+    for line_no, line in enumerate(lines, 1):
+        if (line['stock_size'], line['stock_color']) not in stock:
+            return {'status': 'stock_not_found', 'line': line_no}
+
+    sales = []
+    taken = {}  # (size, color) -> [quantity, total_cost]
+    for line in lines:
+        key = (line['stock_size'], line['stock_color'])
+        cost_per_unit = stock[key]['cost_per_unit']
+        total = line['quantity'] * line['rate']
+        total_cost = cost_per_unit * line['quantity']
+        delta = taken.setdefault(key, [0, 0])
+        delta[0] += line['quantity']
+        delta[1] += total_cost
+
+        sales.append({
+            'customer_name': customer_name,
+            'customer_phone': customer_phone,
+            'stock_size': line['stock_size'],
+            'stock_color': line['stock_color'],
+            'quantity': line['quantity'],
+            'rate': line['rate'],
+            'total': total,
+            'cost_per_unit': cost_per_unit,
+            'total_cost': total_cost,
+            'profit': total - total_cost,
+            'date': date,
+            'is_refund': False
+        })
+
+    keys = list(taken)
+    results = gather(*(_try(lambda key=key: _take_stock(supabase, stock[key], *taken[key])) for key in keys))
+    updated = {key: result for key, result in zip(keys, results) if not isinstance(result, Exception)}
+    sale_ids = []
+
+    def undo(error):
+        """Reverse what was written, then re-raise `error` (or report what couldn't be reversed)"""
+        left = []
+        if sale_ids:
+            try:
+                supabase.table('sale').delete().in_('sale_id', sale_ids).execute()
+            except Exception as e:
+                left.append(f"sales {', '.join(f'#{sale_id}' for sale_id in sale_ids)} ({e})")
+        for key, (_, after) in updated.items():
+            try:
+                _take_stock(supabase, after, -taken[key][0], -taken[key][1])
+            except Exception as e:
+                left.append(f'{taken[key][0]} units of {key[0]} - {key[1]} taken from stock ({e})')
+        if left:
+            raise InvoicePostingError(f"Invoice failed ({error}) and these writes could not be undone: "
+                                      f"{'; '.join(left)}. Please correct them by hand.") from error
+        raise error
+
+    failed = next((result for result in results if isinstance(result, Exception)), None)
+    if failed is not None:
+        undo(failed)
+
+    generation = rollups.generation(supabase)
+    try:
+        # PostgREST returns bulk-inserted rows in input order
+        sale_ids.extend(row['sale_id'] for row in supabase.table('sale').insert(sales).execute().data)
+        supabase.table('transaction').insert([{
+            'customer_name': customer_name,
+            'customer_phone': customer_phone,
+            'amount': sale['total'],
+            'type': 'sale',
+            'related_sale_id': sale_id,
+            'date': date,
+            'note': line['note']
+        } for sale, sale_id, line in zip(sales, sale_ids, lines)]).execute()
+    except Exception as e:
+        undo(e)
+
+    rollups.record_sales(supabase, sales, generation=generation)
+    ledger.record_sales(supabase, sales)
+
+    # Stock after each line, as post_invoice reports it
+    negative_stock = []
+    running = {key: before['quantity'] for key, (before, _) in updated.items()}
+    for line in lines:
+        key = (line['stock_size'], line['stock_color'])
+        running[key] -= line['quantity']
+        if running[key] < 0:
+            negative_stock.append({'stock_size': key[0], 'stock_color': key[1], 'new_quantity': running[key]})
+
+    return {
+        'status': 'ok',
+        'sale_ids': sale_ids,
+        'total': sum(sale['total'] for sale in sales),
+        'negative_stock': negative_stock
+    }
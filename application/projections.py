@@ -0,0 +1,65 @@
+# Columns each use site actually reads, instead of select('*').
+# Keep an entry in step with the template or code that consumes it; a column
+# missing here shows up as an empty cell (templates) or a KeyError (code).
+PROJECTIONS = {
+    'customer': {
+        # List view, form dropdowns and detail pages show the whole customer
+        'list': 'name,phone,company',
+        'option': 'name,phone,company',
+        'detail': 'name,phone,company',
+        'exists': 'name'
+    },
+    'stock': {
+        'list': 'size,color,quantity,cost_per_unit,total_cost',
+        'detail': 'size,color,quantity,cost_per_unit,total_cost',
+        # Sale form: size/color dropdowns plus the quantity and cost hints
+        'option': 'size,color,quantity,cost_per_unit',
+        # Read-modify-write of quantity and cost on stock.add and sales
+        'adjust': 'quantity,cost_per_unit,total_cost',
+        # Snapshot an invoice validates against; its quantity/total_cost guard the delta updates
+        'snapshot': 'size,color,quantity,cost_per_unit,total_cost',
+        'dashboard': 'size,color,quantity,total_cost',
+        'report': 'size,color'
+    },
+    'sale': {
+        'list': 'sale_id,customer_name,customer_phone,stock_size,stock_color,quantity,rate,total,date,is_refund',
+        # Everything refund/delete copy or reverse (rollups, ledger, stock)
+        'detail': 'sale_id,customer_name,customer_phone,stock_size,stock_color,quantity,rate,total,'
+                  'cost_per_unit,total_cost,profit,date,is_refund',
+        'history': 'sale_id,quantity,rate,total,date,is_refund',
+        'statement': 'sale_id,total,date,is_refund',
+        'recent': 'customer_name,customer_phone,total,date',
+        # Balance summed from history when the ledger is off or out of date
+        'balance': 'total,is_refund',
+        # CSV export column order for the accountant
+        'export': 'sale_id,date,customer_name,customer_phone,stock_size,stock_color,quantity,rate,total,'
+                  'cost_per_unit,total_cost,profit,is_refund',
+        'report': 'sale_id,customer_name,customer_phone,stock_size,stock_color,quantity,total,total_cost,profit,date,is_refund'
+    },
+    'payment': {
+        'list': 'payment_id,customer_name,customer_phone,amount,description,date',
+        'detail': 'payment_id,customer_name,customer_phone,amount,description,date',
+        'statement': 'amount,description,date',
+        'export': 'payment_id,date,customer_name,customer_phone,amount,description',
+        'report': 'payment_id,customer_name,customer_phone,amount'
+    },
+    'transaction': {
+        'history': 'amount,type,note,related_sale_id,date',
+        'statement': 'amount,type,note,date',
+        'balance': 'amount,type',
+        'export': 'transaction_id,date,customer_name,customer_phone,type,amount,related_sale_id,note'
+    },
+    # Grouped relations read by the report loaders (views and rollup tables
+    # share their column names)
+    'rollup': {
+        'item': 'stock_size,stock_color,is_refund,sale_count,quantity,total,total_cost,profit',
+        'customer': 'customer_name,customer_phone,is_refund,sale_count,quantity,total,total_cost,profit',
+        'month': 'month,is_refund,sale_count,quantity,total,total_cost,profit',
+        'payment': 'customer_name,customer_phone,amount'
+    }
+}
+
+
+def columns(table, use):
+    """Projection for `table` at a given use site, e.g. columns('sale', 'list')"""
+    return PROJECTIONS[table][use]
@@ -0,0 +1,69 @@
+import os
+
+from application.cache import VersionedCache
+from application.database import get_db
+from application.paging import iter_rows
+from application.projections import columns
+
+# Customer and stock lists behind the form dropdowns. They are rebuilt after
+# any customer/stock write (sale writes change stock too), or after this
+# many seconds to catch edits made outside the app.
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))
+
+customer_cache = VersionedCache(('customer',), REFERENCE_CACHE_TTL)
+stock_cache = VersionedCache(('stock',), REFERENCE_CACHE_TTL)
+
+
+def customers():
+    """All customers ordered by name (name, phone, company)"""
+    return customer_cache.get('customers', lambda: list(iter_rows(
+        lambda select: get_db().table('customer').select(select),
+        [('name', False), ('phone', False)], columns('customer', 'option'))))
+
+
+def _customer_keys():
+    return customer_cache.get('keys', lambda: {(customer['name'], customer['phone']) for customer in customers()})
+
+
+def customer_exists(supabase, name, phone):
+    """Whether the customer exists; only asks the database when the cached list says no"""
+    if (name, phone) in _customer_keys():
+        return True
+    # Might have been added since the list was cached (e.g. from the Supabase dashboard)
+    return bool(supabase.table('customer').select(columns('customer', 'exists')).eq('name', name).eq('phone', phone).execute().data)
+
+
+def stock_items():
+    """All stock rows ordered by size, with the columns of the stock list view.
+
+    For display and dropdowns only: code that adjusts quantities must read
+    the row fresh (or use the posting RPCs).
+    """
+    return stock_cache.get('stock', lambda: list(iter_rows(
+        lambda select: get_db().table('stock').select(select),
+        [('size', False), ('color', False)], columns('stock', 'list'))))
+
+
+def stock_sizes():
+    """Distinct stock sizes, in the stock list's order"""
+    return stock_cache.get('sizes', lambda: list(dict.fromkeys(item['size'] for item in stock_items())))
+
+
+def _colors_by_size():
+    colors = {}
+    for item in stock_items():
+        colors.setdefault(item['size'], []).append({
+            'color': item['color'],
+            'quantity': item['quantity'],
+            'cost_per_unit': item['cost_per_unit']
+        })
+    return colors
+
+
+def stock_colors(size):
+    """Colors stocked in one size with their quantity and unit cost ([] for an unknown size)"""
+    return stock_cache.get('colors', _colors_by_size).get(size, [])
+
+
+def stats():
+    return {'customers': customer_cache.stats(), 'stock': stock_cache.stats()}
@@ -0,0 +1,578 @@
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+from application.database import get_db
+from application.data_version import table_version
+from application.paging import iter_rows
+from application.request_timing import phase
+
+# Optional local SQLite copy of the app's tables for reports and listings.
+# Writes always go to Supabase; the replica catches up before it is read.
+REPLICA_ENABLED = os.getenv('REPLICA_ENABLED', 'false').lower() == 'true'
+REPLICA_PATH = os.getenv('REPLICA_PATH', os.path.join(tempfile.gettempdir(), 'factory-replica.sqlite3'))
+# Reads fall back to Supabase when the replica is further behind than this (seconds)
+REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', 300))
+# Look for writes made outside the app at least this often (seconds)
+REPLICA_SYNC_INTERVAL = int(os.getenv('REPLICA_SYNC_INTERVAL', 30))
+# Full row-by-row comparison with Supabase this often (seconds, 0 = only on demand)
+REPLICA_VERIFY_INTERVAL = int(os.getenv('REPLICA_VERIFY_INTERVAL', 3600))
+
+# Replicated tables. sale, payment and transaction are only ever inserted
+# and deleted, so they sync by their serial id; customer and stock are
+# small and edited in place, so they are copied whole when they change.
+TABLES = {
+    'customer': {
+        'columns': {'name': str, 'phone': str, 'company': str},
+        'key': ('name', 'phone')
+    },
+    'stock': {
+        'columns': {'size': str, 'color': str, 'quantity': int, 'cost_per_unit': float, 'total_cost': float},
+        'key': ('size', 'color')
+    },
+    'sale': {
+        'columns': {'sale_id': int, 'customer_name': str, 'customer_phone': str, 'stock_size': str,
+                    'stock_color': str, 'quantity': int, 'rate': float, 'total': float,
+                    'cost_per_unit': float, 'total_cost': float, 'profit': float, 'date': str,
+                    'is_refund': bool},
+        'key': ('sale_id',),
+        'serial': 'sale_id'
+    },
+    'payment': {
+        'columns': {'payment_id': int, 'customer_name': str, 'customer_phone': str, 'amount': float,
+                    'description': str, 'date': str},
+        'key': ('payment_id',),
+        'serial': 'payment_id'
+    },
+    'transaction': {
+        'columns': {'transaction_id': int, 'customer_name': str, 'customer_phone': str, 'type': str,
+                    'amount': float, 'related_sale_id': int, 'note': str, 'date': str},
+        'key': ('transaction_id',),
+        'serial': 'transaction_id'
+    }
+}
+
+# The listings' keyset orders, the per-customer lookups and refund/delete by sale
+INDEXES = [
+    ('sale', ('date', 'sale_id')),
+    ('sale', ('customer_name', 'customer_phone')),
+    ('payment', ('date', 'payment_id')),
+    ('payment', ('customer_name', 'customer_phone')),
+    ('transaction', ('date', 'transaction_id')),
+    ('transaction', ('customer_name', 'customer_phone')),
+    ('transaction', ('related_sale_id',))
+]
+
+SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT', bool: 'BOOLEAN'}
+
+# Rows per statement when deleting or fetching by id
+ID_BATCH = 500
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+_sync_lock = threading.Lock()
+
+logger = logging.getLogger('factory.replica')
+
+
+def _schema():
+    statements = ['CREATE TABLE IF NOT EXISTS replica_state '
+                  '(name TEXT PRIMARY KEY, version TEXT, synced_at REAL, verified_at REAL)']
+    for table, spec in TABLES.items():
+        columns = ', '.join(f'"{column}" {SQL_TYPES[kind]}' for column, kind in spec['columns'].items())
+        key = ', '.join(f'"{column}"' for column in spec['key'])
+        statements.append(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns}, PRIMARY KEY ({key}))')
+    for table, columns in INDEXES:
+        name = f"{table}_{'_'.join(columns)}_idx"
+        quoted = ', '.join(f'"{column}"' for column in columns)
+        statements.append(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({quoted})')
+    return statements
+
+
+def connect():
+    """Connection to the replica file, creating its tables on first use in this process"""
+    global _schema_ready
+    conn = sqlite3.connect(REPLICA_PATH, timeout=30)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                # WAL: readers in other workers never wait on a sync
+                conn.execute('PRAGMA journal_mode=WAL')
+                with conn:
+                    for statement in _schema():
+                        conn.execute(statement)
+                _schema_ready = True
+    return conn
+
+
+def _to_sql(kind, value):
+    """Coerce a value (possibly the text of a PostgREST filter) to the column's type"""
+    if value is None or kind is str:
+        return value
+    if kind is bool:
+        if isinstance(value, str):
+            return value.lower() == 'true'
+        return bool(value)
+    return kind(value)
+
+
+def _from_row(types, names, row):
+    return {name: (bool(value) if types[name] is bool and value is not None else value)
+            for name, value in zip(names, row)}
+
+
+# Reads: the PostgREST query-builder calls the listings, exports and
+# keyset pagination make, answered with SQL on the replica
+
+class ReplicaResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class ReplicaQuery:
+    """select/filter/order/limit like supabase.table(name), run against the local copy.
+
+    Covers what application.pagination, application.filters and the export
+    iterators use: eq, neq, gt(e), lt(e), ilike, in_, is_ and or_ logic
+    trees (with not.). NULLs sort last ascending and first descending, as in Postgres.
+    """
+
+    def __init__(self, table):
+        if table not in TABLES:
+            raise ValueError(f'{table} is not replicated')
+        self.table = table
+        self.types = TABLES[table]['columns']
+        self._columns = list(self.types)
+        self._count = None
+        self._head = False
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+        self._offset = 0
+
+    def _column(self, column):
+        if column not in self.types:
+            raise ValueError(f'Unknown column {self.table}.{column}')
+        return f'"{column}"'
+
+    def select(self, columns='*', count=None, head=False):
+        if columns.strip() != '*':
+            self._columns = [column.strip() for column in columns.split(',')]
+            for column in self._columns:
+                self._column(column)
+        self._count = count
+        self._head = head
+        return self
+
+    def _leaf(self, column, op, value):
+        """SQL and parameters for one column.op.value filter"""
+        quoted = self._column(column)
+        kind = self.types[column]
+        if op == 'is':
+            if str(value).lower() == 'null':
+                return f'{quoted} IS NULL', []
+            return f'{quoted} IS ?', [_to_sql(bool, value)]
+        if op == 'in':
+            values = value if isinstance(value, (list, tuple)) else _split(value.strip('()'))
+            values = [_to_sql(kind, _unquote(v) if isinstance(v, str) else v) for v in values]
+            if not values:
+                return '0', []
+            return f"{quoted} IN ({', '.join('?' * len(values))})", values
+        if op == 'ilike':
+            # SQLite's LIKE already ignores (ASCII) case; PostgREST also takes * for %
+            return f'{quoted} LIKE ?', [str(value).replace('*', '%')]
+        operators = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+        if op not in operators:
+            raise ValueError(f'Unsupported filter {op}')
+        return f'{quoted} {operators[op]} ?', [_to_sql(kind, value)]
+
+    def _filter(self, column, op, value):
+        sql, params = self._leaf(column, op, value)
+        self._where.append(sql)
+        self._params.extend(params)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value)
+
+    def _tree(self, text):
+        """SQL for one logic-tree node: and(...), or(...) or column.op.value"""
+        match = re.match(r'^(and|or)\((.*)\)$', text, re.S)
+        if match:
+            parts = [self._tree(part) for part in _split(match.group(2))]
+            joiner = f' {match.group(1).upper()} '
+            return f"({joiner.join(sql for sql, _ in parts)})", [p for _, params in parts for p in params]
+        column, op, value = text.split('.', 2)
+        if op == 'not':
+            sql, params = self._tree(f'{column}.{value}')
+            return f'NOT ({sql})', params
+        return self._leaf(column, op, value if op == 'in' else _unquote(value))
+
+    def or_(self, filters):
+        sql, params = self._tree(f'or({filters})')
+        self._where.append(sql)
+        self._params.extend(params)
+        return self
+
+    def order(self, column, desc=False):
+        quoted = self._column(column)
+        # Postgres puts NULLs last ascending and first descending; SQLite the reverse
+        self._order.append(f'{quoted} IS NULL DESC, {quoted} DESC' if desc else f'{quoted} IS NULL, {quoted}')
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self):
+        where = f" WHERE {' AND '.join(self._where)}" if self._where else ''
+        with phase('replica'), closing(connect()) as conn:
+            count = None
+            if self._count:
+                count = conn.execute(f'SELECT count(*) FROM "{self.table}"{where}', self._params).fetchone()[0]
+            if self._head:
+                return ReplicaResponse([], count)
+
+            columns = ', '.join(f'"{column}"' for column in self._columns)
+            sql = f'SELECT {columns} FROM "{self.table}"{where}'
+            if self._order:
+                sql += f" ORDER BY {', '.join(self._order)}"
+            if self._limit is not None or self._offset:
+                sql += f' LIMIT {int(self._limit if self._limit is not None else -1)} OFFSET {int(self._offset)}'
+            rows = conn.execute(sql, self._params).fetchall()
+        return ReplicaResponse([_from_row(self.types, self._columns, row) for row in rows], count)
+
+
+def _split(text):
+    """Split a logic tree's top level on commas outside parentheses and quotes"""
+    parts, current, depth, quoted, escaped = [], [], 0, False, False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+class ReplicaClient:
+    """Stands in for the Supabase client on read paths (table queries only)"""
+
+    def table(self, name):
+        return ReplicaQuery(name)
+
+    def query(self, sql, params=()):
+        """Rows of a raw SQL query as dicts, for local aggregation"""
+        with phase('replica'), closing(connect()) as conn:
+            cursor = conn.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+# Sync
+
+def _state(conn, table):
+    row = conn.execute('SELECT version, synced_at, verified_at FROM replica_state WHERE name = ?', (table,)).fetchone()
+    return None if row is None else {'version': row[0], 'synced_at': row[1], 'verified_at': row[2]}
+
+
+def _upsert(conn, table, rows):
+    spec = TABLES[table]['columns']
+    names = list(spec)
+    placeholders = ', '.join('?' * len(names))
+    quoted = ', '.join(f'"{name}"' for name in names)
+    conn.executemany(f'INSERT OR REPLACE INTO "{table}" ({quoted}) VALUES ({placeholders})',
+                     [[_to_sql(spec[name], row.get(name)) for name in names] for row in rows])
+
+
+def _walk(supabase, table, build=None):
+    """Every remote row of a table (optionally filtered), in key order"""
+    spec = TABLES[table]
+    return iter_rows(lambda select: (build or (lambda query: query))(supabase.table(table).select(select)),
+                     [(column, False) for column in spec['key']], ','.join(spec['columns']), prefetch=True)
+
+
+def _pages(rows, size):
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _copy_table(conn, supabase, table):
+    """Replace the local copy of a small keyed table with the remote rows"""
+    rows = list(_walk(supabase, table))
+    with conn:
+        conn.execute(f'DELETE FROM "{table}"')
+        _upsert(conn, table, rows)
+    return len(rows)
+
+
+def _sync_serial(conn, supabase, table):
+    """Pull rows past the local id watermark, then reconcile deletes and late inserts.
+
+    Deleted rows and rows whose ids were committed out of order don't move
+    the watermark, so the remote and local row counts are compared and,
+    when they differ, the two id sets are.
+    """
+    serial = TABLES[table]['serial']
+    watermark = conn.execute(f'SELECT max("{serial}") FROM "{table}"').fetchone()[0]
+    rows = _walk(supabase, table, (lambda query: query.gt(serial, watermark)) if watermark is not None else None)
+    for page in _pages(rows, ID_BATCH):
+        with conn:
+            _upsert(conn, table, page)
+
+    remote_count = supabase.table(table).select(serial, count='exact', head=True).execute().count
+    local_count = conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+    if remote_count == local_count:
+        return
+
+    remote_ids = {row[serial] for row in iter_rows(lambda select: supabase.table(table).select(select),
+                                                   [(serial, False)], serial, prefetch=True)}
+    local_ids = {row[0] for row in conn.execute(f'SELECT "{serial}" FROM "{table}"')}
+    gone = sorted(local_ids - remote_ids)
+    missing = sorted(remote_ids - local_ids)
+    with conn:
+        for start in range(0, len(gone), ID_BATCH):
+            batch = gone[start:start + ID_BATCH]
+            conn.execute(f'DELETE FROM "{table}" WHERE "{serial}" IN ({", ".join("?" * len(batch))})', batch)
+    for start in range(0, len(missing), ID_BATCH):
+        batch = missing[start:start + ID_BATCH]
+        rows = supabase.table(table).select(','.join(TABLES[table]['columns'])).in_(serial, batch).execute().data
+        with conn:
+            _upsert(conn, table, rows)
+
+
+def _sync_table(conn, supabase, table):
+    # Taken before pulling: a write that lands mid-sync leaves the table due again
+    version = table_version(table)
+    started = time.time()
+    if 'serial' in TABLES[table]:
+        _sync_serial(conn, supabase, table)
+    else:
+        _copy_table(conn, supabase, table)
+    with conn:
+        # A first sync is a full copy, so it also counts as a verification
+        conn.execute('INSERT INTO replica_state (name, version, synced_at, verified_at) VALUES (?, ?, ?, ?) '
+                     'ON CONFLICT (name) DO UPDATE SET version = excluded.version, synced_at = excluded.synced_at',
+                     (table, version, started, started))
+
+
+def _due(state, table, now):
+    return (state is None or state['version'] != table_version(table)
+            or now - state['synced_at'] >= REPLICA_SYNC_INTERVAL)
+
+
+def sync(supabase, tables=tuple(TABLES), force=False):
+    """Bring the local copy of `tables` up to date: any the app has written since
+    their last sync, any not checked for REPLICA_SYNC_INTERVAL, or all with force.
+    Returns the tables that failed to sync."""
+    failed = []
+    with _sync_lock, closing(connect()) as conn:
+        now = time.time()
+        for table in tables:
+            if not force and not _due(_state(conn, table), table, now):
+                continue
+            try:
+                _sync_table(conn, supabase, table)
+            except Exception:
+                # Reads keep using the older copy until it exceeds REPLICA_MAX_LAG
+                logger.exception(f'Failed to sync replica table {table}')
+                failed.append(table)
+    return failed
+
+
+# Verification: a full comparison that also catches rows edited in place
+# outside the app (the id watermark only sees inserts and deletes)
+
+def verify_table(supabase, table):
+    """Compare every row with Supabase and repair the local copy; returns rows fixed"""
+    with closing(connect()) as conn:
+        if 'serial' not in TABLES[table]:
+            with _sync_lock:
+                before = {tuple(row) for row in conn.execute(f'SELECT * FROM "{table}"')}
+                _copy_table(conn, supabase, table)
+                after = {tuple(row) for row in conn.execute(f'SELECT * FROM "{table}"')}
+            return len(before ^ after)
+
+        spec = TABLES[table]
+        serial = spec['serial']
+        names = list(spec['columns'])
+        fixed, seen, last = 0, set(), None
+        for page in _pages(_walk(supabase, table), ID_BATCH):
+            ids = [row[serial] for row in page]
+            local = {row[serial]: row for row in (
+                _from_row(spec['columns'], names, values) for values in conn.execute(
+                    f'SELECT * FROM "{table}" WHERE "{serial}" IN ({", ".join("?" * len(ids))})', ids))}
+            changed = [row for row in page
+                       if local.get(row[serial]) != {name: row.get(name) for name in names}]
+            if changed:
+                with conn:
+                    _upsert(conn, table, changed)
+            fixed += len(changed)
+            seen.update(ids)
+            last = ids[-1]
+
+        # Only up to the last remote id seen: rows past it arrived after the walk began
+        stale = [row[0] for row in conn.execute(f'SELECT "{serial}" FROM "{table}" WHERE "{serial}" <= ?',
+                                                (last if last is not None else -1,))
+                 if row[0] not in seen]
+        with conn:
+            for start in range(0, len(stale), ID_BATCH):
+                batch = stale[start:start + ID_BATCH]
+                conn.execute(f'DELETE FROM "{table}" WHERE "{serial}" IN ({", ".join("?" * len(batch))})', batch)
+        return fixed + len(stale)
+
+
+def _verify(supabase, tables):
+    for table in tables:
+        try:
+            fixed = verify_table(supabase, table)
+            if fixed:
+                logger.warning(f'Replica verification repaired {fixed} row(s) of {table}')
+        except Exception:
+            logger.exception(f'Failed to verify replica table {table}')
+
+
+def _start_verification(tables):
+    """Verify the tables whose last verification is older than REPLICA_VERIFY_INTERVAL
+    in a background thread. The claim is a row update, so one worker does it.
+
+    This runs on every replica read, so a plain SELECT checks first and the
+    write transaction only happens when a verification is due.
+    """
+    if REPLICA_VERIFY_INTERVAL <= 0:
+        return
+    now = time.time()
+    with closing(connect()) as conn:
+        candidates = [row[0] for row in conn.execute(
+            f'SELECT name FROM replica_state WHERE verified_at <= ? AND name IN ({", ".join("?" * len(tables))})',
+            (now - REPLICA_VERIFY_INTERVAL, *tables))]
+        if not candidates:
+            return
+        with conn:
+            due = [table for table in candidates if conn.execute(
+                'UPDATE replica_state SET verified_at = ? WHERE name = ? AND verified_at <= ?',
+                (now, table, now - REPLICA_VERIFY_INTERVAL)).rowcount]
+    if due:
+        threading.Thread(target=_verify, args=(get_db(), due), name='replica-verify', daemon=True).start()
+
+
+# Lag
+
+def lag(*tables):
+    """Seconds since the stalest of the tables was last synced (None if one never was)"""
+    with closing(connect()) as conn:
+        states = [_state(conn, table) for table in tables or TABLES]
+    if any(state is None for state in states):
+        return None
+    return max(0.0, time.time() - min(state['synced_at'] for state in states))
+
+
+def reader(*tables):
+    """A read client on the replica, synced for `tables`, or None to read Supabase.
+
+    None when the replica is disabled or still more than REPLICA_MAX_LAG
+    behind after trying to sync (e.g. Supabase was unreachable for a while,
+    or the first copy failed).
+    """
+    if not REPLICA_ENABLED:
+        return None
+    try:
+        sync(get_db(), tables)
+        _start_verification(tables)
+        behind = lag(*tables)
+    except Exception:
+        logger.exception('Failed to read replica state')
+        return None
+    if behind is None or behind > REPLICA_MAX_LAG:
+        return None
+    return ReplicaClient()
+
+
+def status():
+    """Per-table row counts, lag and verification age, for /replica_status.
+
+    Tables are synced the first time a page reads them, so one that never
+    was is listed with lag_s None and left out of the overall lag.
+    """
+    if not REPLICA_ENABLED:
+        return {'enabled': False}
+    now = time.time()
+    tables = {}
+    with closing(connect()) as conn:
+        for table in TABLES:
+            state = _state(conn, table)
+            tables[table] = {
+                'rows': conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0],
+                'lag_s': round(now - state['synced_at'], 1) if state else None,
+                'verified_s_ago': round(now - state['verified_at'], 1) if state else None,
+                'pending_writes': state is not None and state['version'] != table_version(table)
+            }
+    lags = [info['lag_s'] for info in tables.values() if info['lag_s'] is not None]
+    overall = max(lags) if lags else None
+    return {
+        'enabled': True,
+        'path': REPLICA_PATH,
+        'lag_s': overall,
+        'max_lag_s': REPLICA_MAX_LAG,
+        'within_limit': overall is None or overall <= REPLICA_MAX_LAG,
+        'tables': tables
+    }
@@ -0,0 +1,189 @@
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from application.cache import VersionedCache
+from application.data_version import bump, get_version
+from application.database import get_db
+from application.fanout import gather
+from application.paging import iter_rows
+from application.projections import columns
+from application.report_engine import ReportData, REPORT_DATA_TTL, UNDATED_MONTH
+from application import reference_data, replica
+
+# Per-month report aggregates behind the date-range reports. A month that is
+# over (closed) never changes through normal use, so its bucket is computed
+# once, written here and shared by every worker; only open months are
+# recomputed, and then only after a sale or payment write.
+REPORT_BUCKET_DIR = os.getenv('REPORT_BUCKET_DIR', os.path.join(tempfile.gettempdir(), 'factory-report-buckets'))
+
+# A month stays open this long after it ends, for sales posted around midnight
+BUCKET_CLOSE_GRACE = timedelta(hours=1)
+
+_open_cache = VersionedCache(('sale', 'payment'), REPORT_DATA_TTL)
+_range_cache = VersionedCache(('sale', 'payment', 'stock'), REPORT_DATA_TTL)
+
+
+def parse_month(text):
+    """'YYYY-MM' from a request arg; ValueError for anything else"""
+    try:
+        return datetime.strptime(text, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise ValueError(f"Invalid month '{text}': expected YYYY-MM.")
+
+
+def _next_month(month):
+    year, number = map(int, month.split('-'))
+    return f'{year + number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def month_range(start, end):
+    """Every month from start to end inclusive"""
+    months = [start]
+    while months[-1] < end:
+        months.append(_next_month(months[-1]))
+    return months
+
+
+def _client():
+    return replica.reader('sale', 'payment') or get_db()
+
+
+def first_month():
+    """Earliest month with a sale or payment (the undated month if there are undated sales)"""
+    def load():
+        supabase = _client()
+        sale, payment, undated = gather(
+            lambda: supabase.table('sale').select('date').order('date').limit(1).execute().data,
+            lambda: supabase.table('payment').select('date').order('date').limit(1).execute().data,
+            lambda: supabase.table('sale').select('sale_id').is_('date', 'null').limit(1).execute().data
+        )
+        months = [rows[0]['date'][:7] for rows in (sale, payment) if rows and rows[0]['date']]
+        if undated:
+            months.append(UNDATED_MONTH)
+        return min(months) if months else datetime.now().strftime('%Y-%m')
+    return _open_cache.get('first_month', load)
+
+
+def period(args):
+    """(start, end) months from the start/end request args, or (None, None) for all of history.
+
+    A missing end means the current month and a missing start the first
+    month with data.
+    """
+    start = args.get('start', '').strip()
+    end = args.get('end', '').strip()
+    if not start and not end:
+        return None, None
+    end = parse_month(end) if end else datetime.now().strftime('%Y-%m')
+    start = parse_month(start) if start else min(first_month(), end)
+    if start > end:
+        raise ValueError('The start month is after the end month.')
+    return start, end
+
+
+def _is_closed(month):
+    return month < (datetime.now() - BUCKET_CLOSE_GRACE).strftime('%Y-%m')
+
+
+def _load_month(supabase, month):
+    """ReportData of one month's sales and payments, streamed from the table.
+
+    Undated rows count towards UNDATED_MONTH, as in the all-history report.
+    """
+    lower, upper = f'{month}-01', f'{_next_month(month)}-01'
+    data = ReportData()
+
+    def rows(table, key):
+        def dated(select):
+            return supabase.table(table).select(select).gte('date', lower).lt('date', upper)
+
+        def undated(select):
+            return supabase.table(table).select(select).is_('date', 'null')
+
+        for build in (dated, undated) if month == UNDATED_MONTH else (dated,):
+            yield from iter_rows(build, [(key, False)], columns(table, 'report'), prefetch=True)
+
+    def add_sales():
+        for sale in rows('sale', 'sale_id'):
+            data.add_sale(sale)
+
+    def add_payments():
+        for payment in rows('payment', 'payment_id'):
+            data.add_payment(payment)
+
+    gather(add_sales, add_payments)
+    return data
+
+
+def _bucket_path(month):
+    return os.path.join(REPORT_BUCKET_DIR, f'{month}.json')
+
+
+def month_data(month):
+    """ReportData for one month: from disk once the month is closed, else recomputed per data version"""
+    if not _is_closed(month):
+        return _open_cache.get(('month', month), lambda: _load_month(_client(), month))
+
+    try:
+        with open(_bucket_path(month)) as f:
+            return ReportData.from_dict(json.load(f))
+    except (FileNotFoundError, ValueError):
+        pass
+
+    version = get_version('sale', 'payment')
+    data = _load_month(_client(), month)
+    os.makedirs(REPORT_BUCKET_DIR, exist_ok=True)
+    tmp_path = f'{_bucket_path(month)}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data.to_dict(), f)
+    os.replace(tmp_path, _bucket_path(month))
+    # A delete that landed during the load may have run forget() before this
+    # write; its version bump shows here, and the bucket is dropped again
+    if get_version('sale', 'payment') != version:
+        _remove(month)
+    return data
+
+
+def get_range_data(start, end):
+    """ReportData for the months start..end: the stored months plus the open ones, merged in order"""
+    def build():
+        months = month_range(start, end)
+        data = ReportData()
+        for bucket in gather(*(lambda month=month: month_data(month) for month in months)):
+            data.merge(bucket)
+        data.set_stock({'size': item['size'], 'color': item['color']} for item in reference_data.stock_items())
+        return data
+    return _range_cache.get((start, end), build)
+
+
+def _remove(month):
+    try:
+        os.remove(_bucket_path(month))
+    except FileNotFoundError:
+        pass
+
+
+def forget(table, date):
+    """Drop the stored bucket of the month a sale or payment deleted from `table` was dated in.
+
+    The table's version is bumped first, so a month_data() load already in
+    flight sees the change and doesn't keep a bucket that still has the row.
+    Writes made outside the app aren't seen; `flask reports forget-buckets`
+    drops every stored month after such edits.
+    """
+    bump(table)
+    _remove(date[:7] if date else UNDATED_MONTH)
+
+
+def forget_all():
+    try:
+        names = os.listdir(REPORT_BUCKET_DIR)
+    except FileNotFoundError:
+        return 0
+    months = [name[:-len('.json')] for name in names if name.endswith('.json')]
+    for month in months:
+        _remove(month)
+    return len(months)
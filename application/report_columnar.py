@@ -0,0 +1,211 @@
+from itertools import islice
+
+import numpy as np
+
+from application.fanout import gather
+from application.paging import PAGING_PAGE_SIZE
+from application.report_engine import ReportData, STOCK_ORDER, UNDATED_MONTH, _walk
+
+# Columnar version of ReportData.add_sale/add_payment for large tables.
+# Rows are turned into typed arrays a page at a time (categorical codes for
+# item, customer and month, numeric amounts, a +1/-1 refund sign) and every
+# rollup is a np.bincount over the codes. bincount adds each group's weights
+# in row order, exactly as the row loop does, so the sums match it to the bit.
+# PostgREST sends whole numerics as JSON ints, so a column can mix ints and
+# floats; each amount column keeps a mask of its float rows, and a group's
+# sum is an int, as the row loop's would be, when none of its rows was a float.
+
+
+class Categories(dict):
+    """value -> code, codes handed out in first-seen order (so iterating gives the values in code order)"""
+
+    def __missing__(self, value):
+        code = self[value] = len(self)
+        return code
+
+
+def _codes(values, categories):
+    return np.array([categories[value] for value in values], dtype=np.int64)
+
+
+def _column(values):
+    """(values, float_rows) for one amount column of a page"""
+    array = np.array(values)
+    if array.dtype.kind in 'iub':
+        return array, np.zeros(len(array), dtype=bool)
+    return array, np.array([isinstance(value, float) for value in values], dtype=bool)
+
+
+def _concatenate(columns):
+    values, float_rows = zip(*columns)
+    return np.concatenate(values), np.concatenate(float_rows)
+
+
+def _sums(codes, column, count):
+    """Per-code sums of an amount column in row order: ints for groups with no float rows, like `+=` gives"""
+    values, float_rows = column
+    if len(codes) == 0:
+        return [0] * count
+    # bincount adds in float64; integer amounts are exact below 2**53
+    sums = np.bincount(codes, weights=values, minlength=count).tolist()
+    if not float_rows.any():
+        return [int(value) for value in sums]
+    floats = np.bincount(codes, weights=float_rows, minlength=count).tolist()
+    return [value if has_float else int(value) for value, has_float in zip(sums, floats)]
+
+
+def _zero_unless(sums, counts):
+    # A rollup field nothing was added to is still the int 0 of _new_rollup
+    return [value if count else 0 for value, count in zip(sums, counts)]
+
+
+def _rollups(codes, count, sign, quantity, total, cost, profit):
+    """The _new_rollup fields of every group at once"""
+    sale, refund = sign > 0, sign < 0
+    sales_count = np.bincount(codes[sale], minlength=count).tolist()
+    refund_count = np.bincount(codes[refund], minlength=count).tolist()
+    row_count = [a + b for a, b in zip(sales_count, refund_count)]
+
+    def signed(column):
+        # x * -1 is an exact negation, so this adds what `-=` would subtract
+        values, float_rows = column
+        return _zero_unless(_sums(codes, (values * sign, float_rows), count), row_count)
+
+    def rows(column, mask):
+        return column[0][mask], column[1][mask]
+
+    fields = {
+        'quantity_sold': _zero_unless(_sums(codes[sale], rows(quantity, sale), count), sales_count),
+        'quantity_refunded': _zero_unless(_sums(codes[refund], rows(quantity, refund), count), refund_count),
+        'sales_amount': _zero_unless(_sums(codes[sale], rows(total, sale), count), sales_count),
+        'refund_amount': _zero_unless(_sums(codes[refund], rows(total, refund), count), refund_count),
+        'sales_count': sales_count,
+        'refund_count': refund_count,
+        'revenue': signed(total),
+        'cost': signed(cost),
+        'profit': signed(profit)
+    }
+    return [{field: values[i] for field, values in fields.items()} for i in range(count)]
+
+
+class SaleColumns:
+    """Sales as typed arrays, filled page by page"""
+
+    def __init__(self):
+        self.items = Categories()
+        self.customers = Categories()
+        self.months = Categories()
+        self._pages = []
+
+    def add_page(self, sales):
+        self._pages.append((
+            _codes(((sale['stock_size'], sale['stock_color']) for sale in sales), self.items),
+            _codes(((sale['customer_name'], sale['customer_phone']) for sale in sales), self.customers),
+            _codes((sale['date'][:7] if sale['date'] else UNDATED_MONTH for sale in sales), self.months),
+            np.array([-1 if sale['is_refund'] else 1 for sale in sales], dtype=np.int8),
+            _column([sale['quantity'] for sale in sales]),
+            _column([sale['total'] for sale in sales]),
+            _column([sale.get('total_cost', 0) for sale in sales]),
+            _column([sale.get('profit', 0) for sale in sales])
+        ))
+
+    def arrays(self):
+        """item, customer and month codes, sign, then (values, float_rows) for quantity, total, cost, profit"""
+        if not self._pages:
+            empty = (np.array([]), np.array([], dtype=bool))
+            return [np.array([], dtype=np.int64)] * 3 + [np.array([], dtype=np.int8)] + [empty] * 4
+        columns = list(zip(*self._pages))
+        return [np.concatenate(column) for column in columns[:4]] + [_concatenate(column) for column in columns[4:]]
+
+
+class PaymentColumns:
+    def __init__(self):
+        self.customers = Categories()
+        self._codes = []
+        self._amounts = []
+
+    def add_page(self, payments):
+        self._codes.append(_codes(((payment['customer_name'], payment['customer_phone']) for payment in payments),
+                                  self.customers))
+        self._amounts.append(_column([payment['amount'] for payment in payments]))
+
+    def arrays(self):
+        if not self._codes:
+            return np.array([], dtype=np.int64), (np.array([]), np.array([], dtype=bool))
+        return np.concatenate(self._codes), _concatenate(self._amounts)
+
+
+def _add_part_groups(groups, items, part, item_codes, amounts):
+    """by_size (part 0) or by_color (part 1) from the item codes.
+
+    Walking the items in code order meets each size/color with its first
+    item, so these groups come out in first-seen order as well.
+    """
+    parts = Categories()
+    first_items = []
+    item_parts = _codes((key[part] for key in items), parts)
+    for key, code in zip(items, item_parts.tolist()):
+        if code == len(first_items):
+            first_items.append(key)
+    codes = item_parts[item_codes]
+    for value, rollup, first_item in zip(parts, _rollups(codes, len(parts), *amounts), first_items):
+        rollup['first_item'] = first_item
+        groups[value] = rollup
+
+
+def to_report_data(sales, payments, stock_items=()):
+    """ReportData from filled SaleColumns and PaymentColumns, equal to the row-by-row build"""
+    data = ReportData()
+    item_codes, customer_codes, month_codes, *amounts = sales.arrays()
+
+    for key, rollup in zip(sales.items, _rollups(item_codes, len(sales.items), *amounts)):
+        rollup['first_item'] = key
+        data.by_item[key] = rollup
+    _add_part_groups(data.by_size, sales.items, 0, item_codes, amounts)
+    _add_part_groups(data.by_color, sales.items, 1, item_codes, amounts)
+    data.by_customer.update(zip(sales.customers, _rollups(customer_codes, len(sales.customers), *amounts)))
+    data.by_month.update(zip(sales.months, _rollups(month_codes, len(sales.months), *amounts)))
+    data.totals = _rollups(np.zeros(len(item_codes), dtype=np.int64), 1, *amounts)[0]
+
+    payment_codes, payment_amounts = payments.arrays()
+    data.payments_by_customer.update(zip(payments.customers,
+                                         _sums(payment_codes, payment_amounts, len(payments.customers))))
+    data.total_payments = _sums(np.zeros(len(payment_codes), dtype=np.int64), payment_amounts, 1)[0]
+
+    data.set_stock(stock_items)
+    return data
+
+
+def _pages(rows, size):
+    rows = iter(rows)
+    while True:
+        page = list(islice(rows, size))
+        if not page:
+            return
+        yield page
+
+
+def build_report_data(sales, payments, stock_items=(), page_size=None):
+    """Columnar equivalent of report_engine.build_report_data for rows already in hand"""
+    sale_columns, payment_columns = SaleColumns(), PaymentColumns()
+    for page in _pages(sales, page_size or PAGING_PAGE_SIZE):
+        sale_columns.add_page(page)
+    for page in _pages(payments, page_size or PAGING_PAGE_SIZE):
+        payment_columns.add_page(page)
+    return to_report_data(sale_columns, payment_columns, stock_items)
+
+
+def load_report_data(supabase):
+    """Stream the raw rows like report_engine.load_report_data, keeping them as arrays rather than dicts"""
+    sale_columns, payment_columns = SaleColumns(), PaymentColumns()
+
+    def add_sales():
+        for page in _pages(_walk(supabase, 'sale', [('sale_id', False)]), PAGING_PAGE_SIZE):
+            sale_columns.add_page(page)
+
+    def add_payments():
+        for page in _pages(_walk(supabase, 'payment', [('payment_id', False)]), PAGING_PAGE_SIZE):
+            payment_columns.add_page(page)
+
+    _, _, stock_items = gather(add_sales, add_payments, lambda: list(_walk(supabase, 'stock', STOCK_ORDER)))
+    return to_report_data(sale_columns, payment_columns, stock_items)
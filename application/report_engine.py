@@ -0,0 +1,452 @@
+import os
+import threading
+import time
+
+from application.database import get_db
+from application.data_version import get_version
+from application.projections import columns
+from application.fanout import gather
+from application.paging import iter_rows, iter_range
+from application import replica, rollups
+
+# Rebuild the cached dataset at least this often, to pick up writes made
+# outside the app (e.g. from the Supabase dashboard)
+REPORT_DATA_TTL = int(os.getenv('REPORT_DATA_TTL', 60))
+
+# 'python' sums raw sale rows here; 'columnar' sums the same rows as NumPy
+# arrays (faster on large tables); 'database' reads the rollup views;
+# 'rollups' reads the incrementally maintained rollup tables
+REPORT_AGGREGATION = os.getenv('REPORT_AGGREGATION', 'python')
+
+# Month used for sales that have no date, as in the original profit report
+UNDATED_MONTH = '2024-12'
+
+
+def _new_rollup():
+    return {
+        'quantity_sold': 0,
+        'quantity_refunded': 0,
+        'sales_amount': 0,
+        'refund_amount': 0,
+        'sales_count': 0,
+        'refund_count': 0,
+        # Signed sums (refunds subtracted), as used by the profit report
+        'revenue': 0,
+        'cost': 0,
+        'profit': 0
+    }
+
+
+def _accumulate(rollup, is_refund, count, quantity, total, cost, profit):
+    if is_refund:
+        rollup['quantity_refunded'] += quantity
+        rollup['refund_amount'] += total
+        rollup['refund_count'] += count
+        rollup['revenue'] -= total
+        rollup['cost'] -= cost
+        rollup['profit'] -= profit
+    else:
+        rollup['quantity_sold'] += quantity
+        rollup['sales_amount'] += total
+        rollup['sales_count'] += count
+        rollup['revenue'] += total
+        rollup['cost'] += cost
+        rollup['profit'] += profit
+
+
+def _merge_rollup(rollup, other):
+    for field, value in other.items():
+        if field != 'first_item':
+            rollup[field] += value
+
+
+class ReportData:
+    """Every rollup the reports need, built in a single pass over sales and payments.
+
+    Groups keep the order in which they were first seen, exactly like the
+    per-report loops this replaces, so sorted output ties break the same way.
+    """
+
+    def __init__(self):
+        self.by_item = {}
+        self.by_size = {}
+        self.by_color = {}
+        self.by_customer = {}
+        self.by_month = {}
+        self.totals = _new_rollup()
+        self.payments_by_customer = {}
+        self.total_payments = 0
+        self.stock_lookup = {}
+
+    def add_sale(self, sale):
+        amounts = (sale['is_refund'], 1, sale['quantity'], sale['total'],
+                   sale.get('total_cost', 0), sale.get('profit', 0))
+        self.add_item_group(sale['stock_size'], sale['stock_color'], *amounts)
+        self.add_customer_group(sale['customer_name'], sale['customer_phone'], *amounts)
+        self.add_month_group(sale['date'][:7] if sale['date'] else UNDATED_MONTH, *amounts)
+
+    # The add_*_group methods fold `count` sales that share a key at once, so
+    # the same ReportData can be built from raw rows or from database rollups.
+
+    def add_item_group(self, size, color, is_refund, count, quantity, total, cost, profit):
+        item_key = (size, color)
+        for rollups, key in ((self.by_item, item_key), (self.by_size, size), (self.by_color, color)):
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = _new_rollup()
+                # Remember the first item seen in each group for its stock_item
+                rollup['first_item'] = item_key
+            _accumulate(rollup, is_refund, count, quantity, total, cost, profit)
+
+    def add_customer_group(self, customer_name, customer_phone, is_refund, count, quantity, total, cost, profit):
+        key = (customer_name, customer_phone)
+        rollup = self.by_customer.get(key)
+        if rollup is None:
+            rollup = self.by_customer[key] = _new_rollup()
+        _accumulate(rollup, is_refund, count, quantity, total, cost, profit)
+
+    def add_month_group(self, month, is_refund, count, quantity, total, cost, profit):
+        # Every sale falls in exactly one month, so the totals are kept here
+        rollup = self.by_month.get(month)
+        if rollup is None:
+            rollup = self.by_month[month] = _new_rollup()
+        _accumulate(rollup, is_refund, count, quantity, total, cost, profit)
+        _accumulate(self.totals, is_refund, count, quantity, total, cost, profit)
+
+    def add_payment(self, payment):
+        self.add_payment_group(payment['customer_name'], payment['customer_phone'], payment['amount'])
+
+    def add_payment_group(self, customer_name, customer_phone, amount):
+        key = (customer_name, customer_phone)
+        self.payments_by_customer[key] = self.payments_by_customer.get(key, 0) + amount
+        self.total_payments += amount
+
+    def set_stock(self, stock_items):
+        self.stock_lookup = {(item['size'], item['color']): item for item in stock_items}
+
+    def merge(self, other):
+        """Fold another ReportData into this one, e.g. the months of a date range in order.
+
+        Groups new to this one are appended, so merging in chronological order
+        keeps first-seen order. The stock lookup is left alone.
+        """
+        for mine, theirs in ((self.by_item, other.by_item), (self.by_size, other.by_size),
+                             (self.by_color, other.by_color), (self.by_customer, other.by_customer),
+                             (self.by_month, other.by_month)):
+            for key, rollup in theirs.items():
+                if key in mine:
+                    _merge_rollup(mine[key], rollup)
+                else:
+                    mine[key] = dict(rollup)
+        _merge_rollup(self.totals, other.totals)
+        for key, amount in other.payments_by_customer.items():
+            self.payments_by_customer[key] = self.payments_by_customer.get(key, 0) + amount
+        self.total_payments += other.total_payments
+
+    # Plain JSON form (tuple keys as lists, group order kept) for storing
+    # aggregates on disk; the stock lookup isn't included.
+
+    def to_dict(self):
+        return {
+            'by_item': [[*key, rollup] for key, rollup in self.by_item.items()],
+            'by_size': [[key, rollup] for key, rollup in self.by_size.items()],
+            'by_color': [[key, rollup] for key, rollup in self.by_color.items()],
+            'by_customer': [[*key, rollup] for key, rollup in self.by_customer.items()],
+            'by_month': [[key, rollup] for key, rollup in self.by_month.items()],
+            'totals': self.totals,
+            'payments_by_customer': [[*key, amount] for key, amount in self.payments_by_customer.items()],
+            'total_payments': self.total_payments
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        data = cls()
+        for attr, width in (('by_item', 2), ('by_size', 1), ('by_color', 1), ('by_customer', 2), ('by_month', 1)):
+            groups = getattr(data, attr)
+            for entry in values[attr]:
+                key, rollup = (tuple(entry[:width]) if width > 1 else entry[0]), entry[width]
+                if 'first_item' in rollup:
+                    rollup['first_item'] = tuple(rollup['first_item'])
+                groups[key] = rollup
+        data.totals = values['totals']
+        data.payments_by_customer = {(name, phone): amount for name, phone, amount in values['payments_by_customer']}
+        data.total_payments = values['total_payments']
+        return data
+
+
+def build_report_data(sales, payments, stock_items=()):
+    data = ReportData()
+    for sale in sales:
+        data.add_sale(sale)
+    for payment in payments:
+        data.add_payment(payment)
+    data.set_stock(stock_items)
+    return data
+
+
+def _walk(supabase, table, order, use=None, paged=iter_rows):
+    """Every row of a table or view, fetched page by page (see application.paging)"""
+    return paged(lambda select: supabase.table(table).select(select), order,
+                 columns(*(use or (table, 'report'))), prefetch=True)
+
+
+STOCK_ORDER = [('size', False), ('color', False)]
+
+
+def load_report_data(supabase):
+    """Stream the raw rows (the three tables concurrently) into one ReportData.
+
+    Each table is walked in keyset pages, so the totals cover every row
+    whatever the server's max-rows cap, and only a page or two per table
+    is in memory besides the aggregates.
+    """
+    data = ReportData()
+
+    def add_sales():
+        for sale in _walk(supabase, 'sale', [('sale_id', False)]):
+            data.add_sale(sale)
+
+    def add_payments():
+        for payment in _walk(supabase, 'payment', [('payment_id', False)]):
+            data.add_payment(payment)
+
+    # Sales and payments each have their own aggregates, so the two loops
+    # never touch the same dict
+    _, _, stock_items = gather(add_sales, add_payments,
+                               lambda: list(_walk(supabase, 'stock', STOCK_ORDER)))
+    data.set_stock(stock_items)
+    return data
+
+
+def _group_amounts(row):
+    return (row['is_refund'], row['sale_count'], row['quantity'], row['total'],
+            row['total_cost'], row['profit'])
+
+
+# Key of each grouped relation: the rollup tables' primary keys, and a
+# stable page order for the views
+GROUP_ORDERS = {
+    'item': [('stock_size', False), ('stock_color', False), ('is_refund', False)],
+    'customer': [('customer_name', False), ('customer_phone', False), ('is_refund', False)],
+    'month': [('month', False), ('is_refund', False)],
+    'payment': [('customer_name', False), ('customer_phone', False)]
+}
+
+
+def _load_grouped(supabase, item_relation, customer_relation, month_relation, payment_relation, paged):
+    def fetch(relation, group):
+        return lambda: list(_walk(supabase, relation, GROUP_ORDERS[group], ('rollup', group), paged))
+
+    item_rows, customer_rows, month_rows, payment_rows, stock_items = gather(
+        fetch(item_relation, 'item'),
+        fetch(customer_relation, 'customer'),
+        fetch(month_relation, 'month'),
+        fetch(payment_relation, 'payment'),
+        lambda: list(_walk(supabase, 'stock', STOCK_ORDER))
+    )
+
+    data = ReportData()
+    for row in item_rows:
+        data.add_item_group(row['stock_size'], row['stock_color'], *_group_amounts(row))
+    for row in customer_rows:
+        data.add_customer_group(row['customer_name'], row['customer_phone'], *_group_amounts(row))
+    for row in month_rows:
+        data.add_month_group(row['month'], *_group_amounts(row))
+    for row in payment_rows:
+        data.add_payment_group(row['customer_name'], row['customer_phone'], row['amount'])
+    data.set_stock(stock_items)
+    return data
+
+
+def load_report_data_from_views(supabase):
+    """Build the same ReportData from the rollup views in migrations/001_report_rollup_views.sql.
+
+    The views aggregate on every request, so a keyset filter would not
+    save them any work; they are paged by offset instead.
+    """
+    return _load_grouped(supabase, 'report_sales_by_item', 'report_sales_by_customer',
+                         'report_sales_by_month', 'report_payments_by_customer', iter_range)
+
+
+def load_report_data_from_rollups(supabase):
+    """Build ReportData from the maintained tables in migrations/002_rollup_tables.sql"""
+    return _load_grouped(supabase, 'rollup_sku', 'rollup_customer',
+                         'rollup_month', 'rollup_payment_customer', iter_rows)
+
+
+def load_report_data_from_replica(client):
+    """Build ReportData with GROUP BY queries on the local replica (application/replica.py).
+
+    Groups come out in the order of their first sale or payment, which is
+    the order load_report_data meets them in, so ties sort the same way.
+    """
+    amounts = 'count(*) AS sale_count, sum(quantity) AS quantity, sum(total) AS total, ' \
+              'sum(total_cost) AS total_cost, sum(profit) AS profit'
+    data = ReportData()
+    for row in client.query(f'SELECT stock_size, stock_color, is_refund, {amounts} FROM sale '
+                            'GROUP BY stock_size, stock_color, is_refund ORDER BY min(sale_id)'):
+        data.add_item_group(row['stock_size'], row['stock_color'], *_group_amounts(row))
+    for row in client.query(f'SELECT customer_name, customer_phone, is_refund, {amounts} FROM sale '
+                            'GROUP BY customer_name, customer_phone, is_refund ORDER BY min(sale_id)'):
+        data.add_customer_group(row['customer_name'], row['customer_phone'], *_group_amounts(row))
+    for row in client.query(f"SELECT CASE WHEN coalesce(date, '') = '' THEN ? ELSE substr(date, 1, 7) END AS month, "
+                            f'is_refund, {amounts} FROM sale GROUP BY 1, is_refund ORDER BY min(sale_id)',
+                            (UNDATED_MONTH,)):
+        data.add_month_group(row['month'], *_group_amounts(row))
+    for row in client.query('SELECT customer_name, customer_phone, sum(amount) AS amount FROM payment '
+                            'GROUP BY customer_name, customer_phone ORDER BY min(payment_id)'):
+        data.add_payment_group(row['customer_name'], row['customer_phone'], row['amount'])
+    data.set_stock(client.query('SELECT size, color FROM stock ORDER BY size, color'))
+    return data
+
+
+def load_report_data_columnar(supabase):
+    """load_report_data with vectorized sums (application/report_columnar.py)"""
+    # Imported here so NumPy is only loaded by deployments that use it
+    from application import report_columnar
+    return report_columnar.load_report_data(supabase)
+
+
+LOADERS = {
+    'python': load_report_data,
+    'columnar': load_report_data_columnar,
+    'database': load_report_data_from_views,
+    'rollups': load_report_data_from_rollups
+}
+
+
+_cached = None
+_cached_version = None
+_cached_at = 0
+_cache_lock = threading.Lock()
+
+
+def get_report_data():
+    """Shared ReportData for this worker, rebuilt when sale/payment/stock change"""
+    global _cached, _cached_version, _cached_at
+    version = get_version('sale', 'payment', 'stock')
+    with _cache_lock:
+        if _cached is not None and _cached_version == version and time.time() - _cached_at < REPORT_DATA_TTL:
+            return _cached
+
+        # The local replica when it is enabled and current enough, else Supabase
+        client = replica.reader('sale', 'payment', 'stock')
+        if client:
+            _cached = load_report_data_from_replica(client)
+        elif REPORT_AGGREGATION == 'rollups' and not rollups.is_current():
+            # A rollup update failed: sum the raw rows until the tables are rebuilt
+            _cached = load_report_data(get_db())
+        else:
+            _cached = LOADERS[REPORT_AGGREGATION](get_db())
+        _cached_version = version
+        _cached_at = time.time()
+        return _cached
+
+
+def sales_by_stock(data, group_by='item'):
+    """Rows for the sales-by-stock report, keyed and sorted like the original view"""
+    if group_by == 'size':
+        groups = ((size, size, rollup) for size, rollup in data.by_size.items())
+    elif group_by == 'color':
+        groups = ((color, color, rollup) for color, rollup in data.by_color.items())
+    else:  # group by item (size + color)
+        groups = ((f"{size}_{color}", f"{size} - {color}", rollup)
+                  for (size, color), rollup in data.by_item.items())
+
+    stock_sales = {}
+    for group_key, group_name, rollup in groups:
+        size, color = rollup['first_item']
+        stock_sales[group_key] = {
+            'group_name': group_name,
+            'stock_item': data.stock_lookup.get((size, color), {'size': size, 'color': color}),
+            'total_quantity_sold': rollup['quantity_sold'],
+            'total_quantity_refunded': rollup['quantity_refunded'],
+            'total_sales_amount': rollup['sales_amount'],
+            'total_refund_amount': rollup['refund_amount'],
+            'sales_count': rollup['sales_count'],
+            'refund_count': rollup['refund_count']
+        }
+
+    # Sort by net revenue (descending)
+    return dict(sorted(stock_sales.items(),
+                       key=lambda x: x[1]['total_sales_amount'] - x[1]['total_refund_amount'],
+                       reverse=True))
+
+
+def sales_by_customer(data, sort_by='revenue'):
+    """Rows for the sales-by-customer report, sorted by revenue, quantity or transactions"""
+    customer_sales = {}
+    for (name, phone), rollup in data.by_customer.items():
+        net_revenue = rollup['sales_amount'] - rollup['refund_amount']
+        total_payments = data.payments_by_customer.get((name, phone), 0)
+        customer_sales[f"{name}|{phone}"] = {
+            'customer_name': name,
+            'customer_phone': phone,
+            'total_quantity_sold': rollup['quantity_sold'],
+            'total_quantity_refunded': rollup['quantity_refunded'],
+            'total_sales_amount': rollup['sales_amount'],
+            'total_refund_amount': rollup['refund_amount'],
+            'total_payments': total_payments,
+            'sales_count': rollup['sales_count'],
+            'refund_count': rollup['refund_count'],
+            'net_revenue': net_revenue,
+            'net_quantity': rollup['quantity_sold'] - rollup['quantity_refunded'],
+            'outstanding_balance': net_revenue - total_payments,
+            'total_transactions': rollup['sales_count'] + rollup['refund_count']
+        }
+
+    if sort_by == 'quantity':
+        sort_key = 'net_quantity'
+    elif sort_by == 'transactions':
+        sort_key = 'total_transactions'
+    else:  # revenue
+        sort_key = 'net_revenue'
+    return dict(sorted(customer_sales.items(), key=lambda x: x[1][sort_key], reverse=True))
+
+
+def profit_report(data):
+    """profit_by_stock, monthly trend and summary stats for the profit report"""
+    profit_by_stock = {}
+    for (size, color), rollup in data.by_item.items():
+        total_revenue = rollup['revenue']
+        profit_by_stock[f"{size}_{color}"] = {
+            'stock_item': {'size': size, 'color': color},
+            'total_profit': rollup['profit'],
+            'total_revenue': total_revenue,
+            'total_cost': rollup['cost'],
+            'sales_count': rollup['sales_count'] + rollup['refund_count'],
+            'profit_margin': (rollup['profit'] / total_revenue) * 100 if total_revenue > 0 else 0
+        }
+
+    # Sort by profit (descending)
+    profit_by_stock = dict(sorted(profit_by_stock.items(),
+                                  key=lambda x: x[1]['total_profit'], reverse=True))
+
+    monthly_profit = {
+        month: {'profit': rollup['profit'], 'revenue': rollup['revenue'], 'cost': rollup['cost']}
+        for month, rollup in data.by_month.items()
+    }
+
+    total_profit = data.totals['profit']
+    total_revenue = data.totals['revenue']
+    total_cost = data.totals['cost']
+
+    profitable_items = [item for item in profit_by_stock.values() if item['total_profit'] > 0]
+    loss_making_items = [item for item in profit_by_stock.values() if item['total_profit'] < 0]
+    break_even_items = [item for item in profit_by_stock.values() if item['total_profit'] == 0]
+
+    summary_stats = {
+        'total_profit': total_profit,
+        'total_revenue': total_revenue,
+        'total_cost': total_cost,
+        'total_payments_received': data.total_payments,
+        'overall_profit_margin': (total_profit / total_revenue * 100) if total_revenue > 0 else 0,
+        'cash_flow': data.total_payments - total_cost,
+        'profitable_items': len(profitable_items),
+        'loss_making_items': len(loss_making_items),
+        'break_even_items': len(break_even_items),
+        'top_3_profitable': sorted(profitable_items, key=lambda x: x['total_profit'], reverse=True)[:3],
+        'worst_3_loss': sorted(loss_making_items, key=lambda x: x['total_profit'])[:3]
+    }
+
+    return profit_by_stock, monthly_profit, summary_stats
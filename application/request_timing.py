@@ -0,0 +1,166 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request, before_render_template, template_rendered
+
+# Per-request Server-Timing header and one JSON log line per request with
+# database calls, template rendering and PDF time
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'true').lower() == 'true'
+
+logger = logging.getLogger('factory.request_timing')
+
+# Timings of the request being handled. A ContextVar (not flask.g) so pool
+# threads started by fanout.gather, which copy the context, add to the same
+# object, and so the database hook needs no app context.
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Counters for one request; safe to update from several threads"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_calls = 0
+        self.db_ms = 0.0
+        self.db_bytes = 0
+        self.phases = {}  # phase name -> ms (render, pdf)
+        self._lock = threading.Lock()
+
+    def add_db_call(self, ms, size):
+        with self._lock:
+            self.db_calls += 1
+            self.db_ms += ms
+            self.db_bytes += size
+
+    def add_phase(self, name, ms):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Server-Timing header value. Queries of one page can run concurrently,
+        so the phases needn't add up to app."""
+        with self._lock:
+            entries = [f'db;dur={self.db_ms:.1f};desc="{self.db_calls} calls, {self.db_bytes} bytes"']
+            entries += [f'{name};dur={ms:.1f}' for name, ms in self.phases.items()]
+        entries.append(f'app;dur={self.elapsed_ms():.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        with self._lock:
+            data = {
+                'db_calls': self.db_calls,
+                'db_ms': round(self.db_ms, 1),
+                'db_bytes': self.db_bytes
+            }
+            data.update({f'{name}_ms': round(ms, 1) for name, ms in self.phases.items()})
+        data['total_ms'] = round(self.elapsed_ms(), 1)
+        return data
+
+
+@contextmanager
+def phase(name):
+    """Time a block of the current request under `name` (no-op outside a request)"""
+    timings = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add_phase(name, (time.perf_counter() - started) * 1000)
+
+
+# Database calls: httpx event hooks on the PostgREST session
+
+def _on_db_request(http_request):
+    http_request.extensions['timing_started'] = time.perf_counter()
+
+
+def _on_db_response(response):
+    timings = _current.get()
+    if timings is None:
+        return
+    # Hooks run before the body is read; read it here so its transfer is counted
+    response.read()
+    started = response.request.extensions.get('timing_started', time.perf_counter())
+    timings.add_db_call((time.perf_counter() - started) * 1000, len(response.content))
+
+
+def instrument_client(client):
+    """Count and time every PostgREST call (table queries and RPCs) made through a Supabase client"""
+    hooks = client.postgrest.session.event_hooks
+    if _on_db_response not in hooks['response']:
+        hooks['request'].append(_on_db_request)
+        hooks['response'].append(_on_db_response)
+    return client
+
+
+# Template rendering: Flask's render signals
+
+_render_started = threading.local()
+
+
+def _on_before_render(sender, template, context, **extra):
+    stack = getattr(_render_started, 'stack', None)
+    if stack is None:
+        stack = _render_started.stack = []
+    stack.append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    timings = _current.get()
+    stack = getattr(_render_started, 'stack', None)
+    if not stack:
+        return
+    started = stack.pop()
+    if timings is not None:
+        timings.add_phase('render', (time.perf_counter() - started) * 1000)
+
+
+def _configure_logger():
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def init_app(app):
+    """Time every request of every blueprint registered on app"""
+    if not REQUEST_TIMING_ENABLED:
+        return
+    _configure_logger()
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
+
+    @app.before_request
+    def start_timing():
+        _current.set(RequestTimings())
+
+    @app.after_request
+    def add_timing(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        response.headers['Server-Timing'] = timings.server_timing()
+
+        method, path, endpoint = request.method, request.path, request.endpoint
+
+        # Streamed responses (CSV exports) still query while the body is sent,
+        # so the log line is written once the response is closed
+        def log_line():
+            _current.set(None)
+            logger.info(json.dumps(dict(timings.as_dict(), method=method, path=path, endpoint=endpoint,
+                                        status=response.status_code)))
+
+        response.call_on_close(log_line)
+        return response
@@ -0,0 +1,107 @@
+import logging
+import os
+
+from application.data_version import clear_stale, mark_stale, stale_token
+
+# Keep the rollup tables from migrations/002_rollup_tables.sql up to date
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'false').lower() == 'true'
+
+logger = logging.getLogger('factory.rollups')
+
+
+def _failed(message):
+    # The write itself is already saved; reports read raw rows until `flask rollups rebuild` repairs the drift
+    logger.exception(message)
+    mark_stale('rollups')
+
+
+def generation(supabase):
+    """The rollup generation, read before a write that record_* will apply afterwards.
+
+    Passed back to record_*, it makes the apply fail (and the rollups go
+    stale) if a rebuild ran in between and may already have counted the
+    write. None when the rollups are off or the generation can't be read.
+    """
+    if not ROLLUPS_ENABLED:
+        return None
+    try:
+        return supabase.rpc('rollup_generation', {}).execute().data
+    except Exception:
+        _failed('Failed to read the rollup generation')
+        return None
+
+
+def record_sale(supabase, sale, sign=1, generation=None):
+    """Apply one sale (or refund) row to the rollups; sign=-1 when it is deleted"""
+    if not ROLLUPS_ENABLED:
+        return
+    try:
+        supabase.rpc('apply_sale_rollup', {
+            'p_stock_size': sale['stock_size'],
+            'p_stock_color': sale['stock_color'],
+            'p_customer_name': sale['customer_name'],
+            'p_customer_phone': sale['customer_phone'],
+            'p_month': sale['date'][:7] if sale.get('date') else None,
+            'p_is_refund': sale['is_refund'],
+            'p_sign': sign,
+            'p_quantity': sale['quantity'],
+            'p_total': sale['total'],
+            'p_total_cost': sale.get('total_cost', 0),
+            'p_profit': sale.get('profit', 0),
+            'p_generation': generation
+        }).execute()
+    except Exception:
+        _failed(f"Failed to update sale rollups for sale {sale.get('sale_id')}")
+
+
+def record_sales(supabase, sales, sign=1, generation=None):
+    """Apply a batch of sale rows to the rollups in one call (migrations/005)"""
+    if not ROLLUPS_ENABLED or not sales:
+        return
+    try:
+        supabase.rpc('apply_sale_rollups', {
+            'p_sales': [{
+                'stock_size': sale['stock_size'],
+                'stock_color': sale['stock_color'],
+                'customer_name': sale['customer_name'],
+                'customer_phone': sale['customer_phone'],
+                'month': sale['date'][:7] if sale.get('date') else None,
+                'is_refund': sale['is_refund'],
+                'sign': sign,
+                'quantity': sale['quantity'],
+                'total': sale['total'],
+                'total_cost': sale.get('total_cost', 0),
+                'profit': sale.get('profit', 0)
+            } for sale in sales],
+            'p_generation': generation
+        }).execute()
+    except Exception:
+        _failed(f"Failed to update sale rollups for a batch of {len(sales)} sales")
+
+
+def record_payment(supabase, payment, sign=1, generation=None):
+    """Apply one payment row to the rollups; sign=-1 when it is deleted"""
+    if not ROLLUPS_ENABLED:
+        return
+    try:
+        supabase.rpc('apply_payment_rollup', {
+            'p_customer_name': payment['customer_name'],
+            'p_customer_phone': payment['customer_phone'],
+            'p_sign': sign,
+            'p_amount': payment['amount'],
+            'p_generation': generation
+        }).execute()
+    except Exception:
+        _failed(f"Failed to update payment rollups for payment {payment.get('payment_id')}")
+
+
+def rebuild(supabase):
+    """Recompute every rollup table from the sale and payment tables"""
+    token = stale_token('rollups')
+    supabase.rpc('rebuild_rollups', {}).execute()
+    clear_stale('rollups', token)
+
+
+def is_current():
+    """False after a failed update, until the next rebuild"""
+    return stale_token('rollups') is None
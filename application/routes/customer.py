@@ -1,35 +1,56 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from application.routes.auth import login_required
+from application.data_version import invalidates
 from application.database import get_db
+from application.pagination import keyset_page, list_page
+from application.projections import columns
+from application import ledger, customer_search, replica
+from application.fanout import gather
 
 customer_bp = Blueprint('customer', __name__)
 
+def _history_totals(sales, transactions):
+    """Balance totals summed from a customer's sales and transactions, shaped like a ledger row"""
+    total_sales = sum(sale['total'] for sale in sales if not sale['is_refund'])
+    total_refunds = sum(sale['total'] for sale in sales if sale['is_refund'])
+    total_payments = sum(t['amount'] for t in transactions if t['type'] == 'payment')
+    total_advances = sum(t['amount'] for t in transactions if t['type'] == 'advance')
+    return {
+        'total_sales': total_sales,
+        'total_refunds': total_refunds,
+        'total_payments': total_payments,
+        'total_advances': total_advances,
+        'balance': total_sales - total_refunds - total_payments + total_advances
+    }
+
 @customer_bp.route('/')
 @login_required
 def index():
     try:
-        supabase = get_db()
+        # Reads come from the local replica when it is enabled (see application/replica.py)
+        supabase = replica.reader('customer') or get_db()
         
         # Get search parameter
         search_query = request.args.get('search', '').strip()
         
-        # Start with base query
-        query = supabase.table('customer').select('*')
-        
-        # Apply search filter if provided
+        # Alphabetical, one page at a time (keyset on name, phone)
+        order = [('name', False), ('phone', False)]
         if search_query:
-            query = query.or_(f'name.ilike.%{search_query}%,phone.ilike.%{search_query}%,company.ilike.%{search_query}%')
+            # Searches are answered from the in-memory index instead of an ilike scan
+            page = list_page(customer_search.get_index().matching(search_query), order)
+        else:
+            page = keyset_page(lambda select, **select_kwargs: supabase.table('customer').select(select, **select_kwargs),
+                               order, with_total=request.args.get('count') == '1',
+                               select=columns('customer', 'list'))
         
-        # Execute query with ordering
-        customers = query.order('name').execute().data
-        
-        return render_template('customer/index.html', customers=customers, search_query=search_query)
+        return render_template('customer/index.html', customers=page.items, page=page, search_query=search_query)
     except Exception as e:
         flash(f'Error loading customers: {str(e)}', 'error')
         return render_template('customer/index.html', customers=[], search_query='')
 
 @customer_bp.route('/add', methods=['GET', 'POST'])
 @login_required
+@invalidates('customer')
 def add():
     if request.method == 'POST':
         try:
@@ -50,6 +71,7 @@ def add():
 
 @customer_bp.route('/edit/<name>/<phone>', methods=['GET', 'POST'])
 @login_required
+@invalidates('customer')
 def edit(name, phone):
     try:
         supabase = get_db()
@@ -65,7 +87,7 @@ def edit(name, phone):
             return redirect(url_for('customer.index'))
         
         # GET request - load customer for editing
-        customer = supabase.table('customer').select('*').eq('name', name).eq('phone', phone).execute().data
+        customer = supabase.table('customer').select(columns('customer', 'detail')).eq('name', name).eq('phone', phone).execute().data
         if not customer:
             flash('Customer not found!', 'error')
             return redirect(url_for('customer.index'))
@@ -77,6 +99,7 @@ def edit(name, phone):
 
 @customer_bp.route('/delete/<name>/<phone>', methods=['POST'])
 @login_required
+@invalidates('customer')
 def delete(name, phone):
     try:
         supabase = get_db()
@@ -93,25 +116,19 @@ def view(name, phone):
     try:
         supabase = get_db()
         
-        # Get customer details
-        customer = supabase.table('customer').select('*').eq('name', name).eq('phone', phone).execute().data
+        # Customer details, sales, transactions and ledger row, fetched concurrently
+        customer, sales, transactions, ledger_row = gather(
+            lambda: supabase.table('customer').select(columns('customer', 'detail')).eq('name', name).eq('phone', phone).execute().data,
+            lambda: supabase.table('sale').select(columns('sale', 'history')).eq('customer_name', name).eq('customer_phone', phone).order('date', desc=True).execute().data,
+            lambda: supabase.table('transaction').select(columns('transaction', 'history')).eq('customer_name', name).eq('customer_phone', phone).order('date', desc=True).execute().data,
+            lambda: ledger.get_balance(supabase, name, phone)
+        )
         if not customer:
             flash('Customer not found!', 'error')
             return redirect(url_for('customer.index'))
         
-        # Get customer's sales
-        sales = supabase.table('sale').select('*').eq('customer_name', name).eq('customer_phone', phone).order('date', desc=True).execute().data
-        
-        # Get customer's transactions
-        transactions = supabase.table('transaction').select('*').eq('customer_name', name).eq('customer_phone', phone).order('date', desc=True).execute().data
-        
-        # Calculate balance
-        total_sales = sum(sale['total'] for sale in sales if not sale['is_refund'])
-        total_refunds = sum(sale['total'] for sale in sales if sale['is_refund'])
-        total_payments = sum(t['amount'] for t in transactions if t['type'] == 'payment')
-        total_advances = sum(t['amount'] for t in transactions if t['type'] == 'advance')
-        
-        balance = total_sales - total_refunds - total_payments + total_advances
+        # Balance from the ledger row when it is maintained, otherwise sum the history
+        balance = (ledger_row or _history_totals(sales, transactions))['balance']
         
         return render_template('customer/view.html', 
                              customer=customer[0], 
@@ -120,4 +137,36 @@ def view(name, phone):
                              balance=balance)
     except Exception as e:
         flash(f'Error loading customer details: {str(e)}', 'error')
-        return redirect(url_for('customer.index'))
\ No newline at end of file
+        return redirect(url_for('customer.index'))
+
+@customer_bp.route('/balance/<name>/<phone>')
+@login_required
+def balance(name, phone):
+    """Current balance for one customer: the ledger's single row, or summed from the history
+    like customer.view when the ledger is off or out of date"""
+    try:
+        supabase = get_db()
+        ledger_row = ledger.get_balance(supabase, name, phone)
+        if ledger_row is None:
+            sales, transactions = gather(
+                lambda: supabase.table('sale').select(columns('sale', 'balance')).eq('customer_name', name).eq('customer_phone', phone).execute().data,
+                lambda: supabase.table('transaction').select(columns('transaction', 'balance')).eq('customer_name', name).eq('customer_phone', phone).execute().data
+            )
+            ledger_row = _history_totals(sales, transactions)
+        return jsonify(dict(ledger_row, customer_name=name, customer_phone=phone))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@customer_bp.route('/search')
+@login_required
+def search():
+    """Typeahead: top matches for ?q= by name, phone or company"""
+    try:
+        limit = min(request.args.get('limit', customer_search.DEFAULT_LIMIT, type=int), customer_search.MAX_LIMIT)
+        matches, took_ms = customer_search.search(request.args.get('q', ''), limit)
+        return jsonify({
+            'results': [{'name': c['name'], 'phone': c['phone'], 'company': c.get('company') or ''} for c in matches],
+            'took_ms': round(took_ms, 3)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,37 +1,47 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, jsonify
 from application.database import get_db
 from application.routes.auth import login_required
+from application.cache import VersionedCache
+from application import reference_data, replica
+from application.fanout import gather
+from application.projections import columns
+import os
 
 main_bp = Blueprint('main', __name__)
 
+# Dashboard KPIs are rebuilt after any sale/stock/customer write, or after this many seconds
+KPI_CACHE_TTL = int(os.getenv('KPI_CACHE_TTL', 30))
+LOW_STOCK_THRESHOLD = 5
+
+kpi_cache = VersionedCache(('sale', 'stock', 'customer'), KPI_CACHE_TTL)
+
+def load_dashboard_stats():
+    supabase = get_db()
+
+    customer_count, stock_items, recent_sales = gather(
+        # Count customers server-side instead of downloading the table
+        lambda: supabase.table('customer').select(columns('customer', 'exists'), count='exact', head=True).execute().count,
+        # One projected stock fetch covers the count, low stock list and inventory value
+        lambda: supabase.table('stock').select(columns('stock', 'dashboard')).execute().data,
+        # Get recent sales (last 5)
+        lambda: supabase.table('sale').select(columns('sale', 'recent')).order('date', desc=True).limit(5).execute().data
+    )
+    low_stock = [item for item in stock_items if item['quantity'] <= LOW_STOCK_THRESHOLD]
+    total_inventory_value = sum(item.get('total_cost') or 0 for item in stock_items)
+
+    return {
+        'stock_count': len(stock_items),
+        'customer_count': customer_count or 0,
+        'recent_sales': recent_sales,
+        'low_stock': low_stock,
+        'total_inventory_value': total_inventory_value
+    }
+
 @main_bp.route('/')
 @login_required
 def index():
     try:
-        supabase = get_db()
-        
-        # Get dashboard statistics
-        stock_count = len(supabase.table('stock').select('*').execute().data)
-        customer_count = len(supabase.table('customer').select('*').execute().data)
-        
-        # Get recent sales (last 5)
-        recent_sales = supabase.table('sale').select('*').order('date', desc=True).limit(5).execute().data
-        
-        # Get low stock items (quantity <= 5)
-        low_stock = supabase.table('stock').select('*').filter('quantity', 'lte', 5).execute().data
-        
-        # Calculate total inventory value using new schema
-        stock_items = supabase.table('stock').select('*').execute().data
-        total_inventory_value = sum(item.get('total_cost', 0) for item in stock_items)
-        
-        stats = {
-            'stock_count': stock_count,
-            'customer_count': customer_count,
-            'recent_sales': recent_sales,
-            'low_stock': low_stock,
-            'total_inventory_value': total_inventory_value
-        }
-        
+        stats = kpi_cache.get('dashboard', load_dashboard_stats)
         return render_template('dashboard.html', stats=stats)
     except Exception as e:
         return render_template('dashboard.html', stats={
@@ -40,4 +50,18 @@ def index():
             'recent_sales': [],
             'low_stock': [],
             'total_inventory_value': 0
-        }, error=str(e))
\ No newline at end of file
+        }, error=str(e))
+
+@main_bp.route('/cache_stats')
+@login_required
+def cache_stats():
+    """Hit/miss counters of this worker's in-process caches"""
+    return jsonify(dict(reference_data.stats(), dashboard=kpi_cache.stats()))
+
+@main_bp.route('/replica_status')
+@login_required
+def replica_status():
+    """Sync lag of the local read replica; 503 once it is past REPLICA_MAX_LAG"""
+    status = replica.status()
+    healthy = not status['enabled'] or status['within_limit']
+    return jsonify(status), 200 if healthy else 503
@@ -1,6 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from application.routes.auth import login_required
+from application.data_version import invalidates
 from application.database import get_db
+from application.pagination import keyset_page
+from application.projections import columns
+from application.filters import listing_filters, apply_listing_filters
+from application.exports import EXPORT_PAGE_SIZE, csv_response
+from application.paging import iter_rows
+from application import rollups, ledger, reference_data, replica, report_buckets
 from datetime import datetime
 
 payment_bp = Blueprint('payment', __name__)
@@ -9,33 +16,24 @@ payment_bp = Blueprint('payment', __name__)
 @login_required
 def index():
     try:
-        supabase = get_db()
+        # Reads come from the local replica when it is enabled (see application/replica.py)
+        supabase = replica.reader('payment') or get_db()
         
         # Get search parameters
-        search_customer = request.args.get('search_customer', '').strip()
-        start_date = request.args.get('start_date', '').strip()
-        end_date = request.args.get('end_date', '').strip()
-        
-        # Start with base query
-        query = supabase.table('payment').select('*')
-        
-        # Apply filters
-        if search_customer:
-            query = query.ilike('customer_name', f'%{search_customer}%')
+        search_customer, start_date, end_date = listing_filters(request.args)
         
-        if start_date:
-            query = query.gte('date', start_date)
+        # Filtered base query, shared by the page fetch and the optional total count
+        def build_query(select, **select_kwargs):
+            query = supabase.table('payment').select(select, **select_kwargs)
+            return apply_listing_filters(query, search_customer, start_date, end_date)
         
-        if end_date:
-            # Add one day to end_date to include the full day
-            end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d')
-            end_date_plus_one = end_date_plus_one.replace(hour=23, minute=59, second=59)
-            query = query.lte('date', end_date_plus_one.isoformat())
+        # Newest first, one page at a time (keyset on date, payment_id)
+        page = keyset_page(build_query, [('date', True), ('payment_id', True)],
+                           with_total=request.args.get('count') == '1',
+                           select=columns('payment', 'list'))
+        payments = page.items
         
-        # Execute query with ordering
-        payments = query.order('date', desc=True).execute().data
-        
-        return render_template('payment/index.html', payments=payments, 
+        return render_template('payment/index.html', payments=payments, page=page,
                              search_customer=search_customer, 
                              start_date=start_date, 
                              end_date=end_date)
@@ -43,8 +41,29 @@ def index():
         flash(f'Error loading payments: {str(e)}', 'error')
         return render_template('payment/index.html', payments=[])
 
+@payment_bp.route('/export')
+@login_required
+def export():
+    """Every payment matching the listing's filters as a streamed CSV (?gzip=1 to compress)"""
+    try:
+        supabase = replica.reader('payment') or get_db()
+        search_customer, start_date, end_date = listing_filters(request.args)
+        
+        def build_query(select):
+            query = supabase.table('payment').select(select)
+            return apply_listing_filters(query, search_customer, start_date, end_date)
+        
+        select = columns('payment', 'export')
+        rows = iter_rows(build_query, [('date', True), ('payment_id', True)], select,
+                         page_size=EXPORT_PAGE_SIZE, prefetch=True)
+        return csv_response(rows, select.split(','), 'payments', compress=request.args.get('gzip') == '1')
+    except Exception as e:
+        flash(f'Error exporting payments: {str(e)}', 'error')
+        return redirect(url_for('payment.index'))
+
 @payment_bp.route('/add', methods=['GET', 'POST'])
 @login_required
+@invalidates('payment', 'transaction')
 def add():
     try:
         supabase = get_db()
@@ -57,8 +76,7 @@ def add():
             description = request.form.get('description', '')
             
             # Check if customer exists
-            customer = supabase.table('customer').select('*').eq('name', customer_name).eq('phone', customer_phone).execute().data
-            if not customer:
+            if not reference_data.customer_exists(supabase, customer_name, customer_phone):
                 flash('Customer not found. Please add the customer first.', 'error')
                 return redirect(url_for('payment.add'))
             
@@ -71,7 +89,10 @@ def add():
                 'date': datetime.now().isoformat()
             }
             
+            generation = rollups.generation(supabase)
             result = supabase.table('payment').insert(payment_data).execute()
+            rollups.record_payment(supabase, payment_data, generation=generation)
+            ledger.record_payment(supabase, payment_data)
             
             # Also create a transaction record for backward compatibility
             transaction_data = {
@@ -88,14 +109,12 @@ def add():
             flash('Payment recorded successfully!', 'success')
             return redirect(url_for('payment.index'))
         
-        # GET request - load customers for form
-        customers = supabase.table('customer').select('*').order('name').execute().data
-        
-        # Pre-fill customer if passed in query params
+        # GET request - customers are picked through the search API;
+        # pre-fill one if passed in query params
         selected_customer = request.args.get('customer')
         selected_phone = request.args.get('phone')
         
-        return render_template('payment/add.html', customers=customers,
+        return render_template('payment/add.html',
                              selected_customer=selected_customer, selected_phone=selected_phone)
     except Exception as e:
         flash(f'Error processing payment: {str(e)}', 'error')
@@ -103,12 +122,13 @@ def add():
 
 @payment_bp.route('/delete/<int:payment_id>', methods=['POST'])
 @login_required
+@invalidates('payment', 'transaction')
 def delete(payment_id):
     try:
         supabase = get_db()
         
         # Get the payment to be deleted
-        payment = supabase.table('payment').select('*').eq('payment_id', payment_id).execute().data
+        payment = supabase.table('payment').select(columns('payment', 'detail')).eq('payment_id', payment_id).execute().data
         if not payment:
             flash('Payment not found.', 'error')
             return redirect(url_for('payment.index'))
@@ -119,7 +139,11 @@ def delete(payment_id):
         supabase.table('transaction').delete().eq('customer_name', payment_data['customer_name']).eq('customer_phone', payment_data['customer_phone']).eq('amount', payment_data['amount']).eq('type', 'payment').execute()
         
         # Delete the payment
+        generation = rollups.generation(supabase)
         supabase.table('payment').delete().eq('payment_id', payment_id).execute()
+        rollups.record_payment(supabase, payment_data, sign=-1, generation=generation)
+        ledger.record_payment(supabase, payment_data, sign=-1)
+        report_buckets.forget('payment', payment_data['date'])
         
         flash('Payment deleted successfully!', 'success')
     except Exception as e:
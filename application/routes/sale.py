@@ -1,41 +1,41 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from application.routes.auth import login_required
+from application.data_version import invalidates, get_version
+from application.http_cache import conditional
 from application.database import get_db
+from application.pagination import keyset_page
+from application.projections import columns
+from application.filters import listing_filters, apply_listing_filters
+from application.exports import EXPORT_PAGE_SIZE, csv_response
+from application.paging import iter_rows
+from application import rollups, ledger, posting, reference_data, replica, report_buckets
 from datetime import datetime
 
 sale_bp = Blueprint('sale', __name__)
 
 @sale_bp.route('/')
 @login_required
+@conditional('sale')
 def index():
     try:
-        supabase = get_db()
+        # Reads come from the local replica when it is enabled (see application/replica.py)
+        supabase = replica.reader('sale') or get_db()
         
         # Get search parameters
-        search_customer = request.args.get('search_customer', '').strip()
-        start_date = request.args.get('start_date', '').strip()
-        end_date = request.args.get('end_date', '').strip()
-        
-        # Start with base query
-        query = supabase.table('sale').select('*')
-        
-        # Apply filters
-        if search_customer:
-            query = query.ilike('customer_name', f'%{search_customer}%')
-        
-        if start_date:
-            query = query.gte('date', start_date)
+        search_customer, start_date, end_date = listing_filters(request.args)
         
-        if end_date:
-            # Add one day to end_date to include the full day
-            end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d')
-            end_date_plus_one = end_date_plus_one.replace(hour=23, minute=59, second=59)
-            query = query.lte('date', end_date_plus_one.isoformat())
+        # Filtered base query, shared by the page fetch and the optional total count
+        def build_query(select, **select_kwargs):
+            query = supabase.table('sale').select(select, **select_kwargs)
+            return apply_listing_filters(query, search_customer, start_date, end_date)
         
-        # Execute query with ordering - Fixed order syntax
-        sales = query.order('date', desc=True).execute().data
+        # Newest first, one page at a time (keyset on date, sale_id)
+        page = keyset_page(build_query, [('date', True), ('sale_id', True)],
+                           with_total=request.args.get('count') == '1',
+                           select=columns('sale', 'list'))
+        sales = page.items
         
-        return render_template('sale/index.html', sales=sales, 
+        return render_template('sale/index.html', sales=sales, page=page,
                              search_customer=search_customer, 
                              start_date=start_date, 
                              end_date=end_date)
@@ -43,8 +43,29 @@ def index():
         flash(f'Error loading sales: {str(e)}', 'error')
         return render_template('sale/index.html', sales=[])
 
+@sale_bp.route('/export')
+@login_required
+def export():
+    """Every sale matching the listing's filters as a streamed CSV (?gzip=1 to compress)"""
+    try:
+        supabase = replica.reader('sale') or get_db()
+        search_customer, start_date, end_date = listing_filters(request.args)
+        
+        def build_query(select):
+            query = supabase.table('sale').select(select)
+            return apply_listing_filters(query, search_customer, start_date, end_date)
+        
+        select = columns('sale', 'export')
+        rows = iter_rows(build_query, [('date', True), ('sale_id', True)], select,
+                         page_size=EXPORT_PAGE_SIZE, prefetch=True)
+        return csv_response(rows, select.split(','), 'sales', compress=request.args.get('gzip') == '1')
+    except Exception as e:
+        flash(f'Error exporting sales: {str(e)}', 'error')
+        return redirect(url_for('sale.index'))
+
 @sale_bp.route('/add', methods=['GET', 'POST'])
 @login_required
+@invalidates('sale', 'stock', 'transaction')
 def add():
     try:
         supabase = get_db()
@@ -59,14 +80,31 @@ def add():
             rate = float(request.form['rate'])
             total = quantity * rate
             
+            if posting.ATOMIC_SALES:
+                # Customer check, stock adjustment, sale and transaction in one round trip
+                result = posting.post_sale(supabase, customer_name, customer_phone, stock_size, stock_color,
+                                           quantity, rate, f'Sale of {quantity} units at ₦{rate} each',
+                                           datetime.now().isoformat())
+                if result['status'] == 'customer_not_found':
+                    flash('Customer not found. Please add the customer first.', 'error')
+                    return redirect(url_for('sale.add'))
+                if result['status'] == 'stock_not_found':
+                    flash('Stock item not found.', 'error')
+                    return redirect(url_for('sale.add'))
+                
+                if result['new_quantity'] < 0:
+                    flash(f"Warning: Stock will go negative. Current: {result['previous_quantity']}, After sale: {result['new_quantity']}", 'warning')
+                
+                flash('Sale added successfully!', 'success')
+                return redirect(url_for('sale.index'))
+            
             # Check if customer exists
-            customer = supabase.table('customer').select('*').eq('name', customer_name).eq('phone', customer_phone).execute().data
-            if not customer:
+            if not reference_data.customer_exists(supabase, customer_name, customer_phone):
                 flash('Customer not found. Please add the customer first.', 'error')
                 return redirect(url_for('sale.add'))
             
             # Check stock availability (allow negative inventory)
-            stock_item = supabase.table('stock').select('*').eq('size', stock_size).eq('color', stock_color).execute().data
+            stock_item = supabase.table('stock').select(columns('stock', 'adjust')).eq('size', stock_size).eq('color', stock_color).execute().data
             if not stock_item:
                 flash('Stock item not found.', 'error')
                 return redirect(url_for('sale.add'))
@@ -99,8 +137,11 @@ def add():
                 'is_refund': False
             }
             
+            generation = rollups.generation(supabase)
             sale_result = supabase.table('sale').insert(sale_data).execute()
             sale_id = sale_result.data[0]['sale_id']
+            rollups.record_sale(supabase, sale_data, generation=generation)
+            ledger.record_sale(supabase, sale_data)
             
             # Update stock quantity and total cost (allow negative)
             new_total_cost = stock_item[0]['total_cost'] - total_cost
@@ -125,28 +166,116 @@ def add():
             flash('Sale added successfully!', 'success')
             return redirect(url_for('sale.index'))
         
-        # GET request - load data for form (show all stock items, even with 0 or negative quantity)
-        customers = supabase.table('customer').select('*').order('name').execute().data
-        stock_items = supabase.table('stock').select('*').order('size').execute().data
+        # GET request - only the sizes; each size's colors are fetched from stock.colors
+        # when picked (all stock items are offered, even with 0 or negative quantity)
+        stock_sizes = reference_data.stock_sizes()
         
         # Pre-fill customer if passed in query params
         selected_customer = request.args.get('customer')
         selected_phone = request.args.get('phone')
         
-        return render_template('sale/add.html', customers=customers, stock_items=stock_items,
+        return render_template('sale/add.html', stock_sizes=stock_sizes, stock_version=get_version('stock'),
                              selected_customer=selected_customer, selected_phone=selected_phone)
     except Exception as e:
         flash(f'Error processing sale: {str(e)}', 'error')
         return redirect(url_for('sale.index'))
 
+def _invoice_lines(form):
+    """Invoice lines from the form's parallel size/color/quantity/rate fields, plus per-line errors"""
+    lines = []
+    errors = []
+    rows = zip(form.getlist('stock_size'), form.getlist('stock_color'),
+               form.getlist('quantity'), form.getlist('rate'))
+    for line_no, (stock_size, stock_color, quantity, rate) in enumerate(rows, 1):
+        # Skip rows the clerk added but left empty
+        if not (stock_size or stock_color or quantity or rate):
+            continue
+        if not stock_size or not stock_color:
+            errors.append(f'Line {line_no}: select both size and color.')
+            continue
+        try:
+            quantity = int(quantity)
+            rate = float(rate)
+        except ValueError:
+            errors.append(f'Line {line_no}: enter a whole quantity and a numeric rate.')
+            continue
+        if quantity <= 0 or rate <= 0:
+            errors.append(f'Line {line_no}: quantity and rate must be above zero.')
+            continue
+        lines.append({
+            'stock_size': stock_size,
+            'stock_color': stock_color,
+            'quantity': quantity,
+            'rate': rate,
+            'note': f'Sale of {quantity} units at ₦{rate} each'
+        })
+    return lines, errors
+
+@sale_bp.route('/invoice', methods=['GET', 'POST'])
+@login_required
+@invalidates('sale', 'stock', 'transaction')
+def invoice():
+    try:
+        supabase = get_db()
+        
+        if request.method == 'POST':
+            customer_name = request.form['customer_name']
+            customer_phone = request.form['customer_phone']
+            lines, errors = _invoice_lines(request.form)
+            if not lines and not errors:
+                errors.append('Add at least one line to the invoice.')
+            
+            if not errors:
+                # One RPC when ATOMIC_SALES is on; otherwise a few bulk requests plus one stock update per item
+                post = posting.post_invoice if posting.ATOMIC_SALES else posting.post_invoice_batched
+                result = post(supabase, customer_name, customer_phone, lines, datetime.now().isoformat())
+                
+                if result['status'] == 'customer_not_found':
+                    errors.append('Customer not found. Please add the customer first.')
+                elif result['status'] == 'stock_not_found':
+                    line = lines[result['line'] - 1]
+                    errors.append(f"Stock item not found: {line['stock_size']} - {line['stock_color']}.")
+                else:
+                    for item in result['negative_stock']:
+                        flash(f"Warning: {item['stock_size']} - {item['stock_color']} is now negative: {item['new_quantity']}", 'warning')
+                    flash(f"Invoice of {len(result['sale_ids'])} lines added successfully!", 'success')
+                    return redirect(url_for('sale.index'))
+            
+            for error in errors:
+                flash(error, 'error')
+        
+        stock_sizes = reference_data.stock_sizes()
+        
+        # Re-show what was entered when a POST is bounced back with errors
+        entered_lines = [dict(zip(('stock_size', 'stock_color', 'quantity', 'rate'), row))
+                         for row in zip(request.form.getlist('stock_size'), request.form.getlist('stock_color'),
+                                        request.form.getlist('quantity'), request.form.getlist('rate'))]
+        
+        return render_template('sale/invoice.html', stock_sizes=stock_sizes, stock_version=get_version('stock'),
+                             entered_lines=entered_lines,
+                             selected_customer=request.form.get('customer_name') or request.args.get('customer'),
+                             selected_phone=request.form.get('customer_phone') or request.args.get('phone'))
+    except Exception as e:
+        flash(f'Error processing invoice: {str(e)}', 'error')
+        return redirect(url_for('sale.index'))
+
 @sale_bp.route('/refund/<int:sale_id>', methods=['POST'])
 @login_required
+@invalidates('sale', 'stock', 'transaction')
 def refund(sale_id):
     try:
         supabase = get_db()
         
+        if posting.ATOMIC_SALES:
+            result = posting.post_refund(supabase, sale_id, f'Refund for sale #{sale_id}', datetime.now().isoformat())
+            if result['status'] == 'sale_not_found':
+                flash('Sale not found or already refunded.', 'error')
+            else:
+                flash('Refund processed successfully!', 'success')
+            return redirect(url_for('sale.index'))
+        
         # Get the original sale
-        sale = supabase.table('sale').select('*').eq('sale_id', sale_id).execute().data
+        sale = supabase.table('sale').select(columns('sale', 'detail')).eq('sale_id', sale_id).execute().data
         if not sale or sale[0]['is_refund']:
             flash('Sale not found or already refunded.', 'error')
             return redirect(url_for('sale.index'))
@@ -169,11 +298,14 @@ def refund(sale_id):
             'is_refund': True
         }
         
+        generation = rollups.generation(supabase)
         refund_result = supabase.table('sale').insert(refund_data).execute()
         refund_id = refund_result.data[0]['sale_id']
+        rollups.record_sale(supabase, refund_data, generation=generation)
+        ledger.record_sale(supabase, refund_data)
         
         # Update stock quantity (add back)
-        stock_item = supabase.table('stock').select('*').eq('size', original_sale['stock_size']).eq('color', original_sale['stock_color']).execute().data
+        stock_item = supabase.table('stock').select(columns('stock', 'adjust')).eq('size', original_sale['stock_size']).eq('color', original_sale['stock_color']).execute().data
         if stock_item:
             new_quantity = stock_item[0]['quantity'] + original_sale['quantity']
             new_total_cost = stock_item[0]['total_cost'] + original_sale['total_cost']
@@ -203,12 +335,22 @@ def refund(sale_id):
 
 @sale_bp.route('/delete/<int:sale_id>', methods=['POST'])
 @login_required
+@invalidates('sale', 'stock', 'transaction')
 def delete(sale_id):
     try:
         supabase = get_db()
         
+        if posting.ATOMIC_SALES:
+            result = posting.delete_sale(supabase, sale_id)
+            if result['status'] == 'sale_not_found':
+                flash('Sale not found.', 'error')
+            else:
+                report_buckets.forget('sale', result['date'])
+                flash('Sale deleted successfully!', 'success')
+            return redirect(url_for('sale.index'))
+        
         # Get the sale to be deleted
-        sale = supabase.table('sale').select('*').eq('sale_id', sale_id).execute().data
+        sale = supabase.table('sale').select(columns('sale', 'detail')).eq('sale_id', sale_id).execute().data
         if not sale:
             flash('Sale not found.', 'error')
             return redirect(url_for('sale.index'))
@@ -217,7 +359,7 @@ def delete(sale_id):
         
         # If it's a regular sale (not refund), restore stock
         if not sale_data['is_refund']:
-            stock_item = supabase.table('stock').select('*').eq('size', sale_data['stock_size']).eq('color', sale_data['stock_color']).execute().data
+            stock_item = supabase.table('stock').select(columns('stock', 'adjust')).eq('size', sale_data['stock_size']).eq('color', sale_data['stock_color']).execute().data
             if stock_item:
                 new_quantity = stock_item[0]['quantity'] + sale_data['quantity']
                 new_total_cost = stock_item[0]['total_cost'] + sale_data['total_cost']
@@ -230,7 +372,11 @@ def delete(sale_id):
         supabase.table('transaction').delete().eq('related_sale_id', sale_id).execute()
         
         # Delete the sale
+        generation = rollups.generation(supabase)
         supabase.table('sale').delete().eq('sale_id', sale_id).execute()
+        rollups.record_sale(supabase, sale_data, sign=-1, generation=generation)
+        ledger.record_sale(supabase, sale_data, sign=-1)
+        report_buckets.forget('sale', sale_data['date'])
         
         flash('Sale deleted successfully!', 'success')
     except Exception as e:
@@ -1,22 +1,51 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import os
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from application.database import get_db
 from application.routes.auth import login_required
+from application.data_version import invalidates, get_version
+from application.projections import columns
+from application.stock_import import import_stock
+from application import reference_data
 
 stock_bp = Blueprint('stock', __name__)
 
+# Seconds the browser may reuse a size's color list without revalidating
+STOCK_OPTIONS_MAX_AGE = int(os.getenv('STOCK_OPTIONS_MAX_AGE', 60))
+
 @stock_bp.route('/')
 @login_required
 def index():
     try:
-        supabase = get_db()
-        stock_items = supabase.table('stock').select('*').order('size').execute().data
+        stock_items = reference_data.stock_items()
         return render_template('stock/index.html', stock_items=stock_items)
     except Exception as e:
         flash(f'Error loading stock: {str(e)}', 'error')
         return render_template('stock/index.html', stock_items=[])
 
+@stock_bp.route('/colors')
+@login_required
+def colors():
+    """Colors for one size (?size=) with quantity and cost, fetched by the sale forms on demand.
+
+    The ETag is the stock data version, so a revalidation after max-age is a
+    304 until some stock write happens. The forms also put the version in the
+    URL (?v=, ignored here) so a stock write moves them to a fresh cache entry.
+    """
+    try:
+        size = request.args.get('size', '')
+        version = get_version('stock')
+        response = jsonify({'size': size, 'version': version, 'colors': reference_data.stock_colors(size)})
+        response.set_etag(version)
+        response.cache_control.private = True
+        response.cache_control.max_age = STOCK_OPTIONS_MAX_AGE
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @stock_bp.route('/add', methods=['GET', 'POST'])
 @login_required
+@invalidates('stock')
 def add():
     if request.method == 'POST':
         try:
@@ -30,7 +59,7 @@ def add():
             cost_per_unit = total_cost / quantity if quantity > 0 else 0
             
             # Check if this size/color combination already exists
-            existing = supabase.table('stock').select('*').eq('size', size).eq('color', color).execute().data
+            existing = supabase.table('stock').select(columns('stock', 'adjust')).eq('size', size).eq('color', color).execute().data
             if existing:
                 # Update existing stock by adding new quantities and costs
                 existing_item = existing[0]
@@ -65,8 +94,35 @@ def add():
     
     return render_template('stock/add.html')
 
+@stock_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@invalidates('stock')
+def import_csv():
+    report = None
+    if request.method == 'POST':
+        try:
+            upload = request.files.get('file')
+            if not upload or not upload.filename:
+                flash('Choose a CSV file to import.', 'error')
+                return redirect(url_for('stock.import_csv'))
+            
+            dry_run = request.form.get('dry_run') == '1'
+            report = import_stock(get_db(), upload.stream, dry_run=dry_run)
+            
+            if dry_run:
+                flash(f"Dry run: {report['created']} new and {report['updated']} updated items, nothing saved.", 'info')
+            else:
+                flash(f"Imported {report['rows_imported']} rows: {report['created']} new and {report['updated']} updated items.", 'success')
+            if report['errors']:
+                flash(f"{len(report['errors'])} rows were skipped, see the error report below.", 'warning')
+        except Exception as e:
+            flash(f'Error importing stock: {str(e)}', 'error')
+    
+    return render_template('stock/import.html', report=report)
+
 @stock_bp.route('/edit/<size>/<color>', methods=['GET', 'POST'])
 @login_required
+@invalidates('stock')
 def edit(size, color):
     try:
         supabase = get_db()
@@ -88,7 +144,7 @@ def edit(size, color):
             return redirect(url_for('stock.index'))
         
         # GET request - load stock item for editing
-        stock_item = supabase.table('stock').select('*').eq('size', size).eq('color', color).execute().data
+        stock_item = supabase.table('stock').select(columns('stock', 'detail')).eq('size', size).eq('color', color).execute().data
         if not stock_item:
             flash('Stock item not found!', 'error')
             return redirect(url_for('stock.index'))
@@ -100,6 +156,7 @@ def edit(size, color):
 
 @stock_bp.route('/delete/<size>/<color>', methods=['POST'])
 @login_required
+@invalidates('stock')
 def delete(size, color):
     try:
         supabase = get_db()
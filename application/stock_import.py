@@ -0,0 +1,168 @@
+import csv
+import io
+import os
+
+from application.projections import columns
+
+# Rows per upsert request, and sizes per prefetch query (keeps URLs short)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+
+REQUIRED_COLUMNS = ('size', 'color', 'quantity')
+
+# Header spellings seen in spreadsheets, mapped to our column names
+HEADER_ALIASES = {
+    'colour': 'color',
+    'qty': 'quantity',
+    'total_value': 'total_cost',
+    'value': 'total_cost',
+    'unit_cost': 'cost_per_unit',
+    'cost': 'cost_per_unit'
+}
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole can't be imported (no header, missing columns)"""
+
+
+def _normalise_header(name):
+    key = (name or '').strip().lower().replace(' ', '_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def read_rows(stream):
+    """Yield (line_no, row) from an uploaded CSV without loading the whole file.
+
+    Spreadsheets saved as CSV come with a BOM and ';' or tab separators
+    depending on locale, so the dialect is sniffed from the first chunk.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    # Finish the sample's last line so no row is split where the sample ends
+    # (uploads aren't always seekable, so the sample is re-fed rather than re-read).
+    # A sample ending in the '\r' of a '\r\n' pair takes the '\n' along with it.
+    sample = text.read(4096)
+    if sample and not sample.endswith('\n'):
+        sample += text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    # Put the sample back in front of the rest of the stream
+    def lines():
+        yield from io.StringIO(sample, newline='')
+        yield from text
+
+    reader = csv.reader(lines(), dialect)
+    header = next(reader, None)
+    if not header:
+        raise ImportFormatError('The file is empty.')
+    header = [_normalise_header(name) for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if 'total_cost' not in header and 'cost_per_unit' not in header:
+        missing.append('total_cost (or cost_per_unit)')
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        # reader.line_num counts physical lines, so quoted newlines keep numbers right
+        yield reader.line_num, dict(zip(header, (value.strip() for value in values)))
+
+
+def parse_row(row):
+    """(size, color, quantity, total_cost) for one row; raises ValueError with a message"""
+    size = row.get('size', '')
+    color = row.get('color', '')
+    if not size or not color:
+        raise ValueError('size and color are required')
+    try:
+        quantity = int(row.get('quantity', ''))
+    except ValueError:
+        raise ValueError(f"quantity must be a whole number, got '{row.get('quantity', '')}'")
+
+    try:
+        if row.get('total_cost'):
+            total_cost = float(row['total_cost'])
+        else:
+            total_cost = float(row.get('cost_per_unit', '')) * quantity
+    except ValueError:
+        raise ValueError('total_cost (or cost_per_unit) must be a number')
+    return size, color, quantity, total_cost
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _prefetch(supabase, keys):
+    """Existing stock rows for the given (size, color) pairs, in few queries"""
+    existing = {}
+    sizes = sorted({size for size, _ in keys})
+    for batch in _chunks(sizes, IMPORT_BATCH_SIZE):
+        for item in supabase.table('stock').select(columns('stock', 'snapshot')).in_('size', batch).execute().data:
+            key = (item['size'], item['color'])
+            if key in keys:
+                existing[key] = item
+    return existing
+
+
+def import_stock(supabase, stream, dry_run=False):
+    """Merge a CSV of received stock into the stock table.
+
+    Rows for the same size/color are summed first, then merged with the
+    existing row using the same weighted-average cost_per_unit as
+    stock.add. Invalid rows are reported and skipped; the rest are written
+    in batched upserts unless dry_run is set. Like stock.add, the merge is
+    read-modify-write, so avoid importing while sales are being entered.
+    """
+    groups = {}
+    errors = []
+    rows_read = 0
+    for line_no, row in read_rows(stream):
+        rows_read += 1
+        try:
+            size, color, quantity, total_cost = parse_row(row)
+        except ValueError as e:
+            errors.append({'line': line_no, 'row': row, 'error': str(e)})
+            continue
+        group = groups.setdefault((size, color), {'quantity': 0, 'total_cost': 0, 'rows': 0})
+        group['quantity'] += quantity
+        group['total_cost'] += total_cost
+        group['rows'] += 1
+
+    existing = _prefetch(supabase, groups) if groups else {}
+
+    plan = []
+    for (size, color), group in groups.items():
+        current = existing.get((size, color))
+        new_quantity = group['quantity'] + (current['quantity'] if current else 0)
+        new_total_cost = group['total_cost'] + (current['total_cost'] if current else 0)
+        plan.append({
+            'size': size,
+            'color': color,
+            'action': 'update' if current else 'create',
+            'rows': group['rows'],
+            'previous_quantity': current['quantity'] if current else None,
+            'added_quantity': group['quantity'],
+            'quantity': new_quantity,
+            'total_cost': new_total_cost,
+            'cost_per_unit': new_total_cost / new_quantity if new_quantity > 0 else 0
+        })
+
+    if not dry_run:
+        upserts = [{key: item[key] for key in ('size', 'color', 'quantity', 'cost_per_unit', 'total_cost')}
+                   for item in plan]
+        for batch in _chunks(upserts, IMPORT_BATCH_SIZE):
+            supabase.table('stock').upsert(batch, on_conflict='size,color').execute()
+
+    return {
+        'dry_run': dry_run,
+        'rows_read': rows_read,
+        'rows_imported': rows_read - len(errors),
+        'created': sum(1 for item in plan if item['action'] == 'create'),
+        'updated': sum(1 for item in plan if item['action'] == 'update'),
+        'plan': plan,
+        'errors': errors
+    }
@@ -0,0 +1,5 @@
+"""Offline benchmarks: every route against an in-memory Supabase stand-in and synthetic data.
+
+    python -m bench.run --size 100k --output after.json
+    python -m bench.compare before.json after.json
+"""
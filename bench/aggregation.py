@@ -0,0 +1,67 @@
+"""Time the row-by-row and columnar report aggregation on the same rows, and check they agree.
+
+    python -m bench.aggregation --size 100k --iterations 5
+
+Only the aggregation is timed: the rows are generated up front and handed
+to report_engine.build_report_data and report_columnar.build_report_data,
+so the numbers leave out fetching. Exits with status 1 if the two results
+differ in any group, field, value or type.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+
+def _differences(expected, actual):
+    for name in ('by_item', 'by_size', 'by_color', 'by_customer', 'by_month', 'payments_by_customer',
+                 'totals', 'total_payments', 'stock_lookup'):
+        want, got = getattr(expected, name), getattr(actual, name)
+        if isinstance(want, dict) and list(want) != list(got):
+            yield f'{name}: groups differ or are in a different order'
+        elif repr(want) != repr(got):
+            # repr also tells 0 from 0.0 and catches float sums that are off in the last bit
+            yield f'{name}: values differ'
+
+
+def _time(build, tables, iterations):
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        data = build(tables['sale'], tables['payment'], tables['stock'])
+        durations.append((time.perf_counter() - started) * 1000)
+    return data, durations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='100k', help="dataset: 1k, 100k, 1m or a sale count (default 100k)")
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SUPABASE_URL', 'http://supabase.invalid')
+    os.environ.setdefault('SUPABASE_KEY', 'bench')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from bench.data import generate
+    from application import report_columnar, report_engine
+
+    tables = generate(args.size, seed=args.seed)
+    expected, row_ms = _time(report_engine.build_report_data, tables, args.iterations)
+    actual, columnar_ms = _time(report_columnar.build_report_data, tables, args.iterations)
+
+    row_median, columnar_median = statistics.median(row_ms), statistics.median(columnar_ms)
+    print(f"{len(tables['sale'])} sales, {len(tables['payment'])} payments")
+    print(f'{"python":10} {row_median:>10.2f} ms')
+    print(f'{"columnar":10} {columnar_median:>10.2f} ms  ({row_median / columnar_median:.1f}x)')
+
+    differences = list(_differences(expected, actual))
+    for difference in differences:
+        print(f'MISMATCH {difference}', file=sys.stderr)
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Compare two bench.run JSON files scenario by scenario.
+
+    python -m bench.compare before.json after.json --threshold 1.2
+
+Prints the median of each scenario in both runs and their ratio, and exits
+with status 1 if any scenario got slower than the threshold allows (or
+started making more database calls).
+"""
+import argparse
+import json
+import sys
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            rows.append((name, None, new['median_ms'], None, '', 'new'))
+            continue
+        ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        notes = []
+        if ratio > threshold:
+            notes.append('slower')
+        if new['db_calls'] > old['db_calls']:
+            notes.append(f"db calls {old['db_calls']} -> {new['db_calls']}")
+        if notes:
+            regressions.append(name)
+        rows.append((name, old['median_ms'], new['median_ms'], ratio, ', '.join(notes), ''))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.2, help='median ratio counted as a regression (default 1.2)')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    # generate_s is how long the data took to build, not part of what was built
+    datasets = [{key: value for key, value in run['meta']['dataset'].items() if key != 'generate_s'}
+                for run in (before, after)]
+    if datasets[0] != datasets[1]:
+        print('warning: the runs used different datasets', file=sys.stderr)
+
+    rows, regressions = compare(before, after, args.threshold)
+    print(f"{'scenario':40} {'before ms':>11} {'after ms':>11} {'ratio':>7}")
+    for name, old, new, ratio, notes, status in rows:
+        old_text = f'{old:11.2f}' if old is not None else f"{'-':>11}"
+        ratio_text = f'{ratio:7.2f}' if ratio is not None else f'{status:>7}'
+        print(f'{name:40} {old_text} {new:11.2f} {ratio_text}  {notes}')
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Synthetic shop data for the benchmarks.
+
+generate('100k') returns {table: rows} for customer, stock, sale, payment and
+transaction, shaped like what the routes write: sales carry cost and
+profit, about 3% are refunds of an earlier sale, each sale/refund/payment
+has its transaction row, and stock quantities reflect what was sold. The
+first 0.5% of sales and payments (by id) have no date, like rows entered before
+dates were recorded. Amounts come as PostgREST sends numerics, whole values
+as ints: every fourth item is priced in whole naira, so some groups are all
+ints and others mix ints and floats. The same seed and end date always give
+the same data.
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+# Named dataset sizes: sales rows, customers and months of history
+SIZES = {
+    '1k': {'sales': 1_000, 'customers': 60, 'months': 6},
+    '100k': {'sales': 100_000, 'customers': 1_500, 'months': 24},
+    '1m': {'sales': 1_000_000, 'customers': 8_000, 'months': 36}
+}
+
+SIZES_STOCKED = ['24', '26', '28', '30', '32', '34', '36', '38', '40', '42', '44', 'S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Black', 'White', 'Navy', 'Red', 'Wine', 'Green', 'Olive', 'Grey', 'Brown', 'Cream', 'Sky Blue', 'Mustard']
+
+FIRST_NAMES = ['Ade', 'Bola', 'Chidi', 'Dayo', 'Emeka', 'Funmi', 'Gbenga', 'Halima', 'Ifeoma', 'Jide', 'Kemi',
+               'Lola', 'Musa', 'Ngozi', 'Ola', 'Pelumi', 'Quadri', 'Remi', 'Sade', 'Tunde', 'Uche', 'Yemi', 'Zainab']
+LAST_NAMES = ['Adeyemi', 'Bello', 'Chukwu', 'Danjuma', 'Eze', 'Fashola', 'Garba', 'Ibrahim', 'Johnson', 'Kalu',
+              'Lawal', 'Mohammed', 'Nwosu', 'Okafor', 'Olawale', 'Salami', 'Usman', 'Williams', 'Yusuf']
+COMPANY_SUFFIXES = ['Stores', 'Fashion', 'Ventures', 'Boutique', 'Enterprises', 'Textiles']
+
+
+def _numeric(value):
+    """A numeric column as PostgREST returns it: whole values are JSON ints"""
+    return int(value) if value == int(value) else value
+
+
+def _customers(rnd, count):
+    customers = []
+    seen = set()
+    while len(customers) < count:
+        name = f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+        if name in seen:
+            name = f'{name} {len(customers)}'
+        seen.add(name)
+        phone = f'080{rnd.randrange(10_000_000, 99_999_999)}'
+        company = f'{name.split()[-1]} {rnd.choice(COMPANY_SUFFIXES)}' if rnd.random() < 0.4 else ''
+        customers.append({'name': name, 'phone': phone, 'company': company})
+    return customers
+
+
+def _stock(rnd):
+    stock = []
+    for size in SIZES_STOCKED:
+        for color in COLORS:
+            if rnd.random() < 0.75:
+                cost = _numeric(round(rnd.uniform(1500, 9000), 0 if len(stock) % 4 == 0 else 2))
+                stock.append({'size': size, 'color': sys.intern(color), 'quantity': 0,
+                              'cost_per_unit': cost, 'total_cost': 0.0})
+    return stock
+
+
+def generate(size='1k', seed=1, end_date=None):
+    """Tables for a named size ('1k', '100k', '1m') or a plain sale count"""
+    spec = SIZES[size] if size in SIZES else {'sales': int(size), 'customers': max(20, int(size) // 100), 'months': 12}
+    rnd = random.Random(seed)
+    end = (end_date or datetime.now()).replace(hour=18, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=30 * spec['months'])
+    span = (end - start).total_seconds()
+
+    customers = _customers(rnd, spec['customers'])
+    stock = _stock(rnd)
+    # A few customers and SKUs do most of the business
+    customer_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(customers))]
+    stock_weights = [1 / (rank + 1) ** 0.5 for rank in range(len(stock))]
+
+    sale_count = spec['sales']
+    undated = sale_count // 200
+    dates = sorted(start + timedelta(seconds=rnd.random() * span) for _ in range(sale_count))
+    buyers = rnd.choices(customers, customer_weights, k=sale_count)
+    items = rnd.choices(stock, stock_weights, k=sale_count)
+
+    sales, transactions = [], []
+    sold = {}
+    for sale_id, (date, customer, item) in enumerate(zip(dates, buyers, items), 1):
+        stamp = date.isoformat() if sale_id > undated else None
+        refund_of = sales[rnd.randrange(len(sales))] if sales and rnd.random() < 0.03 else None
+        if refund_of is not None and not refund_of['is_refund']:
+            sale = dict(refund_of, sale_id=sale_id, date=stamp, is_refund=True,
+                        profit=-refund_of['profit'])
+            kind, note = 'refund', f"Refund for sale #{refund_of['sale_id']}"
+        else:
+            quantity = rnd.choice([1, 1, 2, 3, 5, 6, 10, 12, 24])
+            cost = item['cost_per_unit']
+            rate = _numeric(round(cost * rnd.uniform(1.2, 1.8), 0 if isinstance(cost, int) else 2))
+            sale = {
+                'sale_id': sale_id,
+                'customer_name': customer['name'],
+                'customer_phone': customer['phone'],
+                'stock_size': item['size'],
+                'stock_color': item['color'],
+                'quantity': quantity,
+                'rate': rate,
+                'total': _numeric(round(quantity * rate, 2)),
+                'cost_per_unit': cost,
+                'total_cost': _numeric(round(quantity * cost, 2)),
+                'profit': _numeric(round(quantity * (rate - cost), 2)),
+                'date': stamp,
+                'is_refund': False
+            }
+            kind, note = 'sale', f'Sale of {quantity} units at ₦{rate} each'
+        sales.append(sale)
+        key = (sale['stock_size'], sale['stock_color'])
+        sold[key] = sold.get(key, 0) + (-sale['quantity'] if sale['is_refund'] else sale['quantity'])
+        transactions.append({
+            'customer_name': sale['customer_name'],
+            'customer_phone': sale['customer_phone'],
+            'amount': sale['total'],
+            'type': kind,
+            'related_sale_id': sale_id,
+            'date': sale['date'],
+            'note': note
+        })
+
+    # Roughly one payment per four sales, from the same customers
+    payments = []
+    for payment_id in range(1, sale_count // 4 + 1):
+        customer = rnd.choices(customers, customer_weights)[0]
+        date = start + timedelta(seconds=rnd.random() * span)
+        stamp = date.isoformat() if payment_id > undated // 4 else None
+        amount = _numeric(round(rnd.uniform(5_000, 250_000), 0 if payment_id % 3 == 0 else 2))
+        description = rnd.choice(['', 'Cash', 'Transfer', 'POS', 'Part payment'])
+        payments.append({
+            'payment_id': payment_id,
+            'customer_name': customer['name'],
+            'customer_phone': customer['phone'],
+            'amount': amount,
+            'description': description,
+            'date': stamp
+        })
+        transactions.append({
+            'customer_name': customer['name'],
+            'customer_phone': customer['phone'],
+            'amount': amount,
+            'type': 'payment',
+            'related_sale_id': None,
+            'date': stamp,
+            'note': description
+        })
+
+    transactions.sort(key=lambda row: (row['date'] is not None, row['date'] or ''))
+    for transaction_id, transaction in enumerate(transactions, 1):
+        transaction['transaction_id'] = transaction_id
+
+    # Stock on hand: what was bought in minus what was sold (a few end up negative)
+    for item in stock:
+        net_sold = sold.get((item['size'], item['color']), 0)
+        item['quantity'] = int(net_sold * rnd.uniform(0.9, 1.3)) - net_sold + rnd.randrange(0, 40)
+        item['total_cost'] = _numeric(round(item['quantity'] * item['cost_per_unit'], 2))
+
+    return {
+        'customer': customers,
+        'stock': stock,
+        'sale': sales,
+        'payment': payments,
+        'transaction': transactions
+    }
@@ -0,0 +1,532 @@
+"""In-memory stand-in for the Supabase client, covering the query builder subset the app uses.
+
+    client = FakeSupabase({'sale': [...], 'customer': [...], ...})
+    client.table('sale').select('sale_id,total').eq('customer_name', 'Ada').order('date', desc=True).limit(50).execute()
+
+Filters follow PostgREST semantics closely enough for the routes: eq/neq/gt/
+gte/lt/lte/ilike/like/in_/is_, or_() logic trees (including the nested
+and()/or() cursors from pagination), stacked order() calls with NULLs last
+(first when descending), limit/range, count='exact' with head=True, and
+insert/update/upsert/delete returning the affected rows. Equality lookups
+use a per-column hash index so point queries stay cheap at 1M rows, the way
+an indexed lookup would be.
+"""
+import bisect
+import functools
+import heapq
+import re
+import threading
+
+# Serial primary keys assigned on insert
+SERIAL_KEYS = {'sale': 'sale_id', 'payment': 'payment_id', 'transaction': 'transaction_id'}
+
+# Natural keys, for duplicate checks on insert and upsert matching
+UNIQUE_KEYS = {
+    'customer': ('name', 'phone'),
+    'stock': ('size', 'color')
+}
+
+
+class FakeAPIError(Exception):
+    """Raised where PostgREST would return an error"""
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# Values and comparisons
+
+def _coerce(value, like):
+    """A filter value as the type of the column value it is compared with"""
+    if value is None or like is None or isinstance(value, type(like)):
+        return value
+    if isinstance(like, bool):
+        return str(value).lower() == 'true'
+    if isinstance(like, (int, float)):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return value
+        return int(number) if isinstance(like, int) and number.is_integer() else number
+    return str(value)
+
+
+@functools.lru_cache(maxsize=256)
+def _like_regex(pattern, flags=0):
+    parts = []
+    for char in pattern:
+        if char in '%*':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts) + r'\Z', flags | re.DOTALL)
+
+
+def _compare(op, actual, value):
+    if op == 'is':
+        wanted = {'null': None, 'true': True, 'false': False}.get(str(value).lower(), value)
+        return actual is wanted
+    if op == 'in':
+        values = value if isinstance(value, (list, tuple, set)) else _parse_list(value)
+        return actual in {_coerce(v, actual) for v in values}
+    if actual is None:
+        return False
+    if op in ('like', 'ilike'):
+        return _like_regex(str(value), re.IGNORECASE if op == 'ilike' else 0).match(str(actual)) is not None
+    value = _coerce(value, actual)
+    try:
+        if op == 'eq':
+            return actual == value
+        if op == 'neq':
+            return actual != value
+        if op == 'gt':
+            return actual > value
+        if op == 'gte':
+            return actual >= value
+        if op == 'lt':
+            return actual < value
+        if op == 'lte':
+            return actual <= value
+    except TypeError:
+        return False
+    raise FakeAPIError(f'Unsupported operator: {op}')
+
+
+def _parse_list(text):
+    text = str(text).strip()
+    if text.startswith('(') and text.endswith(')'):
+        text = text[1:-1]
+    return [_unquote(item) for item in _split_top_level(text)]
+
+
+# PostgREST logic trees: or=(a.eq.1,and(b.gt."x",c.lt.2))
+
+def _unquote(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', text[1:-1])
+    return text
+
+
+def _split_top_level(text):
+    """Split on commas outside quotes and parentheses"""
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(text):
+        char = text[i]
+        if quoted:
+            if char == '\\':
+                i += 1
+            elif char == '"':
+                quoted = False
+        elif char == '"':
+            quoted = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return [part for part in parts if part.strip()]
+
+
+def _parse_condition(text):
+    """Parse one logic-tree item into ('and'|'or', [nodes]), ('not', node) or ('cmp', column, op, value)"""
+    text = text.strip()
+    for joiner in ('and', 'or'):
+        if text.startswith(joiner + '(') and text.endswith(')'):
+            return (joiner, [_parse_condition(part) for part in _split_top_level(text[len(joiner) + 1:-1])])
+    column, op, value = text.split('.', 2)
+    if op == 'not':
+        return ('not', _parse_condition(f'{column}.{value}'))
+    return ('cmp', column, op, _unquote(value))
+
+
+def _compile(node):
+    """A predicate row -> bool for a parsed logic tree"""
+    kind = node[0]
+    if kind in ('and', 'or'):
+        children = [_compile(child) for child in node[1]]
+        combine = all if kind == 'and' else any
+        return lambda row: combine(child(row) for child in children)
+    if kind == 'not':
+        inner = _compile(node[1])
+        return lambda row: not inner(row)
+    _, column, op, value = node
+    return lambda row: _compare(op, row.get(column), value)
+
+
+def _keyset(node):
+    """(columns, values, op) if the tree requires a keyset condition like pagination.keyset_condition builds:
+    or(c0.lt.v0, and(c0.eq.v0, c1.lt.v1), ...), possibly AND-ed with other filters. Else None."""
+    kind = node[0]
+    if kind == 'cmp' and node[2] in ('gt', 'lt'):
+        return [node[1]], [node[3]], node[2]
+    if kind == 'or' and len(node[1]) == 1:
+        return _keyset(node[1][0])
+    if kind == 'and':
+        for child in node[1]:
+            found = _keyset(child)
+            if found:
+                return found
+        return None
+    if kind != 'or' or node[1][0][0] != 'cmp' or node[1][0][2] not in ('gt', 'lt'):
+        return None
+    columns, values, op = [node[1][0][1]], [node[1][0][3]], node[1][0][2]
+    for branch in node[1][1:]:
+        parts = branch[1] if branch[0] == 'and' else None
+        if not parts or len(parts) != len(columns) + 1 or any(part[0] != 'cmp' for part in parts):
+            return None
+        if any(part[1:] != (column, 'eq', value) for part, column, value in zip(parts, columns, values)):
+            return None
+        if parts[-1][2] != op:
+            return None
+        columns.append(parts[-1][1])
+        values.append(parts[-1][3])
+    return columns, values, op
+
+
+# Sorting: NULLs last ascending, first descending (PostgreSQL's default).
+# _Key handles mixed directions; a single direction uses plain tuples.
+
+def _sort_key(columns):
+    """Key for one sort direction: (is None, value) pairs put NULLs last, or first once reversed"""
+    def key(row):
+        return tuple((row.get(column) is None, row.get(column)) for column in columns)
+    return key
+
+
+class _Key:
+    __slots__ = ('values', 'desc')
+
+    def __init__(self, values, desc):
+        self.values = values
+        self.desc = desc
+
+    def __lt__(self, other):
+        for a, b, desc in zip(self.values, other.values, self.desc):
+            if a == b:
+                continue
+            if a is None:
+                return desc
+            if b is None:
+                return not desc
+            return a > b if desc else a < b
+        return False
+
+
+class FakeQuery:
+    """One query builder chain; nothing runs until execute()"""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._action = 'select'
+        self._columns = '*'
+        self._count = None
+        self._head = False
+        self._payload = None
+        self._on_conflict = None
+        self._filters = []  # (column, op, value) or (None, 'or', predicate)
+        self._keyset = None
+        self._order = []
+        self._offset = 0
+        self._limit = None
+
+    # Actions
+
+    def select(self, columns='*', count=None, head=False):
+        self._columns = columns
+        self._count = count
+        self._head = head
+        return self
+
+    def insert(self, payload):
+        self._action, self._payload = 'insert', payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self._action, self._payload, self._on_conflict = 'upsert', payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self._action, self._payload = 'update', payload
+        return self
+
+    def delete(self):
+        self._action = 'delete'
+        return self
+
+    # Filters
+
+    def _filter(self, column, op, value):
+        self._filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def like(self, column, pattern):
+        return self._filter(column, 'like', pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value)
+
+    def filter(self, column, operator, criteria):
+        return self._filter(column, operator, criteria)
+
+    def or_(self, filters):
+        tree = _parse_condition(f'or({filters})')
+        self._filters.append((None, 'or', _compile(tree)))
+        self._keyset = self._keyset or _keyset(tree)
+        return self
+
+    # Shaping
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self._limit = size
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # Execution
+
+    def _matches(self, row):
+        for column, op, value in self._filters:
+            if column is None:
+                if not value(row):
+                    return False
+            elif not _compare(op, row.get(column), value):
+                return False
+        return True
+
+    def _matching_rows(self):
+        rows = self._client._candidates(self._table, self._filters)
+        return [row for row in rows if self._matches(row)]
+
+    def _walk_sorted(self):
+        """Rows of an ordered select read off the table's cached sort order, stopping at the limit.
+
+        A keyset cursor in the or_() filter becomes a bisect, so a deep
+        page costs what the first one does, like an index range scan.
+        None when the matches are better found first and then sorted (an
+        indexed eq filter, mixed directions, or an exact count).
+        """
+        if not self._order or self._count or len({desc for _, desc in self._order}) != 1:
+            return None
+        if any(column is not None and op == 'eq' for column, op, _ in self._filters):
+            return None
+        columns = [column for column, _ in self._order]
+        desc = self._order[0][1]
+        keys, rows = self._client._sorted(self._table, tuple(columns))
+
+        start, stop = 0, len(rows)
+        if self._keyset and self._keyset[0] == columns and self._keyset[2] == ('lt' if desc else 'gt'):
+            cursor = self._client._cursor_key(rows, columns, self._keyset[1])
+            try:
+                if desc:
+                    stop = bisect.bisect_left(keys, cursor)
+                else:
+                    start = bisect.bisect_right(keys, cursor)
+            except TypeError:
+                start, stop = 0, len(rows)
+
+        wanted = None if self._limit is None else self._offset + self._limit
+        matched = []
+        for i in (range(stop - 1, start - 1, -1) if desc else range(start, stop)):
+            if self._matches(rows[i]):
+                matched.append(rows[i])
+                if wanted is not None and len(matched) >= wanted:
+                    break
+        return matched[self._offset:wanted]
+
+    def _shape(self, rows):
+        if self._order:
+            columns = [column for column, _ in self._order]
+            desc = [d for _, d in self._order]
+            reverse = False
+            if len(set(desc)) == 1:
+                reverse = desc[0]
+                key = _sort_key(columns)
+            else:
+                def key(row):
+                    return _Key([row.get(column) for column in columns], desc)
+
+            wanted = None if self._limit is None else self._offset + self._limit
+            if wanted is not None and wanted < len(rows) // 4:
+                pick = heapq.nlargest if reverse else heapq.nsmallest
+                rows = pick(wanted, rows, key=key)
+            else:
+                rows = sorted(rows, key=key, reverse=reverse)
+        if self._offset or self._limit is not None:
+            end = None if self._limit is None else self._offset + self._limit
+            rows = rows[self._offset:end]
+        return rows
+
+    def _project(self, rows):
+        if self._columns in ('*', None):
+            return [dict(row) for row in rows]
+        columns = [column.strip() for column in self._columns.split(',')]
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def execute(self):
+        self._client.calls += 1
+        with self._client._lock:
+            if self._action == 'select':
+                rows = self._walk_sorted()
+                count = None
+                if rows is None:
+                    rows = self._matching_rows()
+                    count = len(rows) if self._count else None
+                    rows = self._shape(rows)
+                return FakeResponse([] if self._head else self._project(rows), count)
+            if self._action == 'insert':
+                return FakeResponse(self._client._insert(self._table, self._payload))
+            if self._action == 'upsert':
+                return FakeResponse(self._client._upsert(self._table, self._payload, self._on_conflict))
+            rows = self._matching_rows()
+            if self._action == 'update':
+                for row in rows:
+                    row.update(self._payload)
+                self._client._touched(self._table)
+                return FakeResponse([dict(row) for row in rows])
+            # delete
+            doomed = {id(row) for row in rows}
+            self._client.tables[self._table] = [row for row in self._client.tables[self._table] if id(row) not in doomed]
+            self._client._touched(self._table)
+            return FakeResponse([dict(row) for row in rows])
+
+
+class FakeSupabase:
+    """Client with table() and rpc(); `calls` counts executed requests"""
+
+    def __init__(self, tables):
+        self.tables = {name: list(rows) for name, rows in tables.items()}
+        self.calls = 0
+        self._lock = threading.RLock()
+        self._indexes = {}  # (table, column) -> {value: [rows]}
+        self._orders = {}  # (table, columns) -> (keys, rows) in ascending order
+        self._serials = {
+            table: max((row.get(key) or 0 for row in self.tables.get(table, [])), default=0)
+            for table, key in SERIAL_KEYS.items()
+        }
+
+    def table(self, name):
+        self.tables.setdefault(name, [])
+        return FakeQuery(self, name)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, name, params=None):
+        raise FakeAPIError(f'RPC {name} is not available in the in-memory client '
+                           f'(run the benchmark with ROLLUPS_ENABLED/LEDGER_ENABLED/ATOMIC_SALES off)')
+
+    # Indexes: rebuilt lazily after a write to the table
+
+    def _touched(self, table):
+        for cache in (self._indexes, self._orders):
+            for key in [key for key in cache if key[0] == table]:
+                del cache[key]
+
+    def _sorted(self, table, columns):
+        """The table's rows in ascending (columns) order, with their sort keys for bisecting"""
+        cached = self._orders.get((table, columns))
+        if cached is None:
+            key = _sort_key(columns)
+            rows = sorted(self.tables[table], key=key)
+            cached = self._orders[(table, columns)] = ([key(row) for row in rows], rows)
+        return cached
+
+    @staticmethod
+    def _cursor_key(rows, columns, values):
+        """Sort key of a cursor whose values came in as text"""
+        key = []
+        for column, value in zip(columns, values):
+            sample = next((row[column] for row in rows if row.get(column) is not None), None)
+            key.append((False, _coerce(value, sample)))
+        return tuple(key)
+
+    def _candidates(self, table, filters):
+        """Rows that could match: an index lookup on the first plain eq filter, else the whole table"""
+        for column, op, value in filters:
+            if op == 'eq' and column is not None:
+                index = self._indexes.get((table, column))
+                if index is None:
+                    index = {}
+                    for row in self.tables[table]:
+                        index.setdefault(row.get(column), []).append(row)
+                    self._indexes[(table, column)] = index
+                sample = next((key for key in index if key is not None), None)
+                return index.get(_coerce(value, sample), [])
+        return self.tables[table]
+
+    def _insert(self, table, payload):
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        for row in rows:
+            row = dict(row)
+            unique = UNIQUE_KEYS.get(table)
+            if unique and any(all(existing.get(c) == row.get(c) for c in unique) for existing in self.tables[table]):
+                raise FakeAPIError(f'duplicate key value violates unique constraint "{table}_pkey"')
+            serial = SERIAL_KEYS.get(table)
+            if serial and row.get(serial) is None:
+                self._serials[table] += 1
+                row[serial] = self._serials[table]
+            self.tables[table].append(row)
+            inserted.append(dict(row))
+        self._touched(table)
+        return inserted
+
+    def _upsert(self, table, payload, on_conflict):
+        rows = payload if isinstance(payload, list) else [payload]
+        keys = tuple(on_conflict.split(',')) if on_conflict else UNIQUE_KEYS.get(table, ())
+        existing = {tuple(row.get(k) for k in keys): row for row in self.tables[table]}
+        result = []
+        for row in rows:
+            match = existing.get(tuple(row.get(k) for k in keys))
+            if match is not None:
+                match.update(row)
+                result.append(dict(match))
+            else:
+                row = dict(row)
+                self.tables[table].append(row)
+                existing[tuple(row.get(k) for k in keys)] = row
+                result.append(dict(row))
+        self._touched(table)
+        return result
@@ -0,0 +1,180 @@
+"""Run every benchmark scenario against the in-memory Supabase stand-in and write JSON.
+
+    python -m bench.run --size 100k --iterations 5 --output bench-100k.json
+    python -m bench.run --size 1k --only reports. --cold
+    python -m bench.run --size 100k --only reports. --cold --aggregation columnar
+
+Timings are wall-clock per request through the Flask test client, so they
+include the stand-in's own filtering and sorting; compare runs made on
+the same machine (see bench.compare) rather than reading them as
+production latencies.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def _prepare_environment(workdir, aggregation):
+    # Before the app is imported: its modules read their config at import time
+    os.environ.setdefault('SUPABASE_URL', 'http://supabase.invalid')
+    os.environ.setdefault('SUPABASE_KEY', 'bench')
+    for name in ('DATA_VERSION_DIR', 'PDF_JOB_DIR', 'PDF_CACHE_DIR', 'REPORT_BUCKET_DIR'):
+        os.environ[name] = os.path.join(workdir, name.lower())
+    os.environ.setdefault('REQUEST_TIMING_ENABLED', 'false')
+    # The stand-in has plain tables only: no RPCs, views or rollup tables
+    for name in ('ROLLUPS_ENABLED', 'LEDGER_ENABLED', 'ATOMIC_SALES'):
+        os.environ[name] = 'false'
+    os.environ['REPORT_AGGREGATION'] = aggregation
+
+
+def _git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return {'commit': commit or None, 'dirty': dirty}
+    except OSError:
+        return {'commit': None, 'dirty': None}
+
+
+def _summary(durations):
+    ordered = sorted(durations)
+    return {
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'max_ms': round(ordered[-1], 3)
+    }
+
+
+def _request(app, client, scenario, context, i, path, form):
+    if scenario.call:
+        with app.test_request_context('/'):
+            body = scenario.call(context, i)
+        return 200, len(body.encode('utf-8'))
+    response = client.open(path, method=scenario.method, data=form)
+    # Streamed responses (exports) only do their work as the body is read
+    size = len(response.get_data())
+    status = response.status_code
+    response.close()
+    return status, size
+
+
+def _flashed_errors(client):
+    """Error messages the last request flashed (failed writes still redirect with 302)"""
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    return [message for category, message in flashes if category == 'error']
+
+
+def run_scenario(app, client, scenario, context, iterations, cold):
+    from application.data_version import bump, TABLES
+
+    fake = context['client']
+    durations, calls, sizes, statuses, errors = [], [], [], set(), []
+    first = None
+    for i in range(iterations + 1):
+        if cold:
+            bump(*TABLES)
+        # Built outside the timed part: some look through the whole dataset
+        path = scenario.path(context, i) if callable(scenario.path) else scenario.path
+        form = scenario.form(context, i) if scenario.form else None
+        calls_before = fake.calls
+        started = time.perf_counter()
+        status, size = _request(app, client, scenario, context, i, path, form)
+        elapsed = (time.perf_counter() - started) * 1000
+        statuses.add(status)
+        if not scenario.call:
+            errors.extend(_flashed_errors(client))
+        if i == 0:
+            # The first request fills the caches; report it on its own
+            first = {'ms': round(elapsed, 3), 'db_calls': fake.calls - calls_before}
+            continue
+        durations.append(elapsed)
+        calls.append(fake.calls - calls_before)
+        sizes.append(size)
+
+    return dict(_summary(durations), first=first, iterations=iterations,
+                db_calls=round(statistics.fmean(calls), 2), response_bytes=round(statistics.fmean(sizes)),
+                status=sorted(statuses), errors=sorted(set(errors)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='1k', help="dataset: 1k, 100k, 1m or a sale count (default 1k)")
+    parser.add_argument('--iterations', type=int, default=5, help='timed requests per scenario after the first')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', action='append', default=[], help='run scenarios whose name starts with this (repeatable)')
+    parser.add_argument('--no-writes', action='store_true', help='skip the scenarios that write')
+    parser.add_argument('--cold', action='store_true', help='invalidate every cache before each request')
+    parser.add_argument('--aggregation', choices=('python', 'columnar'), default='python',
+                        help='REPORT_AGGREGATION for the report scenarios (the stand-in has no rollup views)')
+    parser.add_argument('--output', help='JSON file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='factory-bench-')
+    _prepare_environment(workdir, args.aggregation)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from bench.data import generate
+    from bench.fake_supabase import FakeSupabase
+    from bench.scenarios import SCENARIOS, prepare
+    from application.database import set_client
+    from app import create_app
+
+    started = time.perf_counter()
+    tables = generate(args.size, seed=args.seed)
+    generate_s = time.perf_counter() - started
+    fake = FakeSupabase(tables)
+    set_client(fake)
+    context = prepare(dict(tables, client=fake))
+
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+
+    scenarios = [s for s in SCENARIOS
+                 if (not args.only or any(s.name.startswith(prefix) for prefix in args.only))
+                 and not (args.no_writes and s.write)]
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(app, client, scenario, context, args.iterations, args.cold)
+        result = results[scenario.name]
+        flagged = f"  errors: {'; '.join(result['errors'])}" if result['errors'] else ''
+        print(f"{scenario.name:40} {result['median_ms']:>10.2f} ms{flagged}", file=sys.stderr)
+
+    report = {
+        'meta': dict(_git_revision(),
+                     created_at=datetime.now().isoformat(timespec='seconds'),
+                     python=platform.python_version(),
+                     platform=platform.platform(),
+                     dataset={'size': args.size, 'seed': args.seed,
+                              'rows': {table: len(rows) for table, rows in tables.items()},
+                              'generate_s': round(generate_s, 2)},
+                     iterations=args.iterations,
+                     cold=args.cold,
+                     aggregation=args.aggregation),
+        'results': results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
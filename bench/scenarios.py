@@ -0,0 +1,229 @@
+"""The scripted requests a benchmark run makes.
+
+Each Scenario is one request through the Flask test client (or, for the
+PDF exports, the HTML builder the export job runs, since rendering needs
+Chromium). Paths and forms are functions of the dataset and the iteration
+number, so writes create fresh rows every time. Reads run first, then
+writes, so the read numbers are all taken against the generated data.
+"""
+import io
+from datetime import datetime
+from urllib.parse import quote
+
+from application.pagination import encode_cursor
+
+
+class Scenario:
+    def __init__(self, name, path=None, method='GET', form=None, call=None, write=False):
+        self.name = name
+        self.path = path    # str or fn(data, i) -> str
+        self.method = method
+        self.form = form    # fn(data, i) -> dict
+        self.call = call    # fn(data, i) run inside a request context instead of a request
+        self.write = write
+
+
+def _busy_customer(data):
+    """The tenth busiest customer: plenty of history without always being the extreme case"""
+    counts = {}
+    for sale in data['sale']:
+        key = (sale['customer_name'], sale['customer_phone'])
+        counts[key] = counts.get(key, 0) + 1
+    ranked = sorted(counts, key=counts.get, reverse=True)
+    if not ranked:
+        return data['customer'][0]['name'], data['customer'][0]['phone']
+    return ranked[min(9, len(ranked) - 1)]
+
+
+def _customer_path(prefix):
+    def path(data, i):
+        name, phone = data['busy_customer']
+        return f'{prefix}/{quote(name)}/{quote(phone)}'
+    return path
+
+
+def _stock_path(prefix):
+    def path(data, i):
+        item = data['stock'][0]
+        return f"{prefix}/{quote(item['size'])}/{quote(item['color'])}"
+    return path
+
+
+def _deep_sale_cursor(data, i):
+    """Page 10 of the sale listing (newest first), reached by cursor"""
+    # Undated sales come first, as Postgres sorts NULLs first descending
+    newest = sorted(data['sale'], key=lambda sale: (sale['date'] is None, sale['date'] or '', sale['sale_id']),
+                    reverse=True)
+    row = newest[min(len(newest) - 1, 50 * 10)]
+    return f"/sale/?after={encode_cursor([row['date'], row['sale_id']])}"
+
+
+def _last_quarter(path):
+    """The report for the three months before the current one (closed, stored buckets)"""
+    def build(data, i):
+        year, month = datetime.now().year, datetime.now().month
+        months = [(year * 12 + month - 1 - back) for back in (3, 1)]
+        start, end = (f'{value // 12}-{value % 12 + 1:02d}' for value in months)
+        return f'{path}{"&" if "?" in path else "?"}start={start}&end={end}'
+    return build
+
+
+def _pdf_builder(name, *args):
+    def call(data, i):
+        from application.routes import reports
+        builder = getattr(reports, name)
+        resolved = [arg(data) if callable(arg) else arg for arg in args]
+        return builder(*resolved)
+    return call
+
+
+def _sale_form(data, i):
+    name, phone = data['busy_customer']
+    item = data['stock'][i % len(data['stock'])]
+    return {'customer_name': name, 'customer_phone': phone, 'stock_size': item['size'],
+            'stock_color': item['color'], 'quantity': '2', 'rate': str(round(item['cost_per_unit'] * 1.5, 2))}
+
+
+def _invoice_form(data, i):
+    name, phone = data['busy_customer']
+    items = [data['stock'][(i + offset) % len(data['stock'])] for offset in range(5)]
+    return {'customer_name': name, 'customer_phone': phone,
+            'stock_size': [item['size'] for item in items], 'stock_color': [item['color'] for item in items],
+            'quantity': ['1'] * len(items), 'rate': [str(round(item['cost_per_unit'] * 1.5, 2)) for item in items]}
+
+
+def _payment_form(data, i):
+    name, phone = data['busy_customer']
+    return {'customer_name': name, 'customer_phone': phone, 'amount': '15000', 'description': f'Bench {i}'}
+
+
+def _import_lines(data):
+    """A stock CSV of 400 rows, well past the 4 KB sample read_rows sniffs the dialect from"""
+    items = [data['stock'][n % len(data['stock'])] for n in range(400)]
+    return ['size,color,quantity,total_cost'] + [
+        f"{item['size']},{item['color']},10,{round(item['cost_per_unit'] * 10, 2)}" for item in items]
+
+
+def _import_form(data, i):
+    return {'file': (io.BytesIO('\n'.join(_import_lines(data)).encode('utf-8')), 'stock.csv'), 'dry_run': '1'}
+
+
+def _sample_aligned_crlf(lines):
+    """The import lines as an Excel-style CRLF file whose 4096th character is a '\\r'.
+
+    The quantity of the last row whose line break starts inside the sample
+    is zero-padded until that '\\r' is the sample's last character.
+    """
+    lines = list(lines)
+    offset = 0
+    for n, line in enumerate(lines):
+        if offset + len(line) > 4095:
+            break
+        last, last_offset = n, offset
+        offset += len(line) + 2
+    size, color, quantity, cost = lines[last].split(',')
+    padding = 4095 - last_offset - len(lines[last])
+    lines[last] = f'{size},{color},{quantity.zfill(len(quantity) + padding)},{cost}'
+    return lines, '\r\n'.join(lines) + '\r\n'
+
+
+def _read_import_rows(data, i):
+    """Parse the import CSV, failing the run if any row is misread (e.g. split at the sample's end)"""
+    from application.stock_import import read_rows
+    lines = _import_lines(data)
+    crlf_lines, crlf_text = _sample_aligned_crlf(lines)
+    for expected, text in ((lines, '\n'.join(lines)), (crlf_lines, crlf_text)):
+        rows = [(line_no, ','.join(row.values())) for line_no, row in read_rows(io.BytesIO(text.encode('utf-8')))]
+        if rows != list(enumerate(expected[1:], start=2)):
+            raise AssertionError('stock_import.read_rows misread the CSV')
+    return crlf_text
+
+
+def _last_id(table, key):
+    def path(data, i):
+        rows = data['client'].tables[table]
+        return max(row[key] for row in rows)
+    return path
+
+
+def _refundable_sale(data, i):
+    """A recent sale that is not itself a refund, a different one each iteration"""
+    ids = sorted((row['sale_id'] for row in data['client'].tables['sale'] if not row['is_refund']), reverse=True)
+    return ids[i % len(ids)]
+
+
+SCENARIOS = [
+    # Reads
+    Scenario('auth.login', '/auth/login'),
+    Scenario('main.index', '/'),
+    Scenario('main.cache_stats', '/cache_stats'),
+    Scenario('customer.index', '/customer/'),
+    Scenario('customer.index.count', '/customer/?count=1'),
+    Scenario('customer.index.search', '/customer/?search=ade'),
+    Scenario('customer.search', '/customer/search?q=ade'),
+    Scenario('customer.search.prefix', '/customer/search?q=o'),
+    Scenario('customer.add.form', '/customer/add'),
+    Scenario('customer.edit.form', _customer_path('/customer/edit')),
+    Scenario('customer.view', _customer_path('/customer/view')),
+    Scenario('customer.balance', _customer_path('/customer/balance')),
+    Scenario('stock.index', '/stock/'),
+    Scenario('stock.add.form', '/stock/add'),
+    Scenario('stock.edit.form', _stock_path('/stock/edit')),
+    Scenario('stock.colors', lambda data, i: f"/stock/colors?size={quote(data['stock'][0]['size'])}"),
+    Scenario('stock.import.form', '/stock/import'),
+    Scenario('stock.import.read_rows', call=_read_import_rows),
+    Scenario('sale.index', '/sale/'),
+    Scenario('sale.index.page10', _deep_sale_cursor),
+    Scenario('sale.index.search', '/sale/?search_customer=ade'),
+    Scenario('sale.index.date_range', '/sale/?start_date=2000-01-01&end_date=2100-01-01'),
+    Scenario('sale.add.form', '/sale/add'),
+    Scenario('sale.invoice.form', '/sale/invoice'),
+    Scenario('sale.export', '/sale/export'),
+    Scenario('sale.export.gzip', '/sale/export?gzip=1'),
+    Scenario('payment.index', '/payment/'),
+    Scenario('payment.add.form', '/payment/add'),
+    Scenario('payment.export', '/payment/export'),
+    Scenario('reports.index', '/reports/'),
+    Scenario('reports.account', lambda data, i: '/reports/account?customer={}&phone={}'.format(*map(quote, data['busy_customer']))),
+    Scenario('reports.sales_by_stock', '/reports/sales_by_stock'),
+    Scenario('reports.sales_by_stock.size', '/reports/sales_by_stock?group_by=size'),
+    Scenario('reports.sales_by_customer', '/reports/sales_by_customer'),
+    Scenario('reports.profit', '/reports/profit'),
+    Scenario('reports.profit.last_quarter', _last_quarter('/reports/profit')),
+    Scenario('reports.sales_by_stock.last_quarter', _last_quarter('/reports/sales_by_stock')),
+    Scenario('reports.sales_by_customer.last_quarter', _last_quarter('/reports/sales_by_customer')),
+    Scenario('reports.export_transactions', '/reports/export/transactions'),
+    Scenario('reports.export_cache_stats', '/reports/export/cache_stats'),
+    # PDF exports: the HTML the export job hands to Chromium
+    Scenario('pdf_html.profit', call=_pdf_builder('build_profit_pdf_html')),
+    Scenario('pdf_html.sales_by_stock', call=_pdf_builder('build_sales_by_stock_pdf_html', 'item')),
+    Scenario('pdf_html.sales_by_customer', call=_pdf_builder('build_sales_by_customer_pdf_html', 'revenue')),
+    Scenario('pdf_html.account', call=_pdf_builder('build_account_pdf_html',
+                                                   lambda data: data['busy_customer'][0],
+                                                   lambda data: data['busy_customer'][1])),
+
+    # Writes
+    Scenario('customer.add', '/customer/add', 'POST', write=True,
+             form=lambda data, i: {'name': f'Bench Customer {i}', 'phone': f'0700{i:07d}', 'company': 'Bench Ltd'}),
+    Scenario('customer.edit', lambda data, i: f'/customer/edit/Bench%20Customer%20{i}/0700{i:07d}', 'POST', write=True,
+             form=lambda data, i: {'company': f'Bench Ltd {i}'}),
+    Scenario('customer.delete', lambda data, i: f'/customer/delete/Bench%20Customer%20{i}/0700{i:07d}', 'POST', write=True),
+    Scenario('stock.add', '/stock/add', 'POST', write=True,
+             form=lambda data, i: {'size': 'BENCH', 'color': f'Color {i}', 'quantity': '10', 'total_cost': '25000'}),
+    Scenario('stock.edit', lambda data, i: f'/stock/edit/BENCH/Color%20{i}', 'POST', write=True,
+             form=lambda data, i: {'quantity': '12', 'total_cost': '30000'}),
+    Scenario('stock.delete', lambda data, i: f'/stock/delete/BENCH/Color%20{i}', 'POST', write=True),
+    Scenario('stock.import.dry_run', '/stock/import', 'POST', write=True, form=_import_form),
+    Scenario('sale.add', '/sale/add', 'POST', form=_sale_form, write=True),
+    Scenario('sale.refund', lambda data, i: f'/sale/refund/{_refundable_sale(data, i)}', 'POST', write=True),
+    Scenario('sale.invoice', '/sale/invoice', 'POST', form=_invoice_form, write=True),
+    Scenario('sale.delete', lambda data, i: f"/sale/delete/{_last_id('sale', 'sale_id')(data, i)}", 'POST', write=True),
+    Scenario('payment.add', '/payment/add', 'POST', form=_payment_form, write=True),
+    Scenario('payment.delete', lambda data, i: f"/payment/delete/{_last_id('payment', 'payment_id')(data, i)}", 'POST', write=True),
+]
+
+
+def prepare(data):
+    """Values the scenarios look up repeatedly, computed once per dataset"""
+    data['busy_customer'] = _busy_customer(data)
+    return data
@@ -0,0 +1,86 @@
+-- Report rollups computed by the database instead of in the Flask worker.
+--
+-- Each view returns one row per group and refund flag, so the report engine
+-- reads a few hundred aggregate rows instead of every sale ever recorded.
+-- The raw sums keep sold and refunded amounts apart (the reports show both);
+-- the signed_* columns have the is_refund sign already applied.
+--
+-- Plain PostgreSQL (15+ for security_invoker); safe to re-run. Apply with
+--   psql "$DATABASE_URL" -f migrations/001_report_rollup_views.sql
+-- or paste into the Supabase SQL editor, then set REPORT_AGGREGATION=database.
+
+create or replace view report_sales_by_item
+with (security_invoker = true) as
+select
+    stock_size,
+    stock_color,
+    is_refund,
+    count(*) as sale_count,
+    coalesce(sum(quantity), 0) as quantity,
+    coalesce(sum(total), 0) as total,
+    coalesce(sum(total_cost), 0) as total_cost,
+    coalesce(sum(profit), 0) as profit,
+    coalesce(sum(case when is_refund then -total else total end), 0) as signed_total,
+    coalesce(sum(case when is_refund then -total_cost else total_cost end), 0) as signed_cost,
+    coalesce(sum(case when is_refund then -profit else profit end), 0) as signed_profit
+from sale
+group by stock_size, stock_color, is_refund;
+
+create or replace view report_sales_by_customer
+with (security_invoker = true) as
+select
+    customer_name,
+    customer_phone,
+    is_refund,
+    count(*) as sale_count,
+    coalesce(sum(quantity), 0) as quantity,
+    coalesce(sum(total), 0) as total,
+    coalesce(sum(total_cost), 0) as total_cost,
+    coalesce(sum(profit), 0) as profit,
+    coalesce(sum(case when is_refund then -total else total end), 0) as signed_total,
+    coalesce(sum(case when is_refund then -total_cost else total_cost end), 0) as signed_cost,
+    coalesce(sum(case when is_refund then -profit else profit end), 0) as signed_profit
+from sale
+group by customer_name, customer_phone, is_refund;
+
+-- Month is the first seven characters of the stored date (YYYY-MM), with
+-- undated sales bucketed into 2024-12 exactly like the Python reports.
+create or replace view report_sales_by_month
+with (security_invoker = true) as
+select
+    coalesce(left("date"::text, 7), '2024-12') as month,
+    is_refund,
+    count(*) as sale_count,
+    coalesce(sum(quantity), 0) as quantity,
+    coalesce(sum(total), 0) as total,
+    coalesce(sum(total_cost), 0) as total_cost,
+    coalesce(sum(profit), 0) as profit,
+    coalesce(sum(case when is_refund then -total else total end), 0) as signed_total,
+    coalesce(sum(case when is_refund then -total_cost else total_cost end), 0) as signed_cost,
+    coalesce(sum(case when is_refund then -profit else profit end), 0) as signed_profit
+from sale
+group by coalesce(left("date"::text, 7), '2024-12'), is_refund;
+
+create or replace view report_payments_by_customer
+with (security_invoker = true) as
+select
+    customer_name,
+    customer_phone,
+    count(*) as payment_count,
+    coalesce(sum(amount), 0) as amount
+from payment
+group by customer_name, customer_phone;
+
+-- Supabase API roles; skipped on a plain Postgres stand-in where they don't exist
+do $$
+declare
+    api_role text;
+begin
+    foreach api_role in array array['anon', 'authenticated', 'service_role'] loop
+        if exists (select 1 from pg_roles where rolname = api_role) then
+            execute format('grant select on report_sales_by_item, report_sales_by_customer, '
+                           'report_sales_by_month, report_payments_by_customer to %I', api_role);
+        end if;
+    end loop;
+end
+$$;
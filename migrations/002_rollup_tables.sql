@@ -0,0 +1,220 @@
+-- Report rollups maintained incrementally by the write paths.
+--
+-- Same columns as the 001 views, but stored: sale.add/refund/delete and
+-- payment.add/delete call apply_sale_rollup / apply_payment_rollup with the
+-- row they touched (sign +1 for an insert, -1 for a delete), so reading a
+-- report costs O(number of groups). rebuild_rollups() recomputes everything
+-- from sale and payment for backfill or repair (flask rollups rebuild).
+--
+-- Writes made through the REST API commit the row before they apply it, so
+-- a rebuild in between would count the row and the apply count it again.
+-- Every rebuild therefore bumps rollup_state.generation: those writers read
+-- rollup_generation() before writing and pass it to the apply, which raises
+-- (leaving the app to mark the rollups stale) if a rebuild ran since.
+-- The RPCs in 004/005 write and apply in one transaction and pass no generation.
+--
+-- Plain PostgreSQL; safe to re-run.
+
+create table if not exists rollup_sku (
+    stock_size text not null,
+    stock_color text not null,
+    is_refund boolean not null,
+    sale_count bigint not null default 0,
+    quantity numeric not null default 0,
+    total numeric not null default 0,
+    total_cost numeric not null default 0,
+    profit numeric not null default 0,
+    primary key (stock_size, stock_color, is_refund)
+);
+
+create table if not exists rollup_customer (
+    customer_name text not null,
+    customer_phone text not null,
+    is_refund boolean not null,
+    sale_count bigint not null default 0,
+    quantity numeric not null default 0,
+    total numeric not null default 0,
+    total_cost numeric not null default 0,
+    profit numeric not null default 0,
+    primary key (customer_name, customer_phone, is_refund)
+);
+
+create table if not exists rollup_month (
+    month text not null,
+    is_refund boolean not null,
+    sale_count bigint not null default 0,
+    quantity numeric not null default 0,
+    total numeric not null default 0,
+    total_cost numeric not null default 0,
+    profit numeric not null default 0,
+    primary key (month, is_refund)
+);
+
+-- Report totals are summed from rollup_sku, so no separate totals table
+drop table if exists rollup_totals;
+
+create table if not exists rollup_payment_customer (
+    customer_name text not null,
+    customer_phone text not null,
+    payment_count bigint not null default 0,
+    amount numeric not null default 0,
+    primary key (customer_name, customer_phone)
+);
+
+create table if not exists rollup_state (
+    id boolean primary key default true check (id),
+    generation bigint not null default 0
+);
+
+insert into rollup_state (id) values (true) on conflict (id) do nothing;
+
+create or replace function rollup_generation() returns bigint
+language sql stable as $$
+    select generation from rollup_state;
+$$;
+
+create or replace function check_rollup_generation(p_generation bigint) returns void
+language plpgsql as $$
+begin
+    -- The share lock makes a concurrent rebuild wait for this apply to commit
+    if p_generation is not null and p_generation <> (select generation from rollup_state for share) then
+        raise exception 'rollups were rebuilt while this write was in flight';
+    end if;
+end
+$$;
+
+drop function if exists apply_sale_rollup(text, text, text, text, text, boolean, integer, numeric, numeric,
+                                          numeric, numeric);
+
+create or replace function apply_sale_rollup(
+    p_stock_size text,
+    p_stock_color text,
+    p_customer_name text,
+    p_customer_phone text,
+    p_month text,
+    p_is_refund boolean,
+    p_sign integer,
+    p_quantity numeric,
+    p_total numeric,
+    p_total_cost numeric,
+    p_profit numeric,
+    p_generation bigint default null
+) returns void
+language plpgsql as $$
+begin
+    perform check_rollup_generation(p_generation);
+
+    insert into rollup_sku as r (stock_size, stock_color, is_refund, sale_count, quantity, total, total_cost, profit)
+    values (p_stock_size, p_stock_color, p_is_refund, p_sign, p_sign * p_quantity, p_sign * p_total,
+            p_sign * coalesce(p_total_cost, 0), p_sign * coalesce(p_profit, 0))
+    on conflict (stock_size, stock_color, is_refund) do update set
+        sale_count = r.sale_count + excluded.sale_count,
+        quantity = r.quantity + excluded.quantity,
+        total = r.total + excluded.total,
+        total_cost = r.total_cost + excluded.total_cost,
+        profit = r.profit + excluded.profit;
+
+    insert into rollup_customer as r (customer_name, customer_phone, is_refund, sale_count, quantity, total, total_cost, profit)
+    values (p_customer_name, p_customer_phone, p_is_refund, p_sign, p_sign * p_quantity, p_sign * p_total,
+            p_sign * coalesce(p_total_cost, 0), p_sign * coalesce(p_profit, 0))
+    on conflict (customer_name, customer_phone, is_refund) do update set
+        sale_count = r.sale_count + excluded.sale_count,
+        quantity = r.quantity + excluded.quantity,
+        total = r.total + excluded.total,
+        total_cost = r.total_cost + excluded.total_cost,
+        profit = r.profit + excluded.profit;
+
+    insert into rollup_month as r (month, is_refund, sale_count, quantity, total, total_cost, profit)
+    values (coalesce(p_month, '2024-12'), p_is_refund, p_sign, p_sign * p_quantity, p_sign * p_total,
+            p_sign * coalesce(p_total_cost, 0), p_sign * coalesce(p_profit, 0))
+    on conflict (month, is_refund) do update set
+        sale_count = r.sale_count + excluded.sale_count,
+        quantity = r.quantity + excluded.quantity,
+        total = r.total + excluded.total,
+        total_cost = r.total_cost + excluded.total_cost,
+        profit = r.profit + excluded.profit;
+
+    -- Drop groups whose last sale was deleted so reports don't show empty rows
+    delete from rollup_sku where sale_count = 0;
+    delete from rollup_customer where sale_count = 0;
+    delete from rollup_month where sale_count = 0;
+end
+$$;
+
+drop function if exists apply_payment_rollup(text, text, integer, numeric);
+
+create or replace function apply_payment_rollup(
+    p_customer_name text,
+    p_customer_phone text,
+    p_sign integer,
+    p_amount numeric,
+    p_generation bigint default null
+) returns void
+language plpgsql as $$
+begin
+    perform check_rollup_generation(p_generation);
+
+    insert into rollup_payment_customer as r (customer_name, customer_phone, payment_count, amount)
+    values (p_customer_name, p_customer_phone, p_sign, p_sign * p_amount)
+    on conflict (customer_name, customer_phone) do update set
+        payment_count = r.payment_count + excluded.payment_count,
+        amount = r.amount + excluded.amount;
+
+    delete from rollup_payment_customer where payment_count = 0;
+end
+$$;
+
+create or replace function rebuild_rollups() returns void
+language plpgsql as $$
+begin
+    -- Block writers for the duration so no delta lands between the wipe and the refill
+    lock table sale, payment in share mode;
+    -- Applies started before this (waited for here) or after it now fail their generation check
+    update rollup_state set generation = generation + 1;
+
+    delete from rollup_sku;
+    delete from rollup_customer;
+    delete from rollup_month;
+    delete from rollup_payment_customer;
+
+    insert into rollup_sku (stock_size, stock_color, is_refund, sale_count, quantity, total, total_cost, profit)
+    select stock_size, stock_color, is_refund, count(*), coalesce(sum(quantity), 0), coalesce(sum(total), 0),
+           coalesce(sum(total_cost), 0), coalesce(sum(profit), 0)
+    from sale
+    group by stock_size, stock_color, is_refund;
+
+    insert into rollup_customer (customer_name, customer_phone, is_refund, sale_count, quantity, total, total_cost, profit)
+    select customer_name, customer_phone, is_refund, count(*), coalesce(sum(quantity), 0), coalesce(sum(total), 0),
+           coalesce(sum(total_cost), 0), coalesce(sum(profit), 0)
+    from sale
+    group by customer_name, customer_phone, is_refund;
+
+    insert into rollup_month (month, is_refund, sale_count, quantity, total, total_cost, profit)
+    select coalesce(left("date"::text, 7), '2024-12'), is_refund, count(*), coalesce(sum(quantity), 0),
+           coalesce(sum(total), 0), coalesce(sum(total_cost), 0), coalesce(sum(profit), 0)
+    from sale
+    group by coalesce(left("date"::text, 7), '2024-12'), is_refund;
+
+    insert into rollup_payment_customer (customer_name, customer_phone, payment_count, amount)
+    select customer_name, customer_phone, count(*), coalesce(sum(amount), 0)
+    from payment
+    group by customer_name, customer_phone;
+end
+$$;
+
+do $$
+declare
+    api_role text;
+begin
+    foreach api_role in array array['anon', 'authenticated', 'service_role'] loop
+        if exists (select 1 from pg_roles where rolname = api_role) then
+            execute format('grant select on rollup_sku, rollup_customer, rollup_month, '
+                           'rollup_payment_customer to %I', api_role);
+            execute format('grant execute on function rollup_generation(), apply_sale_rollup(text, text, text, '
+                           'text, text, boolean, integer, numeric, numeric, numeric, numeric, bigint), '
+                           'apply_payment_rollup(text, text, integer, numeric, bigint), rebuild_rollups() to %I',
+                           api_role);
+        end if;
+    end loop;
+end
+$$;
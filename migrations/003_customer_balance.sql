@@ -0,0 +1,91 @@
+-- Per-customer balance ledger, maintained incrementally.
+--
+-- balance = sales - refunds - payments + advances, the same formula the
+-- customer and account pages used to compute by summing every row. The
+-- write paths call apply_customer_balance with the amounts they add or
+-- remove; reconcile_customer_balances() recomputes the ledger from sale,
+-- payment and transaction for one customer or for everyone
+-- (flask ledger reconcile).
+--
+-- Plain PostgreSQL (12+ for the generated column); safe to re-run.
+
+create table if not exists customer_balance (
+    customer_name text not null,
+    customer_phone text not null,
+    total_sales numeric not null default 0,
+    total_refunds numeric not null default 0,
+    total_payments numeric not null default 0,
+    total_advances numeric not null default 0,
+    balance numeric generated always as (total_sales - total_refunds - total_payments + total_advances) stored,
+    updated_at timestamptz not null default now(),
+    primary key (customer_name, customer_phone)
+);
+
+create or replace function apply_customer_balance(
+    p_customer_name text,
+    p_customer_phone text,
+    p_sales numeric default 0,
+    p_refunds numeric default 0,
+    p_payments numeric default 0,
+    p_advances numeric default 0
+) returns void
+language plpgsql as $$
+begin
+    insert into customer_balance as b (customer_name, customer_phone, total_sales, total_refunds,
+                                       total_payments, total_advances)
+    values (p_customer_name, p_customer_phone, p_sales, p_refunds, p_payments, p_advances)
+    on conflict (customer_name, customer_phone) do update set
+        total_sales = b.total_sales + excluded.total_sales,
+        total_refunds = b.total_refunds + excluded.total_refunds,
+        total_payments = b.total_payments + excluded.total_payments,
+        total_advances = b.total_advances + excluded.total_advances,
+        updated_at = now();
+end
+$$;
+
+create or replace function reconcile_customer_balances(
+    p_customer_name text default null,
+    p_customer_phone text default null
+) returns void
+language plpgsql as $$
+begin
+    delete from customer_balance
+    where p_customer_name is null
+       or (customer_name = p_customer_name and customer_phone = p_customer_phone);
+
+    insert into customer_balance (customer_name, customer_phone, total_sales, total_refunds,
+                                  total_payments, total_advances)
+    select customer_name, customer_phone, sum(sales), sum(refunds), sum(payments), sum(advances)
+    from (
+        select customer_name, customer_phone,
+               case when is_refund then 0 else total end as sales,
+               case when is_refund then total else 0 end as refunds,
+               0 as payments, 0 as advances
+        from sale
+        union all
+        select customer_name, customer_phone, 0, 0, amount, 0
+        from payment
+        union all
+        select customer_name, customer_phone, 0, 0, 0, amount
+        from "transaction"
+        where type = 'advance'
+    ) movements
+    where p_customer_name is null
+       or (customer_name = p_customer_name and customer_phone = p_customer_phone)
+    group by customer_name, customer_phone;
+end
+$$;
+
+do $$
+declare
+    api_role text;
+begin
+    foreach api_role in array array['anon', 'authenticated', 'service_role'] loop
+        if exists (select 1 from pg_roles where rolname = api_role) then
+            execute format('grant select on customer_balance to %I', api_role);
+            execute format('grant execute on function apply_customer_balance(text, text, numeric, numeric, '
+                           'numeric, numeric), reconcile_customer_balances(text, text) to %I', api_role);
+        end if;
+    end loop;
+end
+$$;
@@ -0,0 +1,181 @@
+-- Atomic sale posting: one RPC per sale, refund or sale deletion.
+--
+-- Each function does what sale.add / sale.refund / sale.delete used to do
+-- with four or five separate requests (customer check, stock read, sale
+-- insert, stock update, transaction insert) inside a single transaction.
+-- Stock is adjusted with `quantity = quantity - n` under the row lock, so
+-- two clerks selling the same size/color at once can no longer overwrite
+-- each other's update. When p_apply_rollups / p_apply_ledger are set the
+-- 002 rollups and 003 balance ledger are updated in the same transaction.
+--
+-- Every function returns a jsonb object whose `status` is 'ok' or names
+-- what was missing ('customer_not_found', 'stock_not_found',
+-- 'sale_not_found'); nothing is written unless the status is 'ok'.
+--
+-- Plain PostgreSQL; safe to re-run.
+
+create or replace function post_sale(
+    p_customer_name text,
+    p_customer_phone text,
+    p_stock_size text,
+    p_stock_color text,
+    p_quantity integer,
+    p_rate numeric,
+    p_note text,
+    p_date timestamptz default now(),
+    p_apply_rollups boolean default false,
+    p_apply_ledger boolean default false
+) returns jsonb
+language plpgsql as $$
+declare
+    v_cost_per_unit numeric;
+    v_new_quantity integer;
+    v_total numeric := p_quantity * p_rate;
+    v_total_cost numeric;
+    v_sale_id bigint;
+begin
+    if not exists (select 1 from customer where name = p_customer_name and phone = p_customer_phone) then
+        return jsonb_build_object('status', 'customer_not_found');
+    end if;
+
+    -- Negative inventory is allowed; the caller warns when it happens
+    update stock set
+        quantity = quantity - p_quantity,
+        total_cost = total_cost - cost_per_unit * p_quantity
+    where size = p_stock_size and color = p_stock_color
+    returning cost_per_unit, quantity into v_cost_per_unit, v_new_quantity;
+
+    if not found then
+        return jsonb_build_object('status', 'stock_not_found');
+    end if;
+
+    v_total_cost := v_cost_per_unit * p_quantity;
+
+    insert into sale (customer_name, customer_phone, stock_size, stock_color, quantity, rate, total,
+                      cost_per_unit, total_cost, profit, "date", is_refund)
+    values (p_customer_name, p_customer_phone, p_stock_size, p_stock_color, p_quantity, p_rate, v_total,
+            v_cost_per_unit, v_total_cost, v_total - v_total_cost, p_date, false)
+    returning sale_id into v_sale_id;
+
+    insert into "transaction" (customer_name, customer_phone, amount, type, related_sale_id, "date", note)
+    values (p_customer_name, p_customer_phone, v_total, 'sale', v_sale_id, p_date, p_note);
+
+    if p_apply_rollups then
+        perform apply_sale_rollup(p_stock_size, p_stock_color, p_customer_name, p_customer_phone,
+                                  left(p_date::text, 7), false, 1, p_quantity, v_total, v_total_cost,
+                                  v_total - v_total_cost);
+    end if;
+    if p_apply_ledger then
+        perform apply_customer_balance(p_customer_name, p_customer_phone, p_sales => v_total);
+    end if;
+
+    return jsonb_build_object(
+        'status', 'ok',
+        'sale_id', v_sale_id,
+        'previous_quantity', v_new_quantity + p_quantity,
+        'new_quantity', v_new_quantity
+    );
+end
+$$;
+
+create or replace function post_refund(
+    p_sale_id bigint,
+    p_note text,
+    p_date timestamptz default now(),
+    p_apply_rollups boolean default false,
+    p_apply_ledger boolean default false
+) returns jsonb
+language plpgsql as $$
+declare
+    v_sale sale%rowtype;
+    v_refund_id bigint;
+begin
+    select * into v_sale from sale where sale_id = p_sale_id for update;
+    if not found or v_sale.is_refund then
+        return jsonb_build_object('status', 'sale_not_found');
+    end if;
+
+    insert into sale (customer_name, customer_phone, stock_size, stock_color, quantity, rate, total,
+                      cost_per_unit, total_cost, profit, "date", is_refund)
+    values (v_sale.customer_name, v_sale.customer_phone, v_sale.stock_size, v_sale.stock_color, v_sale.quantity,
+            v_sale.rate, v_sale.total, v_sale.cost_per_unit, v_sale.total_cost, -v_sale.profit, p_date, true)
+    returning sale_id into v_refund_id;
+
+    -- Put the units back at the cost they left with
+    update stock set
+        quantity = quantity + v_sale.quantity,
+        total_cost = total_cost + v_sale.total_cost
+    where size = v_sale.stock_size and color = v_sale.stock_color;
+
+    insert into "transaction" (customer_name, customer_phone, amount, type, related_sale_id, "date", note)
+    values (v_sale.customer_name, v_sale.customer_phone, v_sale.total, 'refund', v_refund_id, p_date, p_note);
+
+    if p_apply_rollups then
+        perform apply_sale_rollup(v_sale.stock_size, v_sale.stock_color, v_sale.customer_name, v_sale.customer_phone,
+                                  left(p_date::text, 7), true, 1, v_sale.quantity, v_sale.total, v_sale.total_cost,
+                                  -v_sale.profit);
+    end if;
+    if p_apply_ledger then
+        perform apply_customer_balance(v_sale.customer_name, v_sale.customer_phone, p_refunds => v_sale.total);
+    end if;
+
+    return jsonb_build_object('status', 'ok', 'sale_id', v_refund_id);
+end
+$$;
+
+create or replace function delete_sale(
+    p_sale_id bigint,
+    p_apply_rollups boolean default false,
+    p_apply_ledger boolean default false
+) returns jsonb
+language plpgsql as $$
+declare
+    v_sale sale%rowtype;
+begin
+    select * into v_sale from sale where sale_id = p_sale_id for update;
+    if not found then
+        return jsonb_build_object('status', 'sale_not_found');
+    end if;
+
+    -- A regular sale gives its stock back; deleting a refund leaves stock alone
+    if not v_sale.is_refund then
+        update stock set
+            quantity = quantity + v_sale.quantity,
+            total_cost = total_cost + v_sale.total_cost
+        where size = v_sale.stock_size and color = v_sale.stock_color;
+    end if;
+
+    delete from "transaction" where related_sale_id = p_sale_id;
+    delete from sale where sale_id = p_sale_id;
+
+    if p_apply_rollups then
+        perform apply_sale_rollup(v_sale.stock_size, v_sale.stock_color, v_sale.customer_name, v_sale.customer_phone,
+                                  left(v_sale."date"::text, 7), v_sale.is_refund, -1, v_sale.quantity, v_sale.total,
+                                  v_sale.total_cost, v_sale.profit);
+    end if;
+    if p_apply_ledger then
+        if v_sale.is_refund then
+            perform apply_customer_balance(v_sale.customer_name, v_sale.customer_phone, p_refunds => -v_sale.total);
+        else
+            perform apply_customer_balance(v_sale.customer_name, v_sale.customer_phone, p_sales => -v_sale.total);
+        end if;
+    end if;
+
+    -- The date says which stored report month (application/report_buckets.py) is now stale
+    return jsonb_build_object('status', 'ok', 'sale_id', p_sale_id, 'date', v_sale."date");
+end
+$$;
+
+do $$
+declare
+    api_role text;
+begin
+    foreach api_role in array array['anon', 'authenticated', 'service_role'] loop
+        if exists (select 1 from pg_roles where rolname = api_role) then
+            execute format('grant execute on function post_sale(text, text, text, text, integer, numeric, text, '
+                           'timestamptz, boolean, boolean), post_refund(bigint, text, timestamptz, boolean, boolean), '
+                           'delete_sale(bigint, boolean, boolean) to %I', api_role);
+        end if;
+    end loop;
+end
+$$;
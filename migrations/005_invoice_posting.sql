@@ -0,0 +1,139 @@
+-- Multi-line invoices posted in one call.
+--
+-- post_invoice takes every size/color line of an order as a jsonb array
+-- ([{"stock_size", "stock_color", "quantity", "rate", "note"}, ...]) and
+-- does for all of them what post_sale (004) does for one: sale and
+-- transaction rows, stock decrements, and the rollups and ledger when
+-- enabled, all in a single transaction. Nothing is written if the customer
+-- or any line's stock item is missing.
+--
+-- apply_sale_rollups applies a batch of sale rows to the 002 rollups in one
+-- call, for the invoice path that writes through the REST API (with the
+-- rollup generation read before the rows were written, see 002).
+--
+-- Plain PostgreSQL; safe to re-run.
+
+drop function if exists apply_sale_rollups(jsonb);
+
+create or replace function apply_sale_rollups(p_sales jsonb, p_generation bigint default null) returns void
+language plpgsql as $$
+declare
+    v_sale jsonb;
+begin
+    perform check_rollup_generation(p_generation);
+    for v_sale in select value from jsonb_array_elements(p_sales) loop
+        perform apply_sale_rollup(v_sale->>'stock_size', v_sale->>'stock_color', v_sale->>'customer_name',
+                                  v_sale->>'customer_phone', v_sale->>'month', (v_sale->>'is_refund')::boolean,
+                                  (v_sale->>'sign')::integer, (v_sale->>'quantity')::numeric,
+                                  (v_sale->>'total')::numeric, (v_sale->>'total_cost')::numeric,
+                                  (v_sale->>'profit')::numeric);
+    end loop;
+end
+$$;
+
+create or replace function post_invoice(
+    p_customer_name text,
+    p_customer_phone text,
+    p_lines jsonb,
+    p_date timestamptz default now(),
+    p_apply_rollups boolean default false,
+    p_apply_ledger boolean default false
+) returns jsonb
+language plpgsql as $$
+declare
+    v_line record;
+    v_missing integer;
+    v_cost_per_unit numeric;
+    v_new_quantity integer;
+    v_total numeric;
+    v_total_cost numeric;
+    v_sale_id bigint;
+    v_invoice_total numeric := 0;
+    v_sale_ids jsonb := '[]'::jsonb;
+    v_negative jsonb := '[]'::jsonb;
+begin
+    if not exists (select 1 from customer where name = p_customer_name and phone = p_customer_phone) then
+        return jsonb_build_object('status', 'customer_not_found');
+    end if;
+
+    select l.line_no into v_missing
+    from jsonb_array_elements(p_lines) with ordinality as l(line, line_no)
+    where not exists (select 1 from stock s
+                      where s.size = l.line->>'stock_size' and s.color = l.line->>'stock_color')
+    order by l.line_no
+    limit 1;
+    if found then
+        return jsonb_build_object('status', 'stock_not_found', 'line', v_missing);
+    end if;
+
+    -- Lock stock rows in a fixed order so two invoices can't deadlock each other
+    perform 1 from stock s
+    where (s.size, s.color) in (select l->>'stock_size', l->>'stock_color' from jsonb_array_elements(p_lines) l)
+    order by s.size, s.color
+    for update;
+
+    for v_line in
+        select l.line_no, l.line->>'stock_size' as stock_size, l.line->>'stock_color' as stock_color,
+               (l.line->>'quantity')::integer as quantity, (l.line->>'rate')::numeric as rate,
+               l.line->>'note' as note
+        from jsonb_array_elements(p_lines) with ordinality as l(line, line_no)
+        order by l.line_no
+    loop
+        update stock set
+            quantity = quantity - v_line.quantity,
+            total_cost = total_cost - cost_per_unit * v_line.quantity
+        where size = v_line.stock_size and color = v_line.stock_color
+        returning cost_per_unit, quantity into v_cost_per_unit, v_new_quantity;
+
+        v_total := v_line.quantity * v_line.rate;
+        v_total_cost := v_cost_per_unit * v_line.quantity;
+
+        insert into sale (customer_name, customer_phone, stock_size, stock_color, quantity, rate, total,
+                          cost_per_unit, total_cost, profit, "date", is_refund)
+        values (p_customer_name, p_customer_phone, v_line.stock_size, v_line.stock_color, v_line.quantity,
+                v_line.rate, v_total, v_cost_per_unit, v_total_cost, v_total - v_total_cost, p_date, false)
+        returning sale_id into v_sale_id;
+
+        insert into "transaction" (customer_name, customer_phone, amount, type, related_sale_id, "date", note)
+        values (p_customer_name, p_customer_phone, v_total, 'sale', v_sale_id, p_date, v_line.note);
+
+        if p_apply_rollups then
+            perform apply_sale_rollup(v_line.stock_size, v_line.stock_color, p_customer_name, p_customer_phone,
+                                      left(p_date::text, 7), false, 1, v_line.quantity, v_total, v_total_cost,
+                                      v_total - v_total_cost);
+        end if;
+
+        v_invoice_total := v_invoice_total + v_total;
+        v_sale_ids := v_sale_ids || to_jsonb(v_sale_id);
+        if v_new_quantity < 0 then
+            v_negative := v_negative || jsonb_build_object('stock_size', v_line.stock_size,
+                                                           'stock_color', v_line.stock_color,
+                                                           'new_quantity', v_new_quantity);
+        end if;
+    end loop;
+
+    if p_apply_ledger then
+        perform apply_customer_balance(p_customer_name, p_customer_phone, p_sales => v_invoice_total);
+    end if;
+
+    return jsonb_build_object(
+        'status', 'ok',
+        'sale_ids', v_sale_ids,
+        'total', v_invoice_total,
+        'negative_stock', v_negative
+    );
+end
+$$;
+
+do $$
+declare
+    api_role text;
+begin
+    foreach api_role in array array['anon', 'authenticated', 'service_role'] loop
+        if exists (select 1 from pg_roles where rolname = api_role) then
+            execute format('grant execute on function apply_sale_rollups(jsonb, bigint), post_invoice(text, text, jsonb, '
+                           'timestamptz, boolean, boolean) to %I', api_role);
+        end if;
+    end loop;
+end
+$$;